@@ -0,0 +1,52 @@
+"""
+Fixtures for the benchmark suite.
+
+Each fixture is parametrized over several scales so that the results trace a
+scaling curve. Run the suite with
+
+    pytest benchmarks --benchmark-autosave
+
+and compare a new run against the saved ones with
+
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+import pytest
+
+from aerichor.ground.aqs import unpack_samples
+from aerichor.satellite.pace import SpexOne
+from aerichor.testing import (
+    GRANULE_START as START,
+    make_aqs_samples,
+    make_spexone_tree,
+    spexone_granule_name,
+)
+
+
+# SPEXone L2 granules have 29 pixels per line.
+GRANULE_LINES = {"small": 100, "medium": 1_000, "large": 10_000}
+AQS_SITES = {"small": 10, "medium": 100, "large": 1_000}
+
+
+@pytest.fixture(scope="session", params=list(GRANULE_LINES))
+def granule_file(request, tmp_path_factory):
+    lines = GRANULE_LINES[request.param]
+    path = tmp_path_factory.mktemp(request.param) / spexone_granule_name(START)
+    make_spexone_tree(n_lines=lines, n_pixels=29).to_netcdf(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def spexone(granule_file):
+    with SpexOne.from_netcdf(granule_file, lazy=True) as satellite:
+        satellite.data["geophysical_data/aot550"]
+        yield satellite
+
+
+@pytest.fixture(scope="session", params=list(AQS_SITES))
+def aqs_samples(request):
+    return make_aqs_samples(n_sites=AQS_SITES[request.param], date=START.replace(hour=0))
+
+
+@pytest.fixture(scope="session")
+def aqs_frame(aqs_samples):
+    return unpack_samples(aqs_samples)
@@ -0,0 +1,12 @@
+import json
+
+from aerichor.ground.aqs import unpack_samples
+
+
+def test_unpack_samples(benchmark, aqs_samples):
+    benchmark(unpack_samples, aqs_samples)
+
+
+def test_decode_and_unpack(benchmark, aqs_samples):
+    body = json.dumps({"Data": aqs_samples}).encode()
+    benchmark(lambda: unpack_samples(json.loads(body)["Data"]))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from aerichor.testing import GRANULE_START as START
+
+
+def test_align_temporally_nearest(benchmark, aqs_frame):
+    benchmark(aqs_frame.align_temporally, START, groupby="site_id")
+
+
+def test_align_temporally_interpolate(benchmark, aqs_frame):
+    benchmark(
+        aqs_frame.align_temporally, START, groupby="site_id", strategy="interpolate"
+    )
+
+
+def test_align_temporally_mean(benchmark, aqs_frame):
+    benchmark(
+        aqs_frame.align_temporally,
+        START,
+        groupby="site_id",
+        strategy="mean",
+        window=timedelta(hours=1),
+    )
+
+
+def test_get_spatial_value(benchmark, aqs_frame, spexone):
+    sites = aqs_frame.align_temporally(START, groupby="site_id")
+    pixels = spexone.flatten("geophysical_data/aot550")
+    benchmark(sites.get_spatial_value, pixels, "aot550", buffer=0.25)
+
+
+def test_get_spatial_values(benchmark, aqs_frame, spexone):
+    sites = aqs_frame.align_temporally(START, groupby="site_id")
+    pixels = spexone.flatten(
+        ["geophysical_data/aot550", "geophysical_data/angstrom_440_670"], how="all"
+    )
+    benchmark(
+        sites.get_spatial_values, pixels, ["aot550", "angstrom_440_670"], buffer=0.25
+    )
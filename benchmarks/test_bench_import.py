@@ -0,0 +1,27 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+# The most that a fresh interpreter may spend importing a module, in seconds.
+# It bounds the startup of every command and process-pool worker.
+IMPORT_BUDGET = 2.0
+
+
+@pytest.mark.parametrize(
+    "module", ["aerichor", "aerichor.ground.aqs", "aerichor.satellite.pace"]
+)
+def test_import_time(benchmark, module):
+    # Time the runs here too, because benchmark.stats is None when
+    # benchmarks are disabled and the function only runs once.
+    timings = []
+
+    def start():
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        timings.append(time.perf_counter() - begin)
+
+    benchmark.pedantic(start, rounds=5, warmup_rounds=1)
+    assert min(timings) < IMPORT_BUDGET
@@ -0,0 +1,48 @@
+import numpy as np
+import shapely
+
+from aerichor.satellite.base import Swath
+from aerichor.satellite.pace import SpexOne
+
+
+def test_from_netcdf(benchmark, granule_file):
+    def read():
+        SpexOne.from_netcdf(granule_file).close()
+
+    benchmark(read)
+
+
+def test_from_netcdf_lazy(benchmark, granule_file):
+    def read():
+        SpexOne.from_netcdf(granule_file, lazy=True).close()
+
+    benchmark(read)
+
+
+def _swath(satellite):
+    swath = Swath()
+    swath.lats = satellite.lats
+    swath.lons = satellite.lons
+    return swath
+
+
+def test_swath_shape(benchmark, spexone):
+    benchmark(lambda: _swath(spexone).shape)
+
+
+def test_swath_bbox(benchmark, spexone):
+    benchmark(lambda: _swath(spexone).bbox)
+
+
+def test_bbox_contains(benchmark, spexone):
+    bbox = spexone.bbox
+    point = shapely.Point(float(spexone.lons[5, 5]), float(spexone.lats[5, 5]))
+    assert benchmark(lambda: point in bbox)
+
+
+def test_swath_contains_points(benchmark, spexone):
+    rng = np.random.default_rng(0)
+    x0, x1, y0, y1 = spexone.bbox.to_extent()
+    lons = rng.uniform(x0, x1, 10_000)
+    lats = rng.uniform(y0, y1, 10_000)
+    benchmark(spexone.contains_points, lons, lats)
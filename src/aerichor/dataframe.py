@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
 
+from aerichor.instrument import timed
+from aerichor.spatial import BoxIndex, SpaceTimeIndex, SpatialOperator, aggregate
+
 
 class SampleDataFrame(pd.DataFrame):
     """Extends Pandas DataFrame with convenience functions."""
@@ -9,41 +13,176 @@ class SampleDataFrame(pd.DataFrame):
     def _constructor(self):
         return SampleDataFrame
 
-    def align_temporally(self, datetime, groupby=None):
-        """Retains only the observations nearest in time to the specified time.
+    def compact(self, time_unit="s"):
+        """Returns a copy of the data frame that uses less memory.
+
+        Floats are stored as float32, integers in the smallest integer type
+        that holds them, text as categories, and times and time differences
+        as datetime64 and timedelta64 with the given resolution. The `units`
+        and `label` metadata are kept.
 
         Parameters
         ----------
-        datetime: datetime
-            Specifies the datetime that all observations are compared to.
+        time_unit: str, optional
+            Specifies the resolution of times, one of "s", "ms", "us", and
+            "ns". AQS samples have a resolution of one minute, so seconds are
+            enough.
+
+        Returns
+        -------
+        SampleDataFrame
+        """
+        data = {}
+        for column, values in self.items():
+            dtype = values.dtype
+            if pd.api.types.is_float_dtype(dtype):
+                values = values.astype(np.float32)
+            elif pd.api.types.is_bool_dtype(dtype):
+                pass
+            elif pd.api.types.is_integer_dtype(dtype):
+                values = pd.to_numeric(values, downcast="integer")
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                values = values.dt.as_unit(time_unit)
+            elif pd.api.types.is_timedelta64_dtype(dtype):
+                values = values.dt.as_unit(time_unit)
+            elif isinstance(dtype, pd.CategoricalDtype):
+                pass
+            elif pd.api.types.infer_dtype(values, skipna=True) == "datetime":
+                values = pd.to_datetime(values).dt.as_unit(time_unit)
+            elif pd.api.types.infer_dtype(values, skipna=True) == "string":
+                values = values.astype("category")
+            data[column] = values
+        compacted = SampleDataFrame(data, index=self.index)
+        return compacted.__finalize__(self)
+
+    def memory_report(self):
+        """Reports the memory used by each column.
+
+        Returns
+        -------
+        pd.DataFrame
+            Contains the dtype and the number of bytes of each column and of
+            the index, with the total in the last row.
+        """
+        usage = self.memory_usage(deep=True)
+        dtypes = pd.concat([pd.Series({"Index": self.index.dtype}), self.dtypes])
+        report = pd.DataFrame({"dtype": dtypes.astype(str), "bytes": usage})
+        report.loc["Total"] = ["", usage.sum()]
+        return report
+
+    def align_temporally(self, datetime, groupby=None, strategy="nearest", window=None):
+        """Aligns the observations in time with one or more reference times.
+
+        The data frame is not modified. Every reference time is handled in
+        one vectorized call, so you can align a whole season of observations
+        with every satellite pass at once.
+
+        Strategies
+        ----------
+        nearest:
+            Retains only the observation nearest in time to each reference
+            time, per group. If `window` is given, observations farther than
+            `window` from the reference time are not considered.
+        window:
+            Retains every observation within plus or minus `window` of each
+            reference time. Groups are not required.
+        mean:
+            Averages the numeric columns of the observations within plus or
+            minus `window` of each reference time, per group.
+        interpolate:
+            Linearly interpolates the numeric columns between the observations
+            just before and just after each reference time, per group. If
+            `window` is given, both observations must be within `window` of
+            the reference time.
+
+        Parameters
+        ----------
+        datetime: datetime or sequence of datetime
+            Specifies the reference time(s) that all observations are compared
+            to, for example `swath.start`.
         groupby: str
             Specifies the column in the data frame that observations should be 
-            grouped by. In the resulting data frame, there is one observation
-            per value in the groupby value.
+            grouped by. In the resulting data frame, there is at most one
+            observation per value in the groupby column and reference time.
+        strategy: str, optional
+            Specifies one of "nearest", "window", "mean", and "interpolate".
+        window: timedelta, optional
+            Specifies how far from a reference time an observation can be.
 
         Returns
         -------
         SampleDataFrame
-            Contains the same data as the original, but with observations 
-            filtered by time. 
+            Contains the aligned observations. A `target_time` column holds the
+            reference time that each row is aligned to. For "nearest" and
+            "window", a `delta_t` column holds the absolute difference between
+            the observation time and the reference time. For "mean" and
+            "interpolate", the `time` column holds the reference time.
         """
-        if not groupby:
+        if strategy not in ("nearest", "window", "mean", "interpolate"):
+            msg = f"Unknown strategy {strategy!r}."
+            raise ValueError(msg)
+        if not groupby and strategy != "window":
             msg = "You must specify a variable to use to group observations."
             raise Exception(msg)
-        # datetime can be swath.start (a scalar datetime)
-        self["delta_t"] = abs(self["time"] - datetime)
-        nearest = self.loc[self.groupby(groupby)["delta_t"].idxmin()]
-        return nearest
+        if window is None and strategy in ("window", "mean"):
+            msg = f"The {strategy!r} strategy requires a window."
+            raise ValueError(msg)
+
+        if window is not None:
+            window = pd.Timedelta(window)
+        with timed("dataframe.align", strategy=strategy) as timer:
+            aligned = self._align_temporally(datetime, groupby, strategy, window)
+            timer.record(rows=len(aligned))
+        return aligned
+
+    def _align_temporally(self, datetime, groupby, strategy, window):
+        times = pd.to_datetime(self["time"])
+        targets = pd.DatetimeIndex(np.atleast_1d(datetime)).as_unit(times.dt.unit)
+        targets = targets.sort_values()
+
+        if strategy == "nearest":
+            left, rows = _asof(self, times, targets, groupby, "nearest", window)
+            keep = rows >= 0
+            aligned = self.iloc[rows[keep]].copy()
+            aligned["target_time"] = left["target_time"].to_numpy()[keep]
+            aligned["delta_t"] = abs(aligned["time"] - aligned["target_time"])
+            return aligned
+
+        if strategy == "interpolate":
+            interpolated = _interpolate(self, times, targets, groupby, window)
+            return interpolated.__finalize__(self)
+
+        rows, which = _pairs_within(times, targets, window)
+        aligned = self.iloc[rows].copy()
+        aligned["target_time"] = targets[which]
+        if strategy == "window":
+            aligned["delta_t"] = abs(aligned["time"] - aligned["target_time"])
+            return aligned
+
+        numeric = _numeric_columns(aligned, exclude=[groupby, "target_time"])
+        other = [c for c in aligned.columns if c not in numeric]
+        other = [c for c in other if c not in (groupby, "target_time", "time")]
+        funcs = {c: "mean" for c in numeric} | {c: "first" for c in other}
+        grouped = aligned.groupby([groupby, "target_time"], sort=False, observed=True)
+        averaged = grouped.agg(funcs).reset_index()
+        averaged["time"] = averaged["target_time"]
+        averaged = averaged.sort_values(["target_time", groupby], ignore_index=True)
+        averaged = averaged[[c for c in self.columns] + ["target_time"]]
+        return averaged.__finalize__(self)
 
-    def get_spatial_value(self, other, column, buffer=0.25):
-        """Computes the mean value of all latitude and longitude within a buffer. 
+    def get_spatial_value(self, other, column, buffer=0.25, strategy="mean"):
+        """Computes a value from all latitude and longitude within a buffer. 
 
         For each row in the current data frame, compute a value based on data 
-        from another data frame. The computed value is the mean value, averaged
-        over the latitude and longitude that is "near" the point in the current
-        row. A point in the other data frame is "near" the current observation
-        if it's latitude and longitude is within plus or minus one buffer width
-        of the current row.
+        from another data frame. By default, the computed value is the mean
+        value, averaged over the latitude and longitude that is "near" the
+        point in the current row. A point in the other data frame is "near"
+        the current observation if it's latitude and longitude is within plus
+        or minus one buffer width of the current row.
+
+        The other data frame is indexed once, and every row is answered in a
+        single batch query, so the cost grows with the number of matches
+        rather than with the product of the frame sizes.
 
         Parameters
         ----------
@@ -56,14 +195,284 @@ class SampleDataFrame(pd.DataFrame):
             Specifies how big a space you want to average over. Specifically,
             it refers to how many degrees east and west (for longitude) and
             north and south (for latitude) that you want to average over.
+        strategy: str or callable, optional
+            Specifies how to combine the values that are near a row. Use one
+            of "mean", "median", "count", "std", and "nearest" (the value
+            closest to the row), or pass a function that reduces a pd.Series.
+            NaN values in the other frame are ignored.
+
         Returns
         ------- 
         pd.Series
             Contains one value per row in the original data frame. 
         """
-        def _compute_by_row(row):
-            is_in_lat = abs(row["latitude"] - other["latitude"]) <= buffer
-            is_in_lon = abs(row["longitude"] - other["longitude"]) <= buffer
-            return other[is_in_lat & is_in_lon][column].mean()
+        with timed("dataframe.spatial_join", rows=len(self)) as timer:
+            valid = other[column].notnull().to_numpy()
+            values = other[column].to_numpy()[valid].astype(float)
+            index = BoxIndex(
+                other["latitude"].to_numpy()[valid],
+                other["longitude"].to_numpy()[valid],
+            )
+            lats = self["latitude"].to_numpy(dtype=float)
+            lons = self["longitude"].to_numpy(dtype=float)
+            rows, neighbors = index.query(lats, lons, buffer)
+            timer.record(pairs=len(rows))
+
+            distances = None
+            if strategy == "nearest":
+                distances = np.hypot(
+                    index.lats[neighbors] - lats[rows],
+                    index.lons[neighbors] - lons[rows],
+                )
+            result = aggregate(
+                rows, values[neighbors], len(self), strategy=strategy, distances=distances
+            )
+        return pd.Series(result, index=self.index)
+
+    def get_spatial_values(
+        self, other, columns, buffer=0.25, strategy="mean", weights=None, power=2
+    ):
+        """Computes many values from all latitude and longitude within a buffer.
+
+        Like get_spatial_value(), but for many columns at once. The pixels
+        near each row are found once and stored as a SpatialOperator, and every
+        column is then averaged with one sparse matrix product, so each extra
+        column costs little. NaN values are ignored per column.
+
+        Parameters
+        ----------
+        other: data frame
+            Specifies the frame that contains the data values to compute.
+        columns: list of str or dict
+            Specifies the columns of the other frame to compute. Pass a dict
+            to map columns to new names.
+        buffer: float, optional
+            Specifies the half-width, in degrees, of the box around each row.
+        strategy: str, optional
+            Specifies how to weight the values near a row. Use one of "mean",
+            "inverse_distance", and "weighted". See SpatialOperator.
+        weights: str, optional
+            Specifies the column of the other frame that holds the weights for
+            the "weighted" strategy.
+        power: float, optional
+            Specifies the power of the distance for "inverse_distance".
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains the rows of this frame with one new column per computed
+            value.
+        """
+        if not isinstance(columns, dict):
+            columns = {column: column for column in columns}
+        if weights is not None:
+            weights = other[weights].to_numpy(dtype=float)
+        with timed("dataframe.spatial_join", rows=len(self)) as timer:
+            index = BoxIndex(
+                other["latitude"].to_numpy(dtype=float),
+                other["longitude"].to_numpy(dtype=float),
+            )
+            operator = SpatialOperator.from_points(
+                self["latitude"].to_numpy(dtype=float),
+                self["longitude"].to_numpy(dtype=float),
+                index,
+                buffer,
+                weighting=strategy,
+                weights=weights,
+                power=power,
+            )
+            timer.record(pairs=operator.matrix.nnz)
+            values = np.column_stack(
+                [other[column].to_numpy(dtype=float) for column in columns]
+            )
+            result = operator.apply(values)
+        wide = self.copy()
+        for i, name in enumerate(columns.values()):
+            wide[name] = result[:, i]
+        return wide
+
+    def sjoin_spacetime(
+        self,
+        other,
+        radius,
+        time_window,
+        how="inner",
+        metric="box",
+        suffixes=("", "_other"),
+    ):
+        """Joins the rows of two frames that are near in both space and time.
+
+        The other data frame is indexed once over latitude, longitude, and
+        time, and every row is answered in a single batch query. You can join
+        a season of ground observations with a season of flattened satellite
+        pixels in one call, without aligning each pass first.
+
+        Parameters
+        ----------
+        other: data frame
+            Specifies the frame to join. It must have `latitude`, `longitude`,
+            and `time` columns, like this frame.
+        radius: float
+            Specifies how far apart two rows can be. For the "box" metric, it
+            is the number of degrees north, south, east, and west. For the
+            "haversine" metric, it is the great-circle distance in kilometers.
+        time_window: timedelta
+            Specifies how far apart in time two rows can be.
+        how: str, optional
+            Specifies "inner" to keep only rows with a match, or "left" to
+            also keep the rows of this frame that have no match.
+        metric: str, optional
+            Specifies one of "box" and "haversine".
+        suffixes: tuple of str, optional
+            Specifies the suffixes of the columns that both frames have.
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains one row per matching pair, ordered like this frame, with
+            the columns of both frames. A `distance` column holds the distance
+            between the two rows, in degrees for "box" and in kilometers for
+            "haversine", and a `delta_t` column holds the absolute difference
+            in time.
+        """
+        if how not in ("inner", "left"):
+            raise ValueError(f"Unknown join {how!r}. Use one of ['inner', 'left'].")
+        with timed("dataframe.spacetime_join", rows=len(self)) as timer:
+            index = SpaceTimeIndex(
+                other["latitude"].to_numpy(dtype=float),
+                other["longitude"].to_numpy(dtype=float),
+                pd.to_datetime(other["time"]).to_numpy(),
+                radius,
+                time_window,
+                metric=metric,
+            )
+            rows, neighbors, distances = index.query(
+                self["latitude"].to_numpy(dtype=float),
+                self["longitude"].to_numpy(dtype=float),
+                pd.to_datetime(self["time"]).to_numpy(),
+            )
+            timer.record(pairs=len(rows))
+
+            if how == "left":
+                unmatched = np.setdiff1d(np.arange(len(self)), rows)
+                rows = np.concatenate([rows, unmatched])
+                neighbors = np.concatenate(
+                    [neighbors, np.full(len(unmatched), -1, dtype=np.intp)]
+                )
+                distances = np.concatenate([distances, np.full(len(unmatched), np.nan)])
+            order = np.lexsort((distances, rows))
+            rows, neighbors, distances = rows[order], neighbors[order], distances[order]
+
+            left = pd.DataFrame(self).iloc[rows].reset_index(drop=True)
+            matched = neighbors >= 0
+            right = pd.DataFrame(other).iloc[neighbors[matched]]
+            right = right.set_axis(np.flatnonzero(matched)).reindex(range(len(rows)))
+            joined = pd.merge(
+                left,
+                right,
+                left_index=True,
+                right_index=True,
+                suffixes=suffixes,
+            )
+            joined["distance"] = distances
+            times = pd.to_datetime(self["time"]).to_numpy().astype("datetime64[ns]")
+            other_times = np.full(len(rows), np.datetime64("NaT", "ns"))
+            other_times[matched] = index.times[neighbors[matched]]
+            joined["delta_t"] = abs(times[rows] - other_times)
+        return SampleDataFrame(joined).__finalize__(self)
+
+
+def _numeric_columns(df, exclude=()):
+    """Lists the numeric columns of a data frame, except the excluded ones."""
+    numeric = df.select_dtypes(include="number").columns
+    return [c for c in numeric if c not in exclude]
+
+
+def _asof(df, times, targets, groupby, direction, window):
+    """Finds, per group and target time, the row of an as-of match.
+
+    Returns
+    -------
+    tuple: (pd.DataFrame, np.ndarray)
+        Contains one row per (target time, group) pair, ordered by target
+        time and then by group, and the position of its matching row in `df`,
+        or -1 where there is no match.
+    """
+    groups = df[groupby]
+    valid = times.notnull().to_numpy() & groups.notnull().to_numpy()
+    right = pd.DataFrame(
+        {
+            groupby: groups[valid].to_numpy(),
+            "_time": times[valid].to_numpy(),
+            "_row": np.flatnonzero(valid),
+        }
+    ).sort_values("_time", kind="stable")
+
+    keys = np.sort(pd.unique(groups[valid].to_numpy()))
+    left = pd.DataFrame(
+        {
+            groupby: pd.Series(np.tile(keys, len(targets)), dtype=groups.dtype),
+            "target_time": np.repeat(targets.to_numpy(), len(keys)),
+        }
+    )
+    right[groupby] = right[groupby].astype(groups.dtype)
+    merged = pd.merge_asof(
+        left,
+        right,
+        left_on="target_time",
+        right_on="_time",
+        by=groupby,
+        direction=direction,
+        tolerance=window,
+    )
+    rows = merged["_row"].fillna(-1).to_numpy(dtype=np.intp)
+    return left, rows
+
+
+def _pairs_within(times, targets, window):
+    """Pairs every row with every target time that is within the window.
+
+    Returns
+    -------
+    tuple of np.ndarray: (rows, which)
+        Contains one entry per (row, target time) pair. The pairs are ordered
+        by target time and then by row.
+    """
+    t = times.to_numpy()
+    valid = ~np.isnat(t)
+    rows = np.flatnonzero(valid)
+    t = t[valid]
+    sorted_targets = targets.to_numpy()
+    lo = np.searchsorted(sorted_targets, t - window.to_numpy(), side="left")
+    hi = np.searchsorted(sorted_targets, t + window.to_numpy(), side="right")
+    counts = hi - lo
+    rows = np.repeat(rows, counts)
+    # Expand each [lo, hi) range into its members without a Python loop.
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    which = np.repeat(lo, counts) + offsets
+    order = np.lexsort((rows, which))
+    return rows[order], which[order]
+
+
+def _interpolate(df, times, targets, groupby, window):
+    """Linearly interpolates numeric columns to each target time, per group."""
+    left, before = _asof(df, times, targets, groupby, "backward", window)
+    _, after = _asof(df, times, targets, groupby, "forward", window)
+    keep = (before >= 0) & (after >= 0)
+    before, after = before[keep], after[keep]
+    target = left["target_time"].to_numpy()[keep]
+
+    t = times.to_numpy()
+    span = (t[after] - t[before]).astype("int64").astype(float)
+    elapsed = (target - t[before]).astype("int64").astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(span > 0, elapsed / span, 0.0)
 
-        return self.apply(_compute_by_row, axis=1)
\ No newline at end of file
+    interpolated = df.iloc[before].copy()
+    for column in _numeric_columns(df, exclude=[groupby]):
+        v0 = df[column].to_numpy(dtype=float)[before]
+        v1 = df[column].to_numpy(dtype=float)[after]
+        interpolated[column] = v0 + weight * (v1 - v0)
+    interpolated["time"] = target
+    interpolated["target_time"] = target
+    return interpolated
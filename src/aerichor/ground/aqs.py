@@ -11,23 +11,42 @@ AqiPollutant:
     Maps human-readable names to the key used by the AQS API service
 AqsClient:
     Manages data requests the the AQS API service.
+
+Functions
+---------
+unpack_samples:
+    Unpacks a list of AQS samples into a SampleDataFrame.
 """
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+import json
 import netrc
+from operator import itemgetter
 from pprint import pprint
 from time import sleep
 from urllib.parse import urljoin
 
+import numpy as np
 import requests
 import pandas as pd
 
 from aerichor.satellite.base import Swath
 from aerichor.dataframe import SampleDataFrame
+from aerichor.instrument import emit, timed
+from aerichor.ground.planner import plan_requests
+from aerichor.ground.ratelimit import TokenBucket
+from aerichor.utils import parse_gmt_times
 
 
 AQS_API_BASE_URL = "https://aqs.epa.gov/data/api/"
 
+# The AQS terms ask for a 5s pause between requests:
+# https://aqs.epa.gov/aqsweb/documents/data_api.html#terms
+# Every client shares this bucket unless it is given its own.
+AQS_RATE_LIMITER = TokenBucket(rate=1 / 5, capacity=1)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 class AqiPollutant(Enum):
     """Maps human-readable names to the key used by the AQS API service.
@@ -46,6 +65,19 @@ class AqiPollutant(Enum):
     PM25SM = 88502  # Acceptable PM2.5 AQI & Speciation MASS
 
 
+# The AQS parameter name of each pollutant, which becomes the `label` of the
+# frames that unpack_samples() returns. Keys are lowercase.
+PARAMETER_NAMES = {
+    "carbon monoxide": AqiPollutant.CO,
+    "sulfur dioxide": AqiPollutant.SO2,
+    "nitrogen dioxide (no2)": AqiPollutant.NO2,
+    "ozone": AqiPollutant.O3,
+    "pm10 total 0-10um stp": AqiPollutant.PM10,
+    "pm2.5 - local conditions": AqiPollutant.PM25,
+    "acceptable pm2.5 aqi & speciation mass": AqiPollutant.PM25SM,
+}
+
+
 class AqsClient:
     """Manages data requests to the EPA's AQS service. 
 
@@ -62,6 +94,22 @@ class AqsClient:
     key: str
         Specifies the string that is used to validate your credentials. This 
         value is provided to you when you validate your email address.
+    cache: ResponseCache, optional
+        Specifies an on-disk cache for successful responses. Requests that are
+        found in the cache skip the network and the rate limiter.
+    rate_limiter: TokenBucket, optional
+        Specifies the rate limiter that every request must pass. By default,
+        all clients share a limiter that allows one request every 5s.
+    max_retries: int, optional
+        Specifies how many times a request is retried after a 429 or 5xx
+        response.
+    backoff: float, optional
+        Specifies the delay, in seconds, before the first retry. The delay
+        doubles with each retry, unless the service sends a Retry-After header.
+    pool_size: int, optional
+        Specifies how many connections the session keeps open.
+    base_url: str, optional
+        Specifies the root URL of the AQS service.
 
     Attributes
     ----------
@@ -72,15 +120,43 @@ class AqsClient:
     credentials: 
         Stores a dictionary that contains the login and key in a format that
         is easily included in your AQS requests.
+    cache: ResponseCache or None
+        Stores the response cache.
+    rate_limiter: TokenBucket
+        Stores the rate limiter.
+    session: requests.Session
+        Stores the session that pools connections to the service.
 
     Returns
     -------
     self
     """
-    def __init__(self, *, login=None, key=None):
+    def __init__(
+        self,
+        *,
+        login=None,
+        key=None,
+        cache=None,
+        rate_limiter=None,
+        max_retries=3,
+        backoff=5.0,
+        pool_size=4,
+        base_url=AQS_API_BASE_URL,
+    ):
         self.login = login
         self.key = key
         self.credentials = {"email": login, "key": key}
+        self.cache = cache
+        self.rate_limiter = rate_limiter or AQS_RATE_LIMITER
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     @staticmethod
     def signup(email):
@@ -103,7 +179,7 @@ class AqsClient:
         return requests.get(url, params={"email": email})
 
     @classmethod
-    def from_netrc(cls):
+    def from_netrc(cls, **kwargs):
         """Creates an AqsClient from credentials in your netrc file.
 
         A netrc file is a private per-user file that contains login information
@@ -116,7 +192,8 @@ class AqsClient:
 
         Parameters
         ----------
-        None
+        **kwargs: key-value pairs
+            Specifies other parameters of the AqsClient, like `cache`.
         
         Returns
         -------
@@ -124,7 +201,7 @@ class AqsClient:
         """
         auth = netrc.netrc()
         login, key, _ = auth.authenticators("aqs.epa.gov")
-        return cls(login=login, key=key)
+        return cls(login=login, key=key, **kwargs)
 
     def get(self, endpoint, **kwargs):
         """Issues a general request to the AQS service.
@@ -144,21 +221,75 @@ class AqsClient:
             Specifies the parameters to provide to the AQS service. A detailed
             list of parameters is found here:
 
+        Every request waits for the client's rate limiter, so requests from
+        many threads are spaced according to the AQS terms. Responses with a
+        429 or 5xx status are retried with exponential backoff.
+
+        If the client has a cache, the response is looked up by endpoint and
+        non-credential parameters first. A cached response is returned without
+        a request and without waiting for the rate limiter. Only successful
+        responses are stored: AQS reports errors and throttling with a 200
+        status and a "Failed" header, and those are never cached.
+
         Returns
         -------
         request.Response 
         """
+        url = urljoin(self.base_url, endpoint)
+        if self.cache is not None:
+            with timed("aqs.cache", endpoint=endpoint) as timer:
+                content = self.cache.get(endpoint, kwargs)
+                timer.record(hit=content is not None)
+            if content is not None:
+                return self._cached_response(url, content)
+
         params = self.credentials.copy()
         params.update(kwargs)
-        url = urljoin(AQS_API_BASE_URL, endpoint)
-        response = requests.get(url, params=params)
-        if response.ok:
-            # Built-in delay so we don't accidentally spam server:
-            # https://aqs.epa.gov/aqsweb/documents/data_api.html#terms
-            sleep(5)
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limiter.acquire()
+            emit("aqs.rate_limit", wait, endpoint=endpoint)
+            with timed("aqs.request", endpoint=endpoint, attempt=attempt) as timer:
+                response = self.session.get(url, params=params)
+                timer.record(bytes=len(response.content), status=response.status_code)
+            if response.status_code not in RETRY_STATUSES:
+                break
+            if attempt < self.max_retries:
+                sleep(self._retry_delay(response, attempt))
+
+        if self.cache is not None and self._succeeded(response):
+            self.cache.put(endpoint, kwargs, response.content)
         return response
 
-    def get_pollutant_in_swath(self, pollutant: AqiPollutant, swath: Swath):
+    @staticmethod
+    def _succeeded(response):
+        """Returns True if a response holds data, not an error in its Header."""
+        if not response.ok:
+            return False
+        try:
+            header = json.loads(response.content)["Header"][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return False
+        return header.get("status") != "Failed"
+
+    def _retry_delay(self, response, attempt):
+        """Returns how long to wait before retrying a request."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2**attempt
+
+    @staticmethod
+    def _cached_response(url, content):
+        """Wraps a cached body in a requests.Response."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = content
+        response.encoding = "utf-8"
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    def get_pollutant_in_swath(self, pollutant: AqiPollutant, swath: Swath, fields=()):
         """Retrieves measurements of a pollutant within a Swath's bounding box.
 
         This method retrieves all measurements of a pollutant from all sensors
@@ -166,12 +297,13 @@ class AqsClient:
         into a SampleDataFrame. 
         
         Because a bounding box is grid-aligned, many sensors might fall outside
-        of the Swath's path. 
+        of the Swath's path. Those sensors are dropped before the data frame
+        is built, so that only sensors inside the Swath's footprint remain.
         
-        This method contains a built-in 5s delay so that you do not accidentally
-        exceed the API rate requests. Because this method is capped at a day's
-        worth of sensor data, you generally do not need to worry about exceeding
-        the limit for data volume per request.
+        Requests pass through the client's rate limiter so that you do not
+        accidentally exceed the API rate requests. Because this method is
+        capped at a day's worth of sensor data, you generally do not need to
+        worry about exceeding the limit for data volume per request.
 
         Parameters
         ----------
@@ -180,41 +312,184 @@ class AqsClient:
         swath:
             Specifies the reference Swath, whose bounding box is used in the 
             API request. 
+        fields: sequence of str, optional
+            Specifies additional AQS fields to include as columns, like "poc",
+            "method_code", and "qualifier".
 
         Returns
         -------
         SampleDataFrame
             Contains latitude, longitude, site_id, time, and the pollutant's
-            measurement.
+            measurement, followed by the additional fields.
         """
-        x0, x1, y0, y1 = swath.bbox.to_extent()
+        samples = self._get_samples_by_box(
+            pollutant,
+            swath.start.strftime("%Y%m%d"),
+            swath.end.strftime("%Y%m%d"),
+            swath.bbox.to_extent(),
+        )
+        return self._in_swath(unpack_samples(samples, fields), swath)
+
+    def _get_samples_by_box(self, pollutant, bdate, edate, extent):
+        """Requests the samples of a pollutant within a box and date range."""
+        x0, x1, y0, y1 = extent
         params = dict(
             param=pollutant.value,
-            bdate=swath.start.strftime("%Y%m%d"),
-            edate=swath.end.strftime("%Y%m%d"),
+            bdate=bdate,
+            edate=edate,
             minlon=x0,
             maxlon=x1,
             minlat=y0,
             maxlat=y1,
         )
-        samples = self.get("sampleData/byBox", **params).json()["Data"]
-
-        # There's a better way to unpack this because n_obs > n_var.
-        # Might be worth fixing, but I suspect the built-in 5s delay dominates.
-        data = {
-            "site_id": [sample["site_number"] for sample in samples],
-            "longitude": [sample["longitude"] for sample in samples],
-            "latitude": [sample["latitude"] for sample in samples],
-            "time": [self._parse_datetime(sample) for sample in samples],
-            "measurement": [sample["sample_measurement"] for sample in samples],
-        }
-        df = SampleDataFrame(data)
-        df.units = samples[0]["units_of_measure"]
-        df.label = samples[0]["parameter"]
-        return df
+        response = self.get("sampleData/byBox", **params)
+        with timed("aqs.decode") as timer:
+            samples = response.json()["Data"]
+            timer.record(rows=len(samples))
+        return samples
 
     @staticmethod
-    def _parse_datetime(sample):
-        """Reads a date string from the AQS service and returns a datetime object."""
-        date_string = "".join([sample["date_gmt"], "T", sample["time_gmt"], ":00.00"])
-        return datetime.fromisoformat(date_string)
+    def _in_swath(df, swath):
+        """Keeps only the rows of a SampleDataFrame that are inside a Swath."""
+        in_swath = swath.contains_points(df["longitude"], df["latitude"])
+        return df[in_swath].reset_index(drop=True)
+
+    def batch_get_pollutant_in_swath(self, jobs, max_workers=4):
+        """Retrieves measurements for many (pollutant, swath) pairs concurrently.
+
+        Requests are issued from a pool of threads that share the client's
+        session and rate limiter. The rate limiter, not a fixed delay, decides
+        when each request goes out, so the service's terms are respected while
+        response parsing and network latency overlap.
+
+        Parameters
+        ----------
+        jobs: iterable of (AqiPollutant, Swath)
+            Specifies the pollutant and reference Swath of each request.
+        max_workers: int, optional
+            Specifies how many requests can be in flight at once.
+
+        Returns
+        -------
+        list of SampleDataFrame
+            Contains one result per job, in the same order as the jobs.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.get_pollutant_in_swath, pollutant, swath)
+                for pollutant, swath in jobs
+            ]
+            return [future.result() for future in futures]
+
+    def get_pollutant_in_swaths(
+        self, pollutant, swaths, gap=0.0, max_workers=4, fields=()
+    ):
+        """Retrieves measurements of a pollutant for many Swaths with few requests.
+
+        Swaths on the same date whose bounding boxes overlap (or are within
+        `gap` degrees of each other) are served by one combined request. The
+        returned rows are then split back into one SampleDataFrame per Swath
+        by the Swath's footprint, so each result matches what
+        get_pollutant_in_swath() returns for that Swath.
+
+        Parameters
+        ----------
+        pollutant: AqiPollutant.{CO, SO2, NO2, O3, PM10, PM25, PM25SM}
+            Specifies the pollutant measurements to retrieve.
+        swaths: list of Swath
+            Specifies the reference Swaths.
+        gap: float, optional
+            Specifies how many degrees apart two bounding boxes can be and
+            still be combined into one request.
+        max_workers: int, optional
+            Specifies how many requests can be in flight at once.
+        fields: sequence of str, optional
+            Specifies additional AQS fields to include as columns.
+
+        Returns
+        -------
+        list of SampleDataFrame
+            Contains one result per Swath, in the same order as the Swaths.
+        """
+        plans = plan_requests(swaths, gap=gap)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._get_samples_by_box,
+                    pollutant,
+                    plan.bdate,
+                    plan.edate,
+                    plan.extent,
+                )
+                for plan in plans
+            ]
+            responses = [future.result() for future in futures]
+
+        results = [None] * len(swaths)
+        for plan, samples in zip(plans, responses):
+            df = unpack_samples(samples, fields)
+            for i in plan.members:
+                results[i] = self._in_swath(df, swaths[i])
+        return results
+
+
+def unpack_samples(samples, fields=()):
+    """Unpacks a list of AQS samples into a SampleDataFrame.
+
+    The samples are read in one pass and converted column by column. Dates
+    and times are parsed once per distinct value rather than once per sample.
+    Site IDs and other text fields are stored as categories.
+
+    Parameters
+    ----------
+    samples: list of dict
+        Specifies the samples, as found in the "Data" field of a sampleData
+        response.
+    fields: sequence of str, optional
+        Specifies additional AQS fields to include as columns, like "poc",
+        "method_code", and "qualifier". Samples that lack a field have a null
+        value in its column.
+
+    Returns
+    -------
+    SampleDataFrame
+        Contains latitude, longitude, site_id, time, and the pollutant's
+        measurement, followed by the additional fields.
+    """
+    with timed("aqs.unpack", rows=len(samples)):
+        return _unpack_samples(samples, fields)
+
+
+def _unpack_samples(samples, fields):
+    getter = itemgetter(
+        "site_number",
+        "longitude",
+        "latitude",
+        "date_gmt",
+        "time_gmt",
+        "sample_measurement",
+    )
+    if fields:
+        rows = [getter(sample) + tuple(map(sample.get, fields)) for sample in samples]
+    else:
+        rows = [getter(sample) for sample in samples]
+    n_columns = 6 + len(fields)
+    columns = list(zip(*rows)) if rows else [()] * n_columns
+
+    data = {
+        "site_id": pd.Categorical(columns[0]),
+        "longitude": np.array(columns[1], dtype=np.float64),
+        "latitude": np.array(columns[2], dtype=np.float64),
+        "time": parse_gmt_times(columns[3], columns[4]),
+        "measurement": np.array(columns[5], dtype=np.float32),
+    }
+    for field, column in zip(fields, columns[6:]):
+        values = pd.Series(column, dtype=object)
+        if values.map(lambda v: isinstance(v, str)).any():
+            data[field] = pd.Categorical(values)
+        else:
+            data[field] = pd.to_numeric(values)
+    df = SampleDataFrame(data)
+    df.units = samples[0]["units_of_measure"] if samples else None
+    df.label = samples[0]["parameter"] if samples else None
+    return df
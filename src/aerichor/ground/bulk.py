@@ -0,0 +1,336 @@
+"""
+This module serves AQS measurements from the EPA's pre-generated bulk files
+instead of the AQS API.
+
+The EPA publishes a year of hourly measurements of a parameter per file, like
+hourly_88101_2024.zip:
+https://aqs.epa.gov/aqsweb/airdata/download_files.html
+
+The files are ingested once into a Parquet dataset partitioned by pollutant
+and date (see aerichor.io), with a table of site coordinates. Queries then
+only read the partitions of the requested dates, only when a site is inside
+the requested area, and never wait on the network or a rate limiter.
+
+Sites are found with a vectorized scan of the site table rather than a
+spatial index. The table has one row per pollutant and site, so a few
+thousand rows even for the whole country. Filtering it with vectorized
+comparisons or shapely.contains_xy() takes about a millisecond, which is
+less than building an index would cost, and far less than reading the
+samples. For the same reason, the table is simply rewritten after each
+ingested file.
+
+Each file is ingested into a staging directory first. Its Parquet files are
+moved into the dataset, and only then is the file added to the manifest. The
+moved files are named after the bulk file, so if an ingest is interrupted,
+the next ingest of the file removes whatever part of it was staged or moved
+before it starts over. Rows are never added twice.
+
+Classes
+-------
+BulkSource:
+    Serves AQS measurements from ingested bulk files, with the interface of
+    AqsClient.
+"""
+import json
+from pathlib import Path
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from aerichor.dataframe import SampleDataFrame
+from aerichor.ground.aqs import AqiPollutant, unpack_samples
+from aerichor.instrument import timed
+from aerichor.io import read_dataset, write_dataset
+from aerichor.utils import parse_gmt_times
+
+
+# Maps the AQS API names of the fields to the columns of the bulk files.
+BULK_FIELDS = {
+    "state_code": ("State Code", "str"),
+    "county_code": ("County Code", "str"),
+    "parameter_code": ("Parameter Code", "str"),
+    "poc": ("POC", "int64"),
+    "datum": ("Datum", "str"),
+    "parameter": ("Parameter Name", "str"),
+    "date_local": ("Date Local", "str"),
+    "time_local": ("Time Local", "str"),
+    "units_of_measure": ("Units of Measure", "str"),
+    "mdl": ("MDL", "float64"),
+    "uncertainty": ("Uncertainty", "float64"),
+    "qualifier": ("Qualifier", "str"),
+    "method_type": ("Method Type", "str"),
+    "method_code": ("Method Code", "str"),
+    "method": ("Method Name", "str"),
+    "state": ("State Name", "str"),
+    "county": ("County Name", "str"),
+}
+BULK_COLUMNS = {
+    "Site Num": "str",
+    "Latitude": "float64",
+    "Longitude": "float64",
+    "Date GMT": "str",
+    "Time GMT": "str",
+    "Sample Measurement": "float64",
+} | dict(BULK_FIELDS.values())
+
+MANIFEST_NAME = ".aerichor-bulk.json"
+SAMPLES = "samples"
+STAGING = ".staging"
+SITES = "sites.parquet"
+
+
+class BulkSource:
+    """Serves AQS measurements from ingested bulk files.
+
+    Results have the same columns, dtypes, `units`, and `label` as the results
+    of AqsClient, so a BulkSource can be passed wherever a client is used,
+    for example to aerichor.pipeline.collocate.
+
+    Parameters
+    ----------
+    path: str or Path
+        Specifies the directory of the store. It is created if it does not
+        exist.
+
+    Attributes
+    ----------
+    path: Path
+        Stores the directory of the store.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest = self.path / MANIFEST_NAME
+        self._files = {}
+        if manifest.exists():
+            self._files = json.loads(manifest.read_text())["files"]
+        self._sites = None
+
+    @property
+    def files(self):
+        """Lists the names of the bulk files that were ingested."""
+        return sorted(self._files)
+
+    @property
+    def sites(self):
+        """Returns the pollutant, site_id, longitude, and latitude of each site."""
+        if self._sites is None:
+            file = self.path / SITES
+            if file.exists():
+                self._sites = pd.read_parquet(file)
+            else:
+                self._sites = pd.DataFrame(
+                    {
+                        "pollutant": pd.Series(dtype="str"),
+                        "site_id": pd.Series(dtype="str"),
+                        "longitude": pd.Series(dtype=np.float64),
+                        "latitude": pd.Series(dtype=np.float64),
+                    }
+                )
+        return self._sites
+
+    def ingest(self, files, chunksize=1_000_000):
+        """Adds bulk files to the store.
+
+        Files are read in chunks of rows, so a year of measurements does not
+        have to fit in memory. Files that were already ingested are skipped,
+        and the rows of an interrupted ingest are replaced.
+
+        Parameters
+        ----------
+        files: iterable of str or Path
+            Specifies the bulk files, like hourly_88101_2024.zip. Zipped and
+            unzipped CSV files are both accepted.
+        chunksize: int, optional
+            Specifies how many rows are read at once.
+
+        Returns
+        -------
+        int
+            The number of rows that were added.
+        """
+        added = 0
+        for file in map(Path, files):
+            size = file.stat().st_size
+            if file.name in self._files:
+                if self._files[file.name]["size"] != size:
+                    msg = (
+                        f"{file.name} changed since it was ingested. Ingest it "
+                        "into a new store."
+                    )
+                    raise ValueError(msg)
+                continue
+            rows = self._ingest_file(file, chunksize)
+            self._files[file.name] = {"size": size, "rows": rows}
+            (self.path / MANIFEST_NAME).write_text(
+                json.dumps({"files": self._files}, indent=1)
+            )
+            added += rows
+        return added
+
+    def _ingest_file(self, file, chunksize):
+        prefix = "bulk-" + file.name.replace(".", "_")
+        staging = self.path / STAGING / prefix
+        # Remove what an interrupted ingest of the file left behind.
+        shutil.rmtree(staging, ignore_errors=True)
+        for part in (self.path / SAMPLES).glob(f"*/*/{prefix}-*.parquet"):
+            part.unlink()
+
+        rows = 0
+        sites = [self.sites] if len(self.sites) else []
+        reader = pd.read_csv(
+            file,
+            usecols=list(BULK_COLUMNS),
+            dtype=BULK_COLUMNS,
+            chunksize=chunksize,
+        )
+        for chunk in reader:
+            with timed("aqs.ingest", file=file.name, rows=len(chunk)):
+                for code, group in chunk.groupby("Parameter Code", sort=False):
+                    df = _from_bulk(group)
+                    write_dataset(df, staging, _pollutant_name(code), prefix)
+                    site = df[["site_id", "longitude", "latitude"]].drop_duplicates()
+                    sites.append(site.assign(pollutant=_pollutant_name(code)))
+            rows += len(chunk)
+        for part in staging.glob("*/*/*.parquet"):
+            target = self.path / SAMPLES / part.relative_to(staging)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            part.replace(target)
+        shutil.rmtree(staging)
+        columns = ["pollutant", "site_id", "longitude", "latitude"]
+        self._sites = pd.concat(sites, ignore_index=True)[columns].drop_duplicates(
+            ignore_index=True
+        )
+        self._sites.to_parquet(self.path / SITES, index=False)
+        return rows
+
+    def get_pollutant_in_bbox(self, pollutant, extent, bdate, edate, fields=()):
+        """Retrieves measurements of a pollutant within a box and date range.
+
+        Parameters
+        ----------
+        pollutant: AqiPollutant.{CO, SO2, NO2, O3, PM10, PM25, PM25SM}
+            Specifies the pollutant measurements to retrieve.
+        extent: tuple of form: (x0, x1, y0, y1)
+            Specifies the box, like BoundingBox.to_extent() returns.
+        bdate: date
+            Specifies the first date, in GMT.
+        edate: date
+            Specifies the last date, in GMT. Every measurement of the date is
+            included.
+        fields: sequence of str, optional
+            Specifies additional AQS fields to include as columns, like "poc",
+            "method_code", and "qualifier".
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains latitude, longitude, site_id, time, and the pollutant's
+            measurement, followed by the additional fields.
+        """
+        x0, x1, y0, y1 = extent
+        sites = self.sites[self.sites["pollutant"] == _pollutant_name(pollutant)]
+        inside = sites["longitude"].between(x0, x1) & sites["latitude"].between(y0, y1)
+        return self._read(pollutant, sites[inside], bdate, edate, fields)
+
+    def get_pollutant_in_swath(self, pollutant, swath, fields=()):
+        """Retrieves measurements of a pollutant within a Swath.
+
+        Like AqsClient.get_pollutant_in_swath(), this method returns every
+        measurement of the Swath's dates from the sensors inside the Swath's
+        footprint.
+
+        Parameters
+        ----------
+        pollutant: AqiPollutant.{CO, SO2, NO2, O3, PM10, PM25, PM25SM}
+            Specifies the pollutant measurements to retrieve.
+        swath: Swath
+            Specifies the reference Swath.
+        fields: sequence of str, optional
+            Specifies additional AQS fields to include as columns.
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains latitude, longitude, site_id, time, and the pollutant's
+            measurement, followed by the additional fields.
+        """
+        sites = self.sites[self.sites["pollutant"] == _pollutant_name(pollutant)]
+        inside = swath.contains_points(sites["longitude"], sites["latitude"])
+        df = self._read(pollutant, sites[inside], swath.start, swath.end, fields)
+        in_swath = swath.contains_points(df["longitude"], df["latitude"])
+        return df[in_swath].reset_index(drop=True)
+
+    def get_pollutant_in_swaths(self, pollutant, swaths, fields=()):
+        """Retrieves measurements of a pollutant for many Swaths.
+
+        Returns
+        -------
+        list of SampleDataFrame
+            Contains one result per Swath, in the same order as the Swaths.
+        """
+        return [self.get_pollutant_in_swath(pollutant, s, fields) for s in swaths]
+
+    def _read(self, pollutant, sites, bdate, edate, fields):
+        """Reads the measurements of the given sites on whole days in GMT."""
+        if len(sites) == 0:
+            return unpack_samples([], fields)
+        unknown = set(fields) - set(BULK_FIELDS)
+        if unknown:
+            raise ValueError(f"Bulk files do not have the fields {unknown}.")
+        longitude, latitude = ds.field("longitude"), ds.field("latitude")
+        box = (
+            (longitude >= sites["longitude"].min())
+            & (longitude <= sites["longitude"].max())
+            & (latitude >= sites["latitude"].min())
+            & (latitude <= sites["latitude"].max())
+        )
+        columns = ["site_id", "longitude", "latitude", "time", "measurement"]
+        start = pd.Timestamp(bdate).normalize()
+        end = pd.Timestamp(edate).normalize() + pd.Timedelta(days=1, nanoseconds=-1)
+        df = read_dataset(
+            self.path / SAMPLES,
+            columns=columns + list(fields),
+            pollutant=_pollutant_name(pollutant),
+            start=start,
+            end=end,
+            filter=box,
+        )
+        df = df.sort_values(["site_id", "time"], ignore_index=True, kind="stable")
+        df["site_id"] = pd.Categorical(df["site_id"])
+        df["time"] = df["time"].to_numpy("datetime64[ns]")
+        for field in fields:
+            if BULK_FIELDS[field][1] == "str":
+                df[field] = pd.Categorical(df[field])
+        return df
+
+
+def _pollutant_name(pollutant):
+    """Returns the partition name of an AqiPollutant or a parameter code."""
+    if isinstance(pollutant, AqiPollutant):
+        return pollutant.name
+    try:
+        return AqiPollutant(int(pollutant)).name
+    except ValueError:
+        return str(pollutant)
+
+
+def _from_bulk(chunk):
+    """Converts rows of a bulk file into the columns of unpack_samples()."""
+    data = {
+        "site_id": chunk["Site Num"].to_numpy(dtype=object),
+        "longitude": chunk["Longitude"].to_numpy(dtype=np.float64),
+        "latitude": chunk["Latitude"].to_numpy(dtype=np.float64),
+        "time": parse_gmt_times(chunk["Date GMT"], chunk["Time GMT"]),
+        "measurement": chunk["Sample Measurement"].to_numpy(dtype=np.float32),
+    }
+    for field, (column, _) in BULK_FIELDS.items():
+        data[field] = chunk[column].to_numpy()
+    df = SampleDataFrame(data)
+    df["site_id"] = df["site_id"].astype("str")
+    df.units = chunk["Units of Measure"].iloc[0]
+    df.label = chunk["Parameter Name"].iloc[0]
+    return df
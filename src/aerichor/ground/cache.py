@@ -0,0 +1,220 @@
+"""
+This module stores responses from web services on disk so that repeated
+requests do not have to go over the network.
+
+Classes
+-------
+ResponseCache:
+    Stores response bodies in a SQLite database that is keyed by endpoint and
+    parameters.
+"""
+from contextlib import closing, contextmanager
+from datetime import timedelta
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+
+def default_cache_path():
+    """Returns the default location of the cache database."""
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "aerichor" / "responses.sqlite"
+
+
+class ResponseCache:
+    """Stores response bodies on disk, keyed by endpoint and parameters.
+
+    Entries are evicted when they are older than `max_age` or, least recently
+    used first, when the total size of the stored bodies exceeds `max_bytes`.
+    Do not include credentials in the parameters that you pass to the cache.
+
+    Parameters
+    ----------
+    path: str or Path, optional
+        Specifies the location of the SQLite database. By default, the
+        database is stored in your user cache directory.
+    max_bytes: int, optional
+        Specifies the maximum total size of the stored bodies.
+    max_age: timedelta or float, optional
+        Specifies how long an entry is valid, as a timedelta or in seconds.
+        By default, entries do not expire.
+
+    Attributes
+    ----------
+    path: Path
+        Stores the location of the database.
+    hits: int
+        Counts the lookups that found an entry in this session.
+    misses: int
+        Counts the lookups that did not find an entry in this session.
+    """
+
+    def __init__(self, path=None, *, max_bytes=1024**3, max_age=None):
+        self.path = Path(path) if path else default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        if isinstance(max_age, timedelta):
+            max_age = max_age.total_seconds()
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    content BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Opens the database, commits on success, and always closes it."""
+        with closing(sqlite3.connect(self.path, timeout=30)) as db:
+            with db:
+                yield db
+
+    @staticmethod
+    def _serialize(params):
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def key(self, endpoint, params):
+        """Returns the key of the entry for an endpoint and its parameters."""
+        text = endpoint + "?" + self._serialize(params)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, endpoint, params):
+        """Returns the stored body for a request, or None if there is none.
+
+        Parameters
+        ----------
+        endpoint: str
+            Specifies the endpoint of the request.
+        params: dict
+            Specifies the non-credential parameters of the request.
+
+        Returns
+        -------
+        bytes or None
+        """
+        key = self.key(endpoint, params)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.max_age is not None and now - row[1] > self.max_age:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, endpoint, params, content):
+        """Stores the body of a response.
+
+        Parameters
+        ----------
+        endpoint: str
+            Specifies the endpoint of the request.
+        params: dict
+            Specifies the non-credential parameters of the request.
+        content: bytes
+            Specifies the body of the response.
+        """
+        key = self.key(endpoint, params)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    endpoint,
+                    self._serialize(params),
+                    content,
+                    len(content),
+                    now,
+                    now,
+                ),
+            )
+            self._evict(db, now)
+
+    def _evict(self, db, now):
+        if self.max_age is not None:
+            db.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the least recently used entries until the cache fits.
+        excess = total - self.max_bytes
+        rows = db.execute("SELECT key, size FROM responses ORDER BY accessed")
+        stale = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            stale.append((key,))
+            excess -= size
+        db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def evict(self):
+        """Removes expired entries and trims the cache to its size limit."""
+        with self._lock, self._connect() as db:
+            self._evict(db, time.time())
+
+    def entries(self):
+        """Lists the stored entries, most recently used first.
+
+        Returns
+        -------
+        list of dict
+            Contains the endpoint, parameters, size in bytes, and the creation
+            and last access times (in seconds since the epoch) of each entry.
+        """
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT endpoint, params, size, created, accessed FROM responses "
+                "ORDER BY accessed DESC"
+            ).fetchall()
+        return [
+            {
+                "endpoint": endpoint,
+                "params": json.loads(params),
+                "bytes": size,
+                "created": created,
+                "accessed": accessed,
+            }
+            for endpoint, params, size, created, accessed in rows
+        ]
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+    @property
+    def stats(self):
+        """Returns the hits, misses, number of entries, and bytes stored."""
+        with self._connect() as db:
+            entries, size = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
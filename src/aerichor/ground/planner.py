@@ -0,0 +1,107 @@
+"""
+This module plans the fewest AQS requests that cover many Swaths.
+
+Satellite passes often fall on the same day over overlapping regions. Instead
+of one request per Swath, the passes of each day are combined so that every
+group of overlapping (or nearby) bounding boxes is fetched with one request.
+
+Classes
+-------
+RequestPlan:
+    Describes one request and the Swaths that it serves.
+
+Functions
+---------
+plan_requests:
+    Groups Swaths into the fewest requests by date and bounding box.
+"""
+
+
+class RequestPlan:
+    """Describes one request and the Swaths that it serves.
+
+    Parameters
+    ----------
+    bdate: str
+        Specifies the first date of the request, formatted as YYYYMMDD.
+    edate: str
+        Specifies the last date of the request, formatted as YYYYMMDD.
+    extent: tuple of form: (x0, x1, y0, y1)
+        Specifies the box that the request covers.
+    members: list of int
+        Specifies the positions of the Swaths that the request serves.
+    """
+
+    def __init__(self, bdate, edate, extent, members):
+        self.bdate = bdate
+        self.edate = edate
+        self.extent = extent
+        self.members = members
+
+    def __repr__(self):
+        return (
+            f"RequestPlan(bdate={self.bdate!r}, edate={self.edate!r}, "
+            f"extent={self.extent!r}, members={self.members!r})"
+        )
+
+
+def _is_near(a, b, gap):
+    """Returns True if two extents overlap once grown by the gap."""
+    return not (
+        a[1] + gap < b[0]
+        or b[1] + gap < a[0]
+        or a[3] + gap < b[2]
+        or b[3] + gap < a[2]
+    )
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3]))
+
+
+def plan_requests(swaths, gap=0.0):
+    """Groups Swaths into the fewest requests by date and bounding box.
+
+    Swaths are grouped by the dates that they cover. Within a group, bounding
+    boxes that overlap, or that are within `gap` degrees of each other, are
+    merged until no two remaining boxes are near each other.
+
+    Parameters
+    ----------
+    swaths: list of Swath
+        Specifies the Swaths that need data.
+    gap: float, optional
+        Specifies how many degrees apart two boxes can be and still be merged.
+        A larger gap means fewer requests, but each request covers more area
+        that no Swath needs.
+
+    Returns
+    -------
+    list of RequestPlan
+        Contains the requests, ordered by date. Every Swath is a member of
+        exactly one request.
+    """
+    by_date = {}
+    for i, swath in enumerate(swaths):
+        dates = (swath.start.strftime("%Y%m%d"), swath.end.strftime("%Y%m%d"))
+        by_date.setdefault(dates, []).append(i)
+
+    plans = []
+    for (bdate, edate), members in sorted(by_date.items()):
+        groups = [(swaths[i].bbox.to_extent(), [i]) for i in members]
+        merged = True
+        while merged:
+            merged = False
+            for a in range(len(groups)):
+                for b in range(a + 1, len(groups)):
+                    if _is_near(groups[a][0], groups[b][0], gap):
+                        extent = _union(groups[a][0], groups[b][0])
+                        groups[a] = (extent, groups[a][1] + groups[b][1])
+                        del groups[b]
+                        merged = True
+                        break
+                if merged:
+                    break
+        for extent, indices in groups:
+            plans.append(RequestPlan(bdate, edate, extent, sorted(indices)))
+    return plans
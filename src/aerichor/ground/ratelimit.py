@@ -0,0 +1,70 @@
+"""
+This module limits how often requests are sent to a web service.
+
+Classes
+-------
+TokenBucket:
+    Limits the rate of requests across every thread that shares it.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Limits the rate of requests across every thread that shares it.
+
+    The bucket holds up to `capacity` tokens and gains `rate` tokens per
+    second. Each request takes one token. When the bucket is empty, the
+    request waits only as long as it takes for the next token to arrive, so a
+    lone request never waits and concurrent requests are spaced evenly.
+
+    Parameters
+    ----------
+    rate: float
+        Specifies how many tokens are added per second.
+    capacity: int, optional
+        Specifies how many tokens the bucket can hold, that is, how many
+        requests can be sent back-to-back.
+
+    Attributes
+    ----------
+    rate: float
+        Stores the rate.
+    capacity: int
+        Stores the capacity.
+    waited: float
+        Accumulates the seconds that requests have waited for a token.
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0 or capacity < 1:
+            msg = "The rate must be positive and the capacity at least 1."
+            raise ValueError(msg)
+        self.rate = rate
+        self.capacity = capacity
+        self.waited = 0.0
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting for one if the bucket is empty.
+
+        Returns
+        -------
+        float
+            The number of seconds spent waiting.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+            # Reserve the token now, even if it has not arrived yet, so that
+            # waiting threads line up instead of racing for the same token.
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,253 @@
+"""
+This module times the stages of the data path and reports them to listeners.
+
+Instrumentation is off until a listener is added. While it is off, timing a
+stage costs one check of an empty list. The easiest way to turn it on for a
+single run is the `profile` context manager:
+
+    with profile() as run:
+        df = api.get_pollutant_in_swath(AqiPollutant.PM25, swath)
+    print(run.summary())
+
+Listeners are per process, so stages that run in a process pool (for example,
+in `aerichor.pipeline.collocate`) are not reported to the calling process.
+
+Stages
+------
+aqs.cache:
+    A lookup in the response cache. Has `hit`.
+aqs.rate_limit:
+    Time spent waiting for the rate limiter.
+aqs.request:
+    An HTTP request. Has `bytes` and `status`.
+aqs.decode:
+    Decoding a JSON response. Has `rows`.
+aqs.unpack:
+    Unpacking samples into a SampleDataFrame. Has `rows`.
+aqs.ingest:
+    Ingesting a chunk of a bulk file into a BulkSource. Has `rows`.
+satellite.open:
+    Opening a granule. Has `bytes` (the file size) and `lazy`.
+satellite.read:
+    Reading a group or variable of a lazily opened granule. Has `bytes`.
+satellite.read_block:
+    Reading and filtering a block of lines in read_granules(). Has `rows`.
+dataframe.align:
+    align_temporally(). Has `rows`.
+dataframe.spatial_join:
+    get_spatial_value(). Has `rows` and `pairs`.
+dataframe.spacetime_join:
+    sjoin_spacetime(). Has `rows` and `pairs`.
+
+Classes
+-------
+Event:
+    Describes one timed stage.
+Profile:
+    Collects the events of a run and summarizes them.
+
+Functions
+---------
+add_listener:
+    Registers a function that is called with every Event.
+remove_listener:
+    Unregisters a listener.
+timed:
+    Times a stage in a with block.
+emit:
+    Reports an event that was measured elsewhere.
+profile:
+    Collects the events of a with block into a Profile.
+log_events:
+    Creates a listener that writes events to a logger.
+"""
+from contextlib import contextmanager
+import logging
+import time
+
+import pandas as pd
+
+
+_listeners = []
+
+
+class Event:
+    """Describes one timed stage.
+
+    Attributes
+    ----------
+    stage: str
+        Stores the name of the stage.
+    duration: float
+        Stores the duration in seconds.
+    fields: dict
+        Stores stage-specific values, like `bytes` and `rows`.
+    """
+
+    __slots__ = ("stage", "duration", "fields")
+
+    def __init__(self, stage, duration, fields):
+        self.stage = stage
+        self.duration = duration
+        self.fields = fields
+
+    def __repr__(self):
+        fields = "".join(f", {k}={v!r}" for k, v in self.fields.items())
+        return f"Event({self.stage!r}, {self.duration:.6f}{fields})"
+
+
+def add_listener(listener):
+    """Registers a function that is called with every Event."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """Unregisters a listener."""
+    _listeners.remove(listener)
+
+
+def emit(stage, duration=0.0, **fields):
+    """Reports an event that was measured elsewhere, like a rate-limit wait."""
+    if _listeners:
+        event = Event(stage, duration, fields)
+        for listener in list(_listeners):
+            listener(event)
+
+
+class _Timer:
+    """Times a with block and reports it as an Event."""
+
+    __slots__ = ("stage", "fields", "_start")
+
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+
+    def record(self, **fields):
+        """Adds values to the Event, like the number of rows produced."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        emit(self.stage, time.perf_counter() - self._start, **self.fields)
+
+
+class _NullTimer:
+    """Stands in for a _Timer while instrumentation is off."""
+
+    __slots__ = ()
+
+    def record(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(stage, **fields):
+    """Times a stage in a with block.
+
+    Parameters
+    ----------
+    stage: str
+        Specifies the name of the stage.
+    **fields: key-value pairs
+        Specifies values to report with the Event. Use the `record()` method
+        of the returned timer to add values inside the block.
+
+    Returns
+    -------
+    context manager
+    """
+    if not _listeners:
+        return _NULL_TIMER
+    return _Timer(stage, fields)
+
+
+class Profile:
+    """Collects the events of a run and summarizes them.
+
+    Attributes
+    ----------
+    events: list of Event
+        Stores the events in the order that they finished.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def to_frame(self):
+        """Returns one row per event, with one column per field."""
+        rows = [
+            {"stage": e.stage, "duration": e.duration, **e.fields} for e in self.events
+        ]
+        return pd.DataFrame(rows, columns=None if rows else ["stage", "duration"])
+
+    def summary(self):
+        """Returns the number of calls, time, bytes, and rows per stage."""
+        df = self.to_frame()
+        for column in ("bytes", "rows"):
+            if column not in df:
+                df[column] = 0
+        grouped = df.groupby("stage")
+        return pd.DataFrame(
+            {
+                "calls": grouped.size(),
+                "total": grouped["duration"].sum(),
+                "mean": grouped["duration"].mean(),
+                "max": grouped["duration"].max(),
+                "bytes": grouped["bytes"].sum(),
+                "rows": grouped["rows"].sum(),
+            }
+        ).sort_values("total", ascending=False)
+
+
+@contextmanager
+def profile():
+    """Collects the events of a with block into a Profile.
+
+    Yields
+    ------
+    Profile
+    """
+    run = Profile()
+    add_listener(run)
+    try:
+        yield run
+    finally:
+        remove_listener(run)
+
+
+def log_events(logger=None, level=logging.INFO):
+    """Creates a listener that writes events to a logger.
+
+    Parameters
+    ----------
+    logger: logging.Logger, optional
+        Specifies the logger. Defaults to the "aerichor" logger.
+    level: int, optional
+        Specifies the level of the log records.
+
+    Returns
+    -------
+    function
+        A listener to pass to add_listener().
+    """
+    logger = logger or logging.getLogger("aerichor")
+
+    def listener(event):
+        logger.log(level, "%r", event)
+
+    return listener
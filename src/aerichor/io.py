@@ -0,0 +1,186 @@
+"""
+This module saves SampleDataFrames to a partitioned Parquet dataset and loads
+them back.
+
+A dataset is a directory with one subdirectory per pollutant and date, like
+`pollutant=PM25/date=2024-03-24/`. Each write adds new files, so passes can be
+appended as they are collocated. The `units` and `label` of a frame are kept
+in the metadata of its files. Reads only open the partitions and columns that
+are asked for.
+
+Functions
+---------
+write_dataset:
+    Appends a SampleDataFrame to a partitioned Parquet dataset.
+read_dataset:
+    Loads a SampleDataFrame from a partitioned Parquet dataset.
+"""
+from enum import Enum
+import json
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from aerichor.dataframe import SampleDataFrame
+
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("pollutant", pa.string()), ("date", pa.string())]), flavor="hive"
+)
+METADATA_KEY = b"aerichor"
+
+
+def write_dataset(df, path, pollutant=None, prefix="part"):
+    """Appends a SampleDataFrame to a partitioned Parquet dataset.
+
+    Rows are partitioned by pollutant and by the date of their `time` column.
+    Existing files are kept, so writing a new pass adds to the dataset.
+
+    Parameters
+    ----------
+    df: SampleDataFrame
+        Specifies the frame to write. It must have a `time` column without
+        missing times, since the time decides the date partition of a row.
+    path: str or Path
+        Specifies the directory of the dataset.
+    pollutant: AqiPollutant or str, optional
+        Specifies the pollutant partition. Defaults to the pollutant that the
+        frame's `label` names, like "PM2.5 - Local Conditions" for PM25.
+    prefix: str, optional
+        Specifies how the names of the written files begin, so that the files
+        of one write can be found again.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    if pollutant is None:
+        pollutant = _label_pollutant(getattr(df, "label", None))
+    if isinstance(pollutant, Enum):
+        pollutant = pollutant.name
+    reserved = {"pollutant", "date"} & set(df.columns)
+    if reserved:
+        raise ValueError(f"The columns {reserved} are reserved for partitioning.")
+    if "time" not in df.columns:
+        raise ValueError("The frame needs a time column to be partitioned by date.")
+    missing = int(df["time"].isna().sum())
+    if missing:
+        msg = (
+            f"{missing} rows have no time, so they have no date partition. Drop "
+            "them before writing, for example with df.dropna(subset=['time'])."
+        )
+        raise ValueError(msg)
+
+    table = pa.Table.from_pandas(pd.DataFrame(df), preserve_index=False)
+    dates = pd.to_datetime(df["time"]).dt.strftime("%Y-%m-%d").to_numpy()
+    table = table.append_column("pollutant", pa.array([str(pollutant)] * len(df)))
+    table = table.append_column("date", pa.array(dates, type=pa.string()))
+    metadata = {
+        "units": getattr(df, "units", None),
+        "label": getattr(df, "label", None),
+    }
+    schema = table.schema.with_metadata(
+        {**(table.schema.metadata or {}), METADATA_KEY: json.dumps(metadata)}
+    )
+    ds.write_dataset(
+        table.cast(schema),
+        path,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=f"{prefix}-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return len(df)
+
+
+def read_dataset(
+    path, columns=None, pollutant=None, start=None, end=None, filter=None
+):
+    """Loads a SampleDataFrame from a partitioned Parquet dataset.
+
+    Partitions outside the pollutant and date range are not opened, and only
+    the requested columns are read from the files that are.
+
+    Parameters
+    ----------
+    path: str or Path
+        Specifies the directory of the dataset.
+    columns: list of str, optional
+        Specifies the columns to read. Defaults to every column that was
+        written. "pollutant" and "date" name the partitions.
+    pollutant: AqiPollutant, str, or list, optional
+        Specifies the pollutant(s) to read. Defaults to every pollutant.
+    start: datetime, optional
+        Specifies the earliest `time` to read.
+    end: datetime, optional
+        Specifies the latest `time` to read.
+    filter: pyarrow.dataset.Expression, optional
+        Specifies another condition that rows must meet, for example
+        `pyarrow.dataset.field("latitude") > 34`. It is checked against the
+        statistics of each file before the file is read.
+
+    Returns
+    -------
+    SampleDataFrame
+        Contains the matching rows. The `units` and `label` are those of the
+        files that were read, or None if the files disagree.
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    condition = None
+
+    def both(expression):
+        return expression if condition is None else condition & expression
+
+    if pollutant is not None:
+        pollutants = pollutant if isinstance(pollutant, (list, tuple)) else [pollutant]
+        names = [p.name if isinstance(p, Enum) else str(p) for p in pollutants]
+        condition = both(ds.field("pollutant").isin(names))
+    if start is not None:
+        start = pd.Timestamp(start)
+        condition = both(ds.field("date") >= f"{start:%Y-%m-%d}")
+        condition = condition & (ds.field("time") >= start)
+    if end is not None:
+        end = pd.Timestamp(end)
+        condition = both(ds.field("date") <= f"{end:%Y-%m-%d}")
+        condition = condition & (ds.field("time") <= end)
+    if filter is not None:
+        condition = both(filter)
+
+    if columns is None:
+        columns = [n for n in dataset.schema.names if n not in ("pollutant", "date")]
+    fragments = list(dataset.get_fragments(filter=condition))
+    table = dataset.to_table(columns=columns, filter=condition)
+    df = SampleDataFrame(table.to_pandas())
+    df.units, df.label = _read_metadata(fragments)
+    return df
+
+
+def _label_pollutant(label):
+    """Returns the AqiPollutant that an AQS parameter name or a member names."""
+    from aerichor.ground.aqs import PARAMETER_NAMES, AqiPollutant
+
+    if label is None:
+        raise ValueError("Specify the pollutant, or set the label of the frame.")
+    if label in AqiPollutant.__members__:
+        return AqiPollutant[label]
+    try:
+        return PARAMETER_NAMES[label.lower()]
+    except KeyError:
+        msg = f"The label {label!r} does not name an AqiPollutant. Specify one."
+        raise ValueError(msg) from None
+
+
+def _read_metadata(fragments):
+    """Returns the units and label that every fragment agrees on."""
+    found = set()
+    for fragment in fragments:
+        metadata = fragment.physical_schema.metadata or {}
+        if METADATA_KEY in metadata:
+            stored = json.loads(metadata[METADATA_KEY])
+            found.add((stored.get("units"), stored.get("label")))
+    if len(found) == 1:
+        return found.pop()
+    return None, None
@@ -0,0 +1,177 @@
+"""
+This module runs the collocation of ground and satellite data over many
+satellite passes.
+
+For each pass, the granule is read and ground measurements are fetched from a
+client (I/O-bound), and then the two are joined by the satellite pixels that
+are near each sensor (CPU-bound). The two kinds of work run on separate
+executors so that reads and fetches for later passes overlap with the spatial
+joins of earlier passes.
+
+Functions
+---------
+collocate:
+    Yields one collocated SampleDataFrame per satellite pass.
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+
+import numpy as np
+
+from aerichor.satellite.pace import SpexOne
+
+
+def collocate(
+    passes,
+    client,
+    pollutant,
+    variable="geophysical_data/aot550",
+    column="aot",
+    buffer=0.25,
+    strategy="mean",
+    groupby="site_id",
+    reader=SpexOne,
+    max_workers=None,
+    fetch_workers=2,
+    max_pending=None,
+):
+    """Yields one collocated SampleDataFrame per satellite pass.
+
+    For each pass, this function:
+
+    1. Fetches the pollutant's measurements in the pass's Swath.
+    2. Drops measurements without a location, time, or value, and negative
+       measurements.
+    3. Keeps, per sensor, the measurement nearest in time to the pass.
+    4. Computes the satellite variable near each sensor with
+       get_spatial_value() and keeps the sensors that have a value.
+
+    Each granule is opened once, on a pool of threads that also fetch the
+    ground measurements. Only the pixels near the sensors are sent on to a
+    pool of processes, which run the spatial joins. Results are yielded in the
+    same order as the passes, and at most `max_pending` passes are in flight
+    at once, so memory use does not grow with the number of passes.
+
+    Parameters
+    ----------
+    passes: iterable of str or Path
+        Specifies the granule files of the satellite passes.
+    client: AqsClient
+        Specifies the client that fetches the ground measurements. The client
+        is only used from threads in the calling process.
+    pollutant: AqiPollutant
+        Specifies the pollutant measurements to retrieve.
+    variable: str, optional
+        Specifies the satellite variable to collocate.
+    column: str, optional
+        Specifies the name of the column that holds the satellite variable.
+    buffer: float, optional
+        Specifies the half-width, in degrees, of the box around each sensor.
+    strategy: str, optional
+        Specifies how get_spatial_value() combines the pixels near a sensor.
+    groupby: str, optional
+        Specifies the column that identifies a sensor.
+    reader: type, optional
+        Specifies the Satellite subclass that reads the granules.
+    max_workers: int, optional
+        Specifies the number of processes. Defaults to the number of CPUs.
+    fetch_workers: int, optional
+        Specifies the number of threads that fetch ground measurements.
+    max_pending: int, optional
+        Specifies how many passes can be in flight at once. Defaults to twice
+        the number of processes.
+
+    Yields
+    ------
+    SampleDataFrame
+        Contains the aligned ground measurements of one pass, with the
+        satellite variable in `column`.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    context = multiprocessing.get_context("spawn")
+    with (
+        ThreadPoolExecutor(max_workers=fetch_workers) as fetcher,
+        ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as joiner,
+    ):
+
+        def submit(file):
+            fetched = fetcher.submit(
+                _fetch_pass,
+                file,
+                client,
+                pollutant,
+                variable,
+                column,
+                buffer,
+                groupby,
+                reader,
+            )
+            return _then(
+                fetched,
+                lambda read: joiner.submit(_join_pass, *read, column, buffer, strategy),
+            )
+
+        pending = deque()
+        for file in passes:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(submit(file))
+        while pending:
+            yield pending.popleft().result()
+
+
+def _then(future, submit_next):
+    """Chains a second task onto a future as soon as the future finishes."""
+    result = Future()
+
+    def forward(done):
+        if done.exception() is not None:
+            result.set_exception(done.exception())
+        else:
+            result.set_result(done.result())
+
+    def start_next(done):
+        if done.exception() is not None:
+            result.set_exception(done.exception())
+            return
+        try:
+            submit_next(done.result()).add_done_callback(forward)
+        except BaseException as error:
+            # Fail the chained future so the caller does not wait forever,
+            # and re-raise so the error is also logged by concurrent.futures.
+            result.set_exception(error)
+            raise
+
+    future.add_done_callback(start_next)
+    return result
+
+
+def _fetch_pass(file, client, pollutant, variable, column, buffer, groupby, reader):
+    """Reads one pass and fetches and cleans its ground measurements.
+
+    Returns the ground measurements and the pixels within `buffer` of the box
+    around the sensors.
+    """
+    with reader.from_netcdf(file, lazy=True, variables=[variable]) as satellite:
+        ground = client.get_pollutant_in_swath(pollutant, satellite)
+        ground = ground.dropna(subset=["latitude", "longitude", "time", "measurement"])
+        ground = ground[ground["measurement"] >= 0]
+        ground = ground.align_temporally(satellite.start, groupby=groupby)
+        flat = satellite.flatten({variable: column})
+    # Without sensors the bounds are NaN, and no pixel is kept.
+    near = np.ones(len(flat), dtype=bool)
+    for axis in ("latitude", "longitude"):
+        low = ground[axis].min() - buffer
+        high = ground[axis].max() + buffer
+        near &= flat[axis].between(low, high).to_numpy()
+    return ground, flat[near]
+
+
+def _join_pass(ground, flat, column, buffer, strategy):
+    """Joins the pixels of one pass with its ground measurements."""
+    ground = ground.copy()
+    ground[column] = ground.get_spatial_value(flat, column, buffer, strategy)
+    return ground[ground[column].notnull()]
@@ -7,19 +7,42 @@ Swath:
     Defines the geometric properties of satellite-retrived data.
 Satellite:
     Define the interface for subclasses.
+
+Functions
+---------
+pixel_mask:
+    Evaluates the pixel filters once over the line/pixel grid.
 """
 from abc import abstractclassmethod
+from contextlib import nullcontext
+from pathlib import Path
 
-import cartopy.crs as ccrs
-from shapely import Polygon
-import matplotlib.pyplot as plt
+import numpy as np
+import shapely
+from shapely import MultiPolygon, Polygon
 
 from aerichor.utils import BoundingBox
 from aerichor.dataframe import SampleDataFrame
+from aerichor.spatial import PixelIndex
 
 
 class Swath:
-    """Contains the geometric properties of satellite-retrieved data."""
+    """Contains the geometric properties of satellite-retrieved data.
+
+    Attributes
+    ----------
+    tolerance: float or None
+        Specifies the tolerance, in degrees, that the footprint is simplified
+        to. By default, the footprint is not simplified.
+    """
+    _shape = None
+    _bbox = None
+    _tolerance = None
+
+    def _reset_footprint(self):
+        self._shape = None
+        self._bbox = None
+
     @property
     def lats(self):
         return self._lats
@@ -29,6 +52,7 @@ class Swath:
         if not hasattr(lats, "min") or not hasattr(lats, "max"):
             raise TypeError(f"{type(lats)} does not have a min() or max() method.")
         self._lats = lats
+        self._reset_footprint()
 
     @property
     def lons(self):
@@ -39,6 +63,16 @@ class Swath:
         if not hasattr(lons, "min") or not hasattr(lons, "max"):
             raise TypeError(f"{type(lons)} does not have a min() or max() method.")
         self._lons = lons
+        self._reset_footprint()
+
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, tolerance):
+        self._tolerance = tolerance
+        self._reset_footprint()
 
     @property
     def elevation(self):
@@ -65,37 +99,69 @@ class Swath:
         self._end = end
 
     # TODO: This assumes lats and lons are 2D - not always true
-    # BETTER: coords = [Point(*coord) for coord in zip(latitude, longitude)]
     # The problem is that SpexOne (for example) collects points by scanning
     # left-to-right, top-to-bottom. You get a zig-zag shape when you reach 
     # the end of one line and scan back to the beginning of the next line.
+    # Tracing the edge of the 2D grid avoids the zig-zag.
     @property
     def shape(self):
-        """Returns the shape of the swath as a shapely.Polygon."""
-        if not hasattr(self, "._shape") or not self._shape:
-            # ASSUME: Latitude and longitude are ordered from first to last
-            first_left = float(self.lons[0, 0]), float(self.lats[0, 0])
-            first_right = float(self.lons[0, -1]), float(self.lats[0, -1])
-            last_left = float(self.lons[-1, 0]), float(self.lats[-1, 0])
-            last_right = float(self.lons[-1, -1]), float(self.lats[-1, -1])
-            coordinate_seq = [
-                last_left,
-                last_right,
-                first_right,
-                first_left,
-                first_left,
-            ]
-            self._shape = Polygon(coordinate_seq)
+        """Returns the footprint of the swath as a prepared shapely.Polygon.
+
+        The footprint follows every pixel on the edge of the 2-D latitude and
+        longitude arrays, so it follows curved swaths. It is built once and
+        cached until `lats`, `lons`, or `tolerance` change.
+        """
+        if self._shape is None:
+            self._shape = self._trace_footprint()
+            shapely.prepare(self._shape)
         return self._shape
 
+    def _trace_footprint(self):
+        # ASSUME: Latitude and longitude are ordered from first to last
+        lons = np.asarray(self.lons, dtype=float)
+        lats = np.asarray(self.lats, dtype=float)
+        ring = np.concatenate(
+            [
+                np.column_stack([lons[0, :], lats[0, :]]),
+                np.column_stack([lons[1:, -1], lats[1:, -1]]),
+                np.column_stack([lons[-1, -2::-1], lats[-1, -2::-1]]),
+                np.column_stack([lons[-2:0:-1, 0], lats[-2:0:-1, 0]]),
+            ]
+        )
+        ring = ring[np.isfinite(ring).all(axis=1)]
+        shape = Polygon(ring)
+        if not shape.is_valid:
+            shape = _polygonal(shapely.make_valid(shape))
+        if self.tolerance:
+            shape = shape.simplify(self.tolerance)
+        return shape
+
+    @property
+    def footprint_wkb(self):
+        """Returns or sets the footprint as Well-Known Binary (WKB).
+
+        Setting the footprint lets you use `shape`, `bbox`, and `contains`
+        without the latitude and longitude arrays, for example in a worker
+        process.
+        """
+        return shapely.to_wkb(self.shape)
+
+    @footprint_wkb.setter
+    def footprint_wkb(self, wkb):
+        self._bbox = None
+        self._shape = shapely.from_wkb(wkb)
+        shapely.prepare(self._shape)
+
     @property
     def bbox(self):
         """Returns the grid-aligned bounding box of the Swath."""
-        if not hasattr(self, "._bbox") or not self._bbox:
+        if self._bbox is None:
             self._bbox = BoundingBox.from_shape(self.shape)
         return self._bbox
 
     def _get_projection(self):
+        import cartopy.crs as ccrs
+
         lon_mid = float(self.lons.min() + self.lons.max()) / 2
         lat_mid = float(self.lats.min() + self.lats.max()) / 2
 
@@ -119,21 +185,160 @@ class Swath:
             Returns True if the other shape is within the Swath."""
         return self.shape.contains(other)
 
+    def contains_points(self, lons, lats):
+        """Tests many points at once for whether they are within the Swath.
+
+        Parameters
+        ----------
+        lons: array-like
+            Specifies the longitude of each point.
+        lats: array-like
+            Specifies the latitude of each point.
+
+        Returns
+        -------
+        np.ndarray of bool
+            Contains True for each point that is within the Swath.
+        """
+        return shapely.contains_xy(self.shape, lons, lats)
+
     def show_swath(self):
         """Plots the area covered by the swath over the globe."""
-        x, y = self.shape.exterior.xy
-        x.reverse()
-        y.reverse()
+        # Plotting is the only use of cartopy and matplotlib, which are slow
+        # to import, so they are not imported until a swath is shown.
+        import cartopy.crs as ccrs
+        import matplotlib.pyplot as plt
+
         ax = plt.subplot(111, projection=self._get_projection())
         ax.stock_img()
         ax.coastlines()
-        ax.plot(x, y, marker="o", transform=ccrs.Geodetic())
-        ax.fill(x, y, "coral", transform=ccrs.Geodetic(), alpha=0.4)
+        for polygon in getattr(self.shape, "geoms", [self.shape]):
+            x, y = polygon.exterior.xy
+            x.reverse()
+            y.reverse()
+            ax.plot(x, y, marker="o", transform=ccrs.Geodetic())
+            ax.fill(x, y, "coral", transform=ccrs.Geodetic(), alpha=0.4)
         ax.gridlines()
         plt.show()
 
 
+def _polygonal(shape):
+    """Keeps the polygons of a shape, dropping stray lines and points.
+
+    make_valid() can return a GeometryCollection that mixes polygons with the
+    lines and points of degenerate parts of a ring. Only the polygons cover
+    an area, so only they are kept.
+    """
+    parts = shapely.get_parts(shapely.get_parts(shape))
+    polygons = list(parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON])
+    if len(polygons) == 1:
+        return polygons[0]
+    return MultiPolygon(polygons)
+
+
+def pixel_mask(
+    lats,
+    lons,
+    values=None,
+    fill_value=None,
+    how="any",
+    valid_range=None,
+    quality=None,
+    min_quality=None,
+    cloud_mask=None,
+):
+    """Evaluates the pixel filters once over the line/pixel grid.
+
+    Every filter is combined into one boolean array, so that the pixels that
+    fail any filter are dropped with a single selection.
+
+    Parameters
+    ----------
+    lats: np.ndarray
+        Specifies the latitude of each pixel.
+    lons: np.ndarray
+        Specifies the longitude of each pixel, in the same shape.
+    values: dict, optional
+        Specifies the variables to check for missing values, by name.
+    fill_value: float, optional
+        Specifies a sentinel value that marks missing data, in addition to
+        NaN.
+    how: str, optional
+        Specifies whether a pixel is dropped when "any" or "all" of its values
+        are missing.
+    valid_range: dict, optional
+        Specifies the range of valid values of some of the `values`, for
+        example {"aot": (0, 5)}.
+    quality: np.ndarray, optional
+        Specifies the quality level of each pixel. Higher is better.
+    min_quality: int, optional
+        Specifies the lowest quality level to keep.
+    cloud_mask: np.ndarray, optional
+        Specifies a cloud flag for each pixel. Pixels with a nonzero flag are
+        dropped.
+
+    Returns
+    -------
+    np.ndarray of bool
+        Contains True for each pixel to keep, in the shape of `lats`.
+    """
+    if how not in ("any", "all"):
+        raise ValueError(f"Unknown value for how: {how!r}.")
+    values = values or {}
+    keep = np.isfinite(lats) & np.isfinite(lons)
+    missing = [Satellite._is_missing(array, fill_value) for array in values.values()]
+    if missing:
+        combine = np.logical_or if how == "any" else np.logical_and
+        keep &= ~combine.reduce(missing)
+    for name, (low, high) in (valid_range or {}).items():
+        with np.errstate(invalid="ignore"):
+            keep &= ~((values[name] < low) | (values[name] > high))
+    if min_quality is not None:
+        keep &= np.asarray(quality) >= min_quality
+    if cloud_mask is not None:
+        keep &= np.asarray(cloud_mask) == 0
+    return keep
+
+
+def _column_ranges(valid_range, variables):
+    """Keys `valid_range` by the columns that `variables` map the variables to."""
+    valid_range = valid_range or {}
+    unknown = set(valid_range) - set(variables)
+    if unknown:
+        raise ValueError(f"valid_range has variables that are not read: {unknown}.")
+    return {variables[name]: limits for name, limits in valid_range.items()}
+
+
 class Satellite(Swath):
+    """Defines the interface for subclasses.
+
+    Subclasses name the variables of their products in class attributes, so
+    that filters and readers can find them.
+
+    Attributes
+    ----------
+    LATITUDE: str
+        Names the latitude variable.
+    LONGITUDE: str
+        Names the longitude variable.
+    GEOPHYSICAL: str
+        Names the group of geophysical variables.
+    QUALITY: str
+        Names the per-pixel quality level. Higher is better.
+    CLOUD_MASK: str
+        Names the per-pixel cloud flag. Nonzero is cloudy.
+    mask: np.ndarray of bool or None
+        Stores the pixels that passed the read-time filters. flatten() and
+        sample_at() only return these pixels.
+    """
+    LATITUDE = None
+    LONGITUDE = None
+    GEOPHYSICAL = None
+    QUALITY = None
+    CLOUD_MASK = None
+    INDEX_SUFFIX = ".pixels.npz"
+    _pixel_index = None
+
     def __init__(
         self,
         *,
@@ -144,6 +349,7 @@ class Satellite(Swath):
         origin=None,
         start=None,
         end=None,
+        mask=None,
     ):
         # Swath attributes
         self.lats = lats
@@ -155,6 +361,7 @@ class Satellite(Swath):
         # Data Attributes
         self.data = data
         self.origin = origin
+        self.mask = mask
 
         if hasattr(self.data, "_repr_html_"):
             self._repr_html_ = self.data._repr_html_
@@ -165,11 +372,336 @@ class Satellite(Swath):
         msg = f"The from_netcdf() method has not been implemented for {cls}."
         raise NotImplementedError(msg)
 
+    def filter_pixels(
+        self, fill_value=None, valid_range=None, min_quality=None, cloud_free=False
+    ):
+        """Evaluates pixel filters and adds them to `mask`.
+
+        Parameters
+        ----------
+        fill_value: float, optional
+            Specifies a sentinel value that marks missing data in the
+            variables of `valid_range`.
+        valid_range: dict, optional
+            Specifies the range of valid values of some variables, for example
+            {"geophysical_data/aot550": (0, 5)}. Pixels where these variables
+            are missing are dropped too.
+        min_quality: int, optional
+            Specifies the lowest quality level (in QUALITY) to keep.
+        cloud_free: bool, optional
+            Specifies whether to drop pixels that CLOUD_MASK flags as cloudy.
+
+        Returns
+        -------
+        self
+        """
+        values = {name: np.asarray(self[name]) for name in valid_range or {}}
+        quality = cloud = None
+        if min_quality is not None:
+            quality = np.asarray(self[self._require("QUALITY")])
+        if cloud_free:
+            cloud = np.asarray(self[self._require("CLOUD_MASK")])
+        keep = pixel_mask(
+            np.asarray(self.lats),
+            np.asarray(self.lons),
+            values,
+            fill_value=fill_value,
+            valid_range=valid_range,
+            quality=quality,
+            min_quality=min_quality,
+            cloud_mask=cloud,
+        )
+        self.mask = keep if self.mask is None else self.mask & keep
+        return self
+
+    @property
+    def mask(self):
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask = mask
+        self._pixel_index = None
+
+    def _reset_footprint(self):
+        super()._reset_footprint()
+        self._pixel_index = None
+
+    def pixel_index(self, persist=False):
+        """Returns the index of the pixels in `mask`, building it on first use.
+
+        The index is cached until `lats`, `lons`, or `mask` change.
+
+        Parameters
+        ----------
+        persist: bool, optional
+            Specifies whether to keep the index in a file next to `origin`,
+            named with INDEX_SUFFIX. The file only holds arrays. An existing
+            file is only used if it was built from the same latitudes,
+            longitudes, and mask.
+
+        Returns
+        -------
+        PixelIndex
+        """
+        if self._pixel_index is None:
+            lats = np.asarray(self.lats)
+            lons = np.asarray(self.lons)
+            mask = None if self.mask is None else np.asarray(self.mask)
+            path = None
+            if persist:
+                if self.origin is None:
+                    msg = "Only a Satellite read from a file can persist its index."
+                    raise ValueError(msg)
+                origin = Path(self.origin)
+                path = origin.with_name(origin.name + self.INDEX_SUFFIX)
+            index = None
+            if path is not None and path.exists():
+                index = PixelIndex.load(path, lats, lons, mask)
+            if index is None:
+                index = PixelIndex(lats, lons, mask)
+                if path is not None:
+                    index.save(path)
+            self._pixel_index = index
+        return self._pixel_index
+
+    def sample_at(self, points, variables, k=1, max_distance=None, persist_index=False):
+        """Samples variables at the pixels nearest to points.
+
+        Pixels are found in their native line/pixel geometry, without
+        flattening or regridding. Only pixels in `mask` are candidates, so a
+        point whose nearest pixel was filtered out gets the nearest kept one.
+        On a lazily opened Satellite, each variable is read from the file for
+        the span of lines that hold a matched pixel, and is not cached.
+
+        Parameters
+        ----------
+        points: pd.DataFrame
+            Specifies the points, with latitude and longitude columns, for
+            example the sites of a SampleDataFrame.
+        variables: str, list of str, or dict
+            Specifies the variables to sample, like in flatten().
+        k: int, optional
+            Specifies the number of nearest pixels per point.
+        max_distance: float, optional
+            Specifies, in kilometers, how far a pixel can be from its point.
+            By default, the nearest pixels are kept however far they are.
+        persist_index: bool, optional
+            Specifies whether to keep the pixel index in a file next to the
+            granule, see pixel_index().
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains one row per point and pixel, indexed like `points`, with
+            the line, pixel, distance (in kilometers), latitude, and longitude
+            of the pixel and one column per variable. Rows of the same point
+            are ordered by distance. Points without a pixel within
+            `max_distance` have no rows.
+        """
+        from aerichor.satellite.lazy import LazyTree
+
+        if isinstance(variables, str):
+            variables = [variables]
+        if not isinstance(variables, dict):
+            variables = {name: name.rsplit("/", 1)[-1] for name in variables}
+
+        index = self.pixel_index(persist=persist_index)
+        rows, lines, pixels, distances = index.query(
+            points["latitude"], points["longitude"], k=k, max_distance=max_distance
+        )
+
+        data = {
+            "line": lines,
+            "pixel": pixels,
+            "distance": distances,
+            "latitude": np.asarray(self.lats)[lines, pixels],
+            "longitude": np.asarray(self.lons)[lines, pixels],
+        }
+        first = lines.min() if len(lines) else 0
+        last = lines.max() + 1 if len(lines) else 0
+        for name, column in variables.items():
+            if isinstance(self.data, LazyTree):
+                opened = self.data.open(name)
+            else:
+                opened = nullcontext(self.data[name])
+            with opened as array:
+                if array.shape != index.shape:
+                    msg = (
+                        f"{name} has shape {array.shape}, but the latitude and "
+                        f"longitude have shape {index.shape}."
+                    )
+                    raise ValueError(msg)
+                block = np.asarray(array[first:last])
+            data[column] = block[lines - first, pixels]
+        return SampleDataFrame(data, index=points.index[rows], copy=False)
+
+    def _require(self, attribute):
+        name = getattr(self, attribute)
+        if name is None:
+            msg = f"{type(self).__name__} does not define {attribute}."
+            raise NotImplementedError(msg)
+        return name
+
+    def flatten(
+        self,
+        variables,
+        fill_value=None,
+        how="any",
+        valid_range=None,
+        min_quality=None,
+        cloud_free=False,
+    ):
+        """Flattens variables on the latitude/longitude grid into a data frame.
+
+        Each variable must have the same 2-D shape as `lats` and `lons`. The
+        variables are raveled into 1-D views, and pixels are dropped with one
+        mask, so the only copy is the one that selects the kept pixels. The
+        dtype of each variable is preserved.
+
+        Parameters
+        ----------
+        variables: str, list of str, or dict
+            Specifies the variables to flatten, for example
+            "geophysical_data/aot550". Columns are named after the last part
+            of each variable's name. Pass a dict to map variables to column
+            names.
+        fill_value: float, optional
+            Specifies a sentinel value that marks missing data, in addition to
+            NaN.
+        how: str, optional
+            Specifies whether a pixel is dropped when "any" or "all" of its
+            values are missing. Pixels without a latitude or longitude, and
+            pixels outside `mask`, are always dropped.
+        valid_range: dict, optional
+            Specifies the range of valid values of some of the `variables`,
+            for example {"geophysical_data/aot550": (0, 5)}.
+        min_quality: int, optional
+            Specifies the lowest quality level (in QUALITY) to keep.
+        cloud_free: bool, optional
+            Specifies whether to drop pixels that CLOUD_MASK flags as cloudy.
+
+        Returns
+        -------
+        SampleDataFrame
+            Contains latitude, longitude, and one column per variable.
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        if not isinstance(variables, dict):
+            variables = {name: name.rsplit("/", 1)[-1] for name in variables}
+
+        lats = np.asarray(self.lats)
+        lons = np.asarray(self.lons)
+        values = {}
+        for name, column in variables.items():
+            array = np.asarray(self.data[name])
+            if array.shape != lats.shape:
+                msg = (
+                    f"{name} has shape {array.shape}, but the latitude and "
+                    f"longitude have shape {lats.shape}."
+                )
+                raise ValueError(msg)
+            values[column] = array.ravel()
+
+        lats = lats.ravel()
+        lons = lons.ravel()
+        quality = cloud = None
+        if min_quality is not None:
+            quality = np.asarray(self[self._require("QUALITY")]).ravel()
+        if cloud_free:
+            cloud = np.asarray(self[self._require("CLOUD_MASK")]).ravel()
+        keep = pixel_mask(
+            lats,
+            lons,
+            values,
+            fill_value=fill_value,
+            how=how,
+            valid_range=_column_ranges(valid_range, variables),
+            quality=quality,
+            min_quality=min_quality,
+            cloud_mask=cloud,
+        )
+        if self.mask is not None:
+            keep &= np.asarray(self.mask).ravel()
+
+        data = {"latitude": lats[keep], "longitude": lons[keep]}
+        data.update({column: array[keep] for column, array in values.items()})
+        return SampleDataFrame(data, copy=False)
+
+    def geophysical_variables(self):
+        """Lists the variables in the group named by GEOPHYSICAL."""
+        if self.GEOPHYSICAL is None:
+            msg = f"{type(self).__name__} does not define a GEOPHYSICAL group."
+            raise NotImplementedError(msg)
+        from aerichor.satellite.lazy import LazyTree
+
+        if isinstance(self.data, LazyTree):
+            names = self.data.data_vars(self.GEOPHYSICAL)
+        else:
+            names = list(self.data[self.GEOPHYSICAL].data_vars)
+        return [f"{self.GEOPHYSICAL}/{name}" for name in names]
+
+    def describe(self, variables=None, percentiles=(0.25, 0.5, 0.75), lines=None):
+        """Summarizes variables like pandas.DataFrame.describe().
+
+        The summary is computed in one pass over each variable, with a bounded
+        amount of memory. The percentiles are approximate, within 1% of a
+        value of the right rank.
+
+        Parameters
+        ----------
+        variables: list of str, optional
+            Specifies the variables to summarize. Defaults to every variable
+            in the geophysical group.
+        percentiles: sequence of float, optional
+            Specifies the quantiles to include, between 0 and 1.
+        lines: int, optional
+            Specifies the number of lines that are summarized at once.
+
+        Returns
+        -------
+        pd.DataFrame
+            Contains the count, mean, std, min, percentiles, and max of each
+            variable. Missing values are not counted.
+        """
+        from aerichor.satellite.stats import Statistics
+
+        if variables is None:
+            variables = self.geophysical_variables()
+        statistics = Statistics.from_satellite(self, variables, lines=lines)
+        return statistics.to_frame(percentiles)
+
+    @staticmethod
+    def _is_missing(array, fill_value):
+        missing = ~np.isfinite(array)
+        if fill_value is not None:
+            missing |= array == fill_value
+        return missing
+
+    def close(self):
+        """Closes the files that back the data."""
+        if hasattr(self.data, "close"):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def __getitem__(self, item):
-        return self.data[key]
+        return self.data[item]
 
     def __setitem__(self, key, value):
         self.data[key] = value
 
     def __delitem__(self, item):
-        del self.data[item]
+        from aerichor.satellite.lazy import LazyTree
+
+        group, _, name = item.rpartition("/")
+        if group and not isinstance(self.data, LazyTree):
+            # A DataTree only deletes the variables of its own node.
+            del self.data[group][name]
+        else:
+            del self.data[item]
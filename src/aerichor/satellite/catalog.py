@@ -0,0 +1,173 @@
+"""
+This module keeps a catalog of the granules in a data directory so that you
+can find the granules that cover a place or a time without opening them.
+
+Classes
+-------
+GranuleCatalog:
+    Records the time and footprint of each granule in a directory and answers
+    spatial and temporal queries with an STRtree.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from aerichor.satellite.pace import SpexOne
+
+
+CATALOG_NAME = ".aerichor-catalog.json"
+
+
+class GranuleCatalog:
+    """Records the time and footprint of each granule in a directory.
+
+    The catalog is scanned once and saved to a sidecar file. Later scans only
+    read granules that are new or that changed since the last scan. Queries
+    use an STRtree over the footprints and never open a granule.
+
+    Parameters
+    ----------
+    directory: str or Path
+        Specifies the directory that contains the granules.
+    path: str or Path, optional
+        Specifies where to save the catalog. By default, the catalog is saved
+        in the directory as .aerichor-catalog.json.
+    reader: type, optional
+        Specifies the Satellite subclass that reads the granules.
+    pattern: str, optional
+        Specifies the glob pattern of the granule file names.
+
+    Attributes
+    ----------
+    directory: Path
+        Stores the directory.
+    path: Path
+        Stores the location of the catalog file.
+    """
+
+    def __init__(self, directory, path=None, reader=SpexOne, pattern="*.nc"):
+        self.directory = Path(directory)
+        self.path = Path(path) if path else self.directory / CATALOG_NAME
+        self.reader = reader
+        self.pattern = pattern
+        self._records = {}
+        self._tree = None
+        if self.path.exists():
+            self._records = json.loads(self.path.read_text())["granules"]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    @property
+    def files(self):
+        """Lists the granules in the catalog, ordered by start time."""
+        names = sorted(self._records, key=lambda name: self._records[name]["start"])
+        return [self.directory / name for name in names]
+
+    def update(self):
+        """Scans the directory and records new or changed granules.
+
+        Granules that were removed from the directory are removed from the
+        catalog. The catalog is saved if anything changed.
+
+        Returns
+        -------
+        int
+            The number of granules that were read.
+        """
+        present = {}
+        for file in self.directory.glob(self.pattern):
+            stat = file.stat()
+            present[file.name] = (stat.st_size, stat.st_mtime)
+
+        removed = set(self._records) - set(present)
+        for name in removed:
+            del self._records[name]
+
+        added = 0
+        for name, (size, mtime) in sorted(present.items()):
+            record = self._records.get(name)
+            if record and record["size"] == size and record["mtime"] == mtime:
+                continue
+            with self.reader.from_netcdf(self.directory / name, lazy=True) as granule:
+                footprint = granule.footprint_wkb.hex()
+                self._records[name] = {
+                    "start": granule.start.isoformat(),
+                    "end": granule.end.isoformat(),
+                    "footprint": footprint,
+                    "size": size,
+                    "mtime": mtime,
+                }
+            added += 1
+
+        if added or removed:
+            self._tree = None
+            self.save()
+        return added
+
+    def save(self):
+        """Writes the catalog to its sidecar file."""
+        self.path.write_text(json.dumps({"granules": self._records}, indent=1))
+
+    def _index(self):
+        """Builds the STRtree and time arrays the first time they are needed."""
+        if self._tree is None:
+            names = list(self._records)
+            records = [self._records[name] for name in names]
+            footprints = shapely.from_wkb([r["footprint"] for r in records])
+            self._names = np.array(names, dtype=object)
+            starts = [r["start"] for r in records]
+            ends = [r["end"] for r in records]
+            self._starts = np.array(starts, dtype="datetime64[us]")
+            self._ends = np.array(ends, dtype="datetime64[us]")
+            self._tree = shapely.STRtree(footprints)
+        return self._tree
+
+    def query(self, geometry=None, start=None, end=None):
+        """Finds the granules that cover a geometry during a time range.
+
+        Parameters
+        ----------
+        geometry: shapely.Geometry, optional
+            Specifies the area of interest. Granules whose footprints
+            intersect the geometry match.
+        start: datetime, optional
+            Specifies the beginning of the time range.
+        end: datetime, optional
+            Specifies the end of the time range.
+
+        Returns
+        -------
+        list of Path
+            Contains the matching granules, ordered by start time.
+        """
+        tree = self._index()
+        if geometry is None:
+            matches = np.arange(len(self._names))
+        else:
+            matches = tree.query(geometry, predicate="intersects")
+        if start is not None:
+            start = np.datetime64(start, "us")
+            matches = matches[self._ends[matches] >= start]
+        if end is not None:
+            end = np.datetime64(end, "us")
+            matches = matches[self._starts[matches] <= end]
+        matches = matches[np.argsort(self._starts[matches], kind="stable")]
+        return [self.directory / name for name in self._names[matches]]
+
+    def at_point(self, lon, lat, start=None, end=None):
+        """Finds the granules that cover a point during a time range."""
+        return self.query(shapely.Point(lon, lat), start=start, end=end)
+
+    def in_bbox(self, bbox, start=None, end=None):
+        """Finds the granules that overlap a BoundingBox during a time range."""
+        return self.query(bbox.polygon, start=start, end=end)
+
+    def between(self, start, end):
+        """Finds the granules that overlap a time range."""
+        return self.query(start=start, end=end)
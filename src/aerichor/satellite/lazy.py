@@ -0,0 +1,191 @@
+"""
+This module reads the groups of a hierarchical NetCDF file on demand.
+
+Classes
+-------
+LazyTree:
+    Provides DataTree-style access to a NetCDF file, reading each group or
+    variable only when it is first accessed.
+"""
+from contextlib import contextmanager
+
+import xarray as xr
+
+from aerichor.instrument import timed
+
+
+class LazyTree:
+    """Reads the groups and variables of a NetCDF file on first access.
+
+    Items are addressed like in an xarray.DataTree: "group" returns the
+    group as an xarray.Dataset, and "group/variable" returns a single
+    xarray.DataArray. Without `chunks`, an item is read into memory and the
+    file is closed again right away, so no file handle stays open between
+    accesses. With `chunks`, items are backed by dask arrays and the file
+    stays open until you call close().
+
+    Parameters
+    ----------
+    file: str or Path
+        Specifies the NetCDF file to read.
+    chunks: dict or str, optional
+        Specifies how to chunk the variables. Requires the `dask` extra:
+        pip install "aerichor[dask]".
+    variables: iterable of str, optional
+        Specifies the "group/variable" items that can be read. Other
+        variables raise a KeyError, and groups only contain the selected
+        variables. By default, every variable can be read.
+    **kwargs: key-value pairs
+        Specifies other parameters of xarray.open_dataset.
+
+    Attributes
+    ----------
+    file: str or Path
+        Stores the location of the file.
+    """
+
+    def __init__(self, file, chunks=None, variables=None, **kwargs):
+        self.file = file
+        self.chunks = chunks
+        self.variables = None
+        if variables is not None:
+            self.variables = {}
+            for name in variables:
+                group, variable = self._split(name)
+                self.variables.setdefault(group, []).append(variable)
+        self.kwargs = kwargs
+        self._items = {}
+        self._datasets = {}
+
+    def __repr__(self):
+        loaded = ", ".join(self._items) or "nothing"
+        return f"LazyTree({str(self.file)!r}, loaded: {loaded})"
+
+    def _split(self, key):
+        """Splits a key at its last slash into a group and a variable.
+
+        A key without a slash names a group, and nested groups keep their
+        path, so "a/b/var" is the variable "var" of the group "a/b".
+        """
+        key = key.strip("/")
+        if "/" not in key:
+            return key, ""
+        group, _, variable = key.rpartition("/")
+        if self.variables is not None and key in self.variables:
+            # The key names a selected nested group.
+            return key, ""
+        return group, variable
+
+    def _open(self, group):
+        """Opens a group of the file as a dataset."""
+        if self.chunks is None:
+            return xr.open_dataset(self.file, group=group, **self.kwargs)
+        if group not in self._datasets:
+            self._datasets[group] = xr.open_dataset(
+                self.file, group=group, chunks=self.chunks, **self.kwargs
+            )
+        return self._datasets[group]
+
+    def _item(self, dataset, group, variable):
+        """Returns a variable, or a group with only its selected variables."""
+        if variable:
+            return dataset[variable]
+        if self.variables is None:
+            return dataset
+        return dataset[self.variables[group]]
+
+    def _check(self, key, group, variable):
+        """Raises a KeyError if an item is not selected."""
+        if self.variables is not None:
+            if group not in self.variables:
+                raise KeyError(f"{key} is not one of the selected variables.")
+            if variable and variable not in self.variables[group]:
+                raise KeyError(f"{key} is not one of the selected variables.")
+
+    def _read(self, group, variable):
+        """Reads a variable or group, or opens it with dask with `chunks`."""
+        if self.chunks is not None:
+            return self._item(self._open(group), group, variable)
+        with self._open(group) as dataset:
+            return self._item(dataset, group, variable).load()
+
+    def __getitem__(self, key):
+        if key in self._items:
+            return self._items[key]
+        group, variable = self._split(key)
+        self._check(key, group, variable)
+        with timed("satellite.read", file=str(self.file), key=key) as timer:
+            try:
+                item = self._read(group, variable)
+            except KeyError as error:
+                if not variable or self.variables is not None:
+                    raise
+                # Without a selection, "a/b" can also name a nested group.
+                try:
+                    item = self._read(key.strip("/"), "")
+                except OSError:
+                    raise error from None
+            if self.chunks is None:
+                timer.record(bytes=item.nbytes)
+        self._items[key] = item
+        return item
+
+    def __setitem__(self, key, value):
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        del self._items[key]
+
+    @contextmanager
+    def open(self, key):
+        """Opens a variable without reading it, so it can be read in parts.
+
+        The variable is not cached. Slicing it only reads the slice, so a large
+        variable can be processed one block at a time.
+
+        Parameters
+        ----------
+        key: str
+            Specifies the "group/variable" item.
+
+        Yields
+        ------
+        xarray.DataArray
+            The variable, backed by the file (or by dask arrays with `chunks`).
+            Items that were already read are yielded from memory.
+        """
+        if key in self._items:
+            yield self._items[key]
+            return
+        group, variable = self._split(key)
+        self._check(key, group, variable)
+        if not variable:
+            raise KeyError(f"{key} is a group, not a variable.")
+        if self.chunks is not None:
+            yield self._open(group)[variable]
+            return
+        with self._open(group) as dataset:
+            yield dataset[variable]
+
+    def data_vars(self, group):
+        """Lists the variables of a group without reading them."""
+        if self.variables is not None:
+            return list(self.variables.get(group, []))
+        if group in self._items:
+            return list(self._items[group].data_vars)
+        if self.chunks is not None:
+            return list(self._open(group).data_vars)
+        with self._open(group) as dataset:
+            return list(dataset.data_vars)
+
+    @property
+    def loaded(self):
+        """Lists the items that have been read so far."""
+        return list(self._items)
+
+    def close(self):
+        """Closes open files and forgets every item that has been read."""
+        for dataset in self._datasets.values():
+            dataset.close()
+        self._datasets.clear()
+        self._items.clear()
@@ -14,26 +14,113 @@ from pathlib import Path
 
 import xarray as xr
 
+from aerichor.instrument import timed
 from aerichor.satellite.base import Satellite
+from aerichor.satellite.lazy import LazyTree
 
 
 PACE_ELEVATION = 6_765_000  # meters
 
 
 class SpexOne(Satellite):
+    LATITUDE = "geolocation_data/latitude"
+    LONGITUDE = "geolocation_data/longitude"
+    GEOPHYSICAL = "geophysical_data"
+    QUALITY = "diagnostic_data/quality_level"
+    CLOUD_MASK = "diagnostic_data/cloud_mask"
+
     def __init__(self, **kwargs):
         super().__init__(elevation=PACE_ELEVATION, **kwargs)
 
     @classmethod
-    def from_netcdf(cls, file):
-        """Create Satellite from PACE_SPEXONE.*.L2.RTAP_LD.V3_0.nc file."""
+    def from_netcdf(
+        cls,
+        file,
+        lazy=False,
+        chunks=None,
+        variables=None,
+        fill_value=None,
+        valid_range=None,
+        min_quality=None,
+        cloud_free=False,
+    ):
+        """Create Satellite from PACE_SPEXONE.*.L2.RTAP_LD.V3_0.nc file.
+
+        The filters are evaluated once, when the file is read, into the
+        `mask` of the returned object. flatten() then only returns the pixels
+        that passed, so dropped pixels never reach a SampleDataFrame.
+
+        Parameters
+        ----------
+        file: str or Path
+            Specifies the file to read.
+        lazy: bool, optional
+            Specifies whether to defer reading. If True, only the latitude and
+            longitude in `geolocation_data` are read up front. Other groups
+            and variables are read the first time that you access them, and
+            the file is not kept open in between.
+        chunks: dict or str, optional
+            Specifies how to chunk variables into dask arrays when `lazy` is
+            True. Requires the `dask` extra: pip install "aerichor[dask]".
+        variables: list of str, optional
+            Specifies the variables to keep, like "geophysical_data/aot550".
+            The latitude and longitude are always kept. By default, every
+            variable is kept.
+        fill_value: float, optional
+            Specifies a sentinel value that marks missing data in the
+            variables of `valid_range`.
+        valid_range: dict, optional
+            Specifies the range of valid values of some variables, for example
+            {"geophysical_data/aot550": (0, 5)}.
+        min_quality: int, optional
+            Specifies the lowest quality level (in QUALITY) to keep.
+        cloud_free: bool, optional
+            Specifies whether to drop pixels that CLOUD_MASK flags as cloudy.
+
+        Returns
+        -------
+        SpexOne
+        """
         origin = file
-        data = xr.open_datatree(file, decode_timedelta=False)
-        lats = data["geolocation_data"]["latitude"]
-        lons = data["geolocation_data"]["longitude"]
+        filters = list(valid_range or {})
+        if min_quality is not None:
+            filters.append(cls.QUALITY)
+        if cloud_free:
+            filters.append(cls.CLOUD_MASK)
+        selected = None
+        if variables is not None:
+            selected = [cls.LATITUDE, cls.LONGITUDE, *variables, *filters]
+            selected = list(dict.fromkeys(selected))
+
+        with timed("satellite.open", file=str(file), lazy=lazy) as timer:
+            if lazy:
+                data = LazyTree(
+                    file, chunks=chunks, variables=selected, decode_timedelta=False
+                )
+                group, _, latitude = cls.LATITUDE.rpartition("/")
+                longitude = cls.LONGITUDE.rpartition("/")[2]
+                with xr.open_dataset(file, group=group) as geolocation:
+                    lats = geolocation[latitude].load()
+                    lons = geolocation[longitude].load()
+            else:
+                data = xr.open_datatree(file, decode_timedelta=False)
+                if selected is not None:
+                    data = _select(data, selected)
+                lats = data[cls.LATITUDE]
+                lons = data[cls.LONGITUDE]
+            timer.record(bytes=Path(file).stat().st_size)
         start = SpexOne._get_start(file)
         end = SpexOne._get_end(start)
-        return cls(data=data, origin=origin, lats=lats, lons=lons, start=start, end=end)
+        satellite = cls(
+            data=data, origin=origin, lats=lats, lons=lons, start=start, end=end
+        )
+        if filters:
+            satellite.filter_pixels(fill_value, valid_range, min_quality, cloud_free)
+            if lazy and chunks is None:
+                # Only the mask is needed, so forget the filter variables.
+                for name in set(filters) - set(variables or []):
+                    del satellite.data[name]
+        return satellite
 
     # ASSUME: The file is not renamed between being downloaded and read.
     @staticmethod
@@ -48,3 +135,16 @@ class SpexOne(Satellite):
     def _get_end(start):
         """Add 5 minutes to start time to get end time."""
         return start + timedelta(minutes=5)
+
+
+def _select(tree, variables):
+    """Returns a DataTree with only some "group/variable" items of a tree."""
+    groups = {}
+    for name in variables:
+        group, _, variable = name.strip("/").rpartition("/")
+        groups.setdefault(group, []).append(variable)
+    selected = xr.DataTree.from_dict(
+        {f"/{group}": tree[group].to_dataset()[names] for group, names in groups.items()}
+    )
+    selected.set_close(tree.close)
+    return selected
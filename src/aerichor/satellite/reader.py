@@ -0,0 +1,203 @@
+"""
+This module streams the pixels of many granules as flat data frames.
+
+Granules are read one at a time, and each granule is read in blocks of lines.
+Filters on time, area, and values are applied while reading: granules outside
+the time range are skipped by their file name, only the lines that cross the
+bounding box are read, and pixels that fail a filter are dropped before the
+next block is read. Peak memory depends on the block size, not on the number
+of granules.
+
+Functions
+---------
+read_granules:
+    Yields the flattened pixels of many granules, one block at a time.
+"""
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from aerichor.dataframe import SampleDataFrame
+from aerichor.instrument import timed
+from aerichor.satellite.base import _column_ranges, pixel_mask
+from aerichor.satellite.pace import SpexOne
+
+
+def read_granules(
+    sources,
+    variables,
+    bbox=None,
+    start=None,
+    end=None,
+    valid_range=None,
+    fill_value=None,
+    how="any",
+    min_quality=None,
+    cloud_free=False,
+    lines=None,
+    reader=SpexOne,
+    pattern="*.nc",
+):
+    """Yields the flattened pixels of many granules, one block at a time.
+
+    Parameters
+    ----------
+    sources: str, Path, or iterable of str or Path
+        Specifies a directory of granules, one granule, or a list of granules.
+        Granules are read in order of their start time.
+    variables: str, list of str, or dict
+        Specifies the variables to read, like in Satellite.flatten().
+    bbox: BoundingBox, optional
+        Specifies the area to keep. Lines that do not cross the box are not
+        read.
+    start: datetime, optional
+        Specifies the beginning of the time range. Granules that end before
+        it are skipped without being opened.
+    end: datetime, optional
+        Specifies the end of the time range. Granules that start after it are
+        skipped without being opened.
+    valid_range: dict, optional
+        Specifies the range of valid values of some of the `variables`, for
+        example {"geophysical_data/aot550": (0, 5)}. Pixels with values
+        outside the range are dropped.
+    fill_value: float, optional
+        Specifies a sentinel value that marks missing data, in addition to
+        NaN.
+    how: str, optional
+        Specifies whether a pixel is dropped when "any" or "all" of its values
+        are missing.
+    min_quality: int, optional
+        Specifies the lowest quality level (in the reader's QUALITY) to keep.
+    cloud_free: bool, optional
+        Specifies whether to drop pixels that the reader's CLOUD_MASK flags as
+        cloudy.
+    lines: int, optional
+        Specifies the number of lines per block. By default, each granule is
+        one block.
+    reader: type, optional
+        Specifies the Satellite subclass that the granules belong to. Its
+        LATITUDE and LONGITUDE attributes name the geolocation variables, and
+        its _get_start() and _get_end() methods read the time from a file name.
+        QUALITY and CLOUD_MASK name the flags of `min_quality` and
+        `cloud_free`.
+    pattern: str, optional
+        Specifies the glob pattern of the granule file names when `sources` is
+        a directory.
+
+    Yields
+    ------
+    SampleDataFrame
+        Contains the kept pixels of one block, with latitude, longitude, one
+        column per variable, and a `time` column that holds the start of the
+        granule. Blocks without kept pixels are not yielded.
+    """
+    if isinstance(variables, str):
+        variables = [variables]
+    if not isinstance(variables, dict):
+        variables = {name: name.rsplit("/", 1)[-1] for name in variables}
+    valid_range = _column_ranges(valid_range, variables)
+    if how not in ("any", "all"):
+        raise ValueError(f"Unknown value for how: {how!r}.")
+    if min_quality is not None and reader.QUALITY is None:
+        raise ValueError(f"min_quality needs {reader.__name__}.QUALITY to be set.")
+    if cloud_free and reader.CLOUD_MASK is None:
+        raise ValueError(f"cloud_free needs {reader.__name__}.CLOUD_MASK to be set.")
+
+    for file, granule_start in _granules(sources, pattern, reader):
+        if start is not None and reader._get_end(granule_start) < start:
+            continue
+        if end is not None and granule_start > end:
+            continue
+        filters = dict(
+            fill_value=fill_value,
+            how=how,
+            valid_range=valid_range,
+            min_quality=min_quality,
+            cloud_free=cloud_free,
+        )
+        yield from _read_granule(
+            file, granule_start, variables, bbox, filters, lines, reader
+        )
+
+
+def _granules(sources, pattern, reader):
+    """Lists the granules of the sources with their start times, in order."""
+    if isinstance(sources, (str, Path)):
+        sources = Path(sources)
+        files = sorted(sources.glob(pattern)) if sources.is_dir() else [sources]
+    else:
+        files = [Path(file) for file in sources]
+    granules = [(file, reader._get_start(file)) for file in files]
+    return sorted(granules, key=lambda granule: granule[1])
+
+
+def _split(name):
+    group, _, variable = name.strip("/").rpartition("/")
+    return group or None, variable
+
+
+def _read_granule(file, granule_start, variables, bbox, filters, lines, reader):
+    """Yields the kept pixels of one granule, one block of lines at a time."""
+    flags = {}
+    if filters["min_quality"] is not None:
+        flags["quality"] = reader.QUALITY
+    if filters.pop("cloud_free"):
+        flags["cloud_mask"] = reader.CLOUD_MASK
+    names = [reader.LATITUDE, reader.LONGITUDE, *variables, *flags.values()]
+    groups = {_split(name)[0] for name in names}
+    datasets = {}
+    try:
+        for group in groups:
+            datasets[group] = xr.open_dataset(file, group=group, decode_timedelta=False)
+
+        def variable(name):
+            group, key = _split(name)
+            return datasets[group][key]
+
+        lats = variable(reader.LATITUDE).to_numpy()
+        lons = variable(reader.LONGITUDE).to_numpy()
+        for name in variables:
+            if variable(name).shape != lats.shape:
+                msg = (
+                    f"{name} has shape {variable(name).shape}, but the latitude "
+                    f"and longitude have shape {lats.shape}."
+                )
+                raise ValueError(msg)
+
+        # Find the lines that cross the box, so the others are never read.
+        inside = np.isfinite(lats) & np.isfinite(lons)
+        if bbox is not None:
+            inside &= bbox.contains_points(lons, lats)
+        crossing = np.flatnonzero(inside.any(axis=1))
+        if len(crossing) == 0:
+            return
+        first, last = crossing[0], crossing[-1] + 1
+        step = lines or last - first
+
+        for begin in range(first, last, step):
+            block = slice(begin, min(begin + step, last))
+            with timed("satellite.read_block", file=str(file)) as timer:
+                values = {}
+                for name, column in variables.items():
+                    values[column] = variable(name)[block].to_numpy().ravel()
+                masks = {
+                    key: variable(name)[block].to_numpy().ravel()
+                    for key, name in flags.items()
+                }
+                keep = inside[block].flatten() & pixel_mask(
+                    lats[block].ravel(), lons[block].ravel(), values, **filters, **masks
+                )
+                timer.record(rows=int(keep.sum()))
+            if not keep.any():
+                continue
+            data = {
+                "latitude": lats[block].ravel()[keep],
+                "longitude": lons[block].ravel()[keep],
+            }
+            data.update({column: array[keep] for column, array in values.items()})
+            data["time"] = np.full(keep.sum(), np.datetime64(granule_start, "us"))
+            yield SampleDataFrame(data, copy=False)
+    finally:
+        for dataset in datasets.values():
+            dataset.close()
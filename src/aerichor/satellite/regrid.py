@@ -0,0 +1,234 @@
+"""
+This module resamples swath pixels onto a regular latitude/longitude grid.
+
+A granule's pixels are assigned to grid cells once, as a sparse matrix with
+one row per cell and one column per pixel. Regridding a variable is then a
+sparse matrix-vector product, so any number of variables (and wavelengths)
+can share the work of locating the pixels.
+
+Classes
+-------
+Grid:
+    Defines a regular latitude/longitude grid.
+Regridder:
+    Averages the pixels of one granule geometry into the cells of a Grid.
+Composite:
+    Accumulates regridded granules into a multi-pass average.
+"""
+import numpy as np
+from scipy import sparse
+
+
+class Grid:
+    """Defines a regular latitude/longitude grid.
+
+    Parameters
+    ----------
+    extent: tuple of form: (x0, x1, y0, y1)
+        Specifies the western, eastern, southern, and northern edges of the
+        grid, like BoundingBox.to_extent() returns.
+    resolution: float
+        Specifies the width and height of a cell in degrees.
+
+    Attributes
+    ----------
+    lons: np.ndarray
+        Stores the longitude at the center of each column of cells.
+    lats: np.ndarray
+        Stores the latitude at the center of each row of cells.
+    shape: tuple of int
+        Stores the number of rows and columns of cells.
+    """
+
+    def __init__(self, extent, resolution):
+        x0, x1, y0, y1 = extent
+        self.extent = extent
+        self.resolution = resolution
+        nx = max(1, int(np.ceil((x1 - x0) / resolution)))
+        ny = max(1, int(np.ceil((y1 - y0) / resolution)))
+        self.shape = (ny, nx)
+        self.lons = x0 + resolution * (np.arange(nx) + 0.5)
+        self.lats = y0 + resolution * (np.arange(ny) + 0.5)
+
+    @classmethod
+    def from_bbox(cls, bbox, resolution):
+        """Creates a grid that covers a BoundingBox."""
+        return cls(bbox.to_extent(), resolution)
+
+    @property
+    def size(self):
+        """Returns the number of cells."""
+        return self.shape[0] * self.shape[1]
+
+    def cell_index(self, lons, lats):
+        """Returns the flat index of the cell of each point, or -1 if outside.
+
+        The grid is closed at its eastern and northern edges, so a point on
+        x1 or y1 falls in the last column or row.
+        """
+        x0, x1, y0, y1 = self.extent
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        with np.errstate(invalid="ignore"):
+            col = np.floor((lons - x0) / self.resolution)
+            row = np.floor((lats - y0) / self.resolution)
+        ny, nx = self.shape
+        col = np.where(lons == x1, nx - 1, col)
+        row = np.where(lats == y1, ny - 1, row)
+        inside = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        index = np.full(lons.shape, -1, dtype=np.int64)
+        index[inside] = row[inside].astype(np.int64) * nx + col[inside].astype(np.int64)
+        return index
+
+
+class Regridder:
+    """Averages the pixels of one granule geometry into the cells of a Grid.
+
+    Build one Regridder per granule and reuse it for every variable of that
+    granule. Missing values (NaN) are excluded per variable, so a cell's
+    average only uses the pixels where that variable is valid.
+
+    Parameters
+    ----------
+    grid: Grid
+        Specifies the target grid.
+    lats: array-like
+        Specifies the latitude of each pixel, in any shape.
+    lons: array-like
+        Specifies the longitude of each pixel, in the same shape as `lats`.
+
+    Attributes
+    ----------
+    grid: Grid
+        Stores the target grid.
+    matrix: scipy.sparse.csr_array
+        Stores a 1 for each (cell, pixel) pair where the pixel is in the cell.
+    """
+
+    def __init__(self, grid, lats, lons):
+        self.grid = grid
+        lats = np.asarray(lats)
+        self.pixel_shape = lats.shape
+        cells = grid.cell_index(np.asarray(lons).ravel(), lats.ravel())
+        pixels = np.flatnonzero(cells >= 0)
+        self.matrix = sparse.csr_array(
+            (np.ones(len(pixels)), (cells[pixels], pixels)),
+            shape=(grid.size, lats.size),
+        )
+
+    @classmethod
+    def from_satellite(cls, grid, satellite):
+        """Creates a Regridder for the geometry of a Satellite."""
+        return cls(grid, satellite.lats, satellite.lons)
+
+    def _flatten(self, values):
+        """Reshapes values to (pixels, extra) and checks their shape."""
+        values = np.asarray(values)
+        n_dims = len(self.pixel_shape)
+        if values.shape[:n_dims] != self.pixel_shape:
+            msg = (
+                f"Values have shape {values.shape}, but the pixels have shape "
+                f"{self.pixel_shape}."
+            )
+            raise ValueError(msg)
+        extra = values.shape[n_dims:]
+        return values.reshape(int(np.prod(self.pixel_shape)), -1), extra
+
+    def accumulate(self, values):
+        """Sums the valid values and counts them, per cell.
+
+        Parameters
+        ----------
+        values: array-like
+            Specifies a variable with the shape of the pixels, optionally
+            followed by extra dimensions like wavelength.
+
+        Returns
+        -------
+        tuple of np.ndarray: (sums, counts)
+            Contains, per cell and extra index, the sum and the number of
+            valid values. Both have shape (cells, extra).
+        """
+        flat, _ = self._flatten(values)
+        valid = np.isfinite(flat)
+        sums = self.matrix @ np.where(valid, flat, 0.0)
+        counts = self.matrix @ valid.astype(np.float64)
+        return sums, counts
+
+    def apply(self, values):
+        """Averages a variable into the cells of the grid.
+
+        Parameters
+        ----------
+        values: array-like
+            Specifies a variable with the shape of the pixels, optionally
+            followed by extra dimensions like wavelength.
+
+        Returns
+        -------
+        np.ma.MaskedArray
+            Contains the average per cell, with the shape of the grid followed
+            by the extra dimensions. Cells without valid pixels are masked.
+        """
+        _, extra = self._flatten(values)
+        sums, counts = self.accumulate(values)
+        return _masked_mean(sums, counts, self.grid.shape + extra)
+
+
+class Composite:
+    """Accumulates regridded granules into a multi-pass average.
+
+    Only the running sums and counts per cell are kept, so granules can be
+    added one at a time without holding them in memory.
+
+    Parameters
+    ----------
+    grid: Grid
+        Specifies the grid of the composite.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.sums = None
+        self.counts = None
+        self._extra = None
+
+    def add(self, regridder, values):
+        """Adds the values of one granule to the composite.
+
+        Parameters
+        ----------
+        regridder: Regridder
+            Specifies the Regridder of the granule. It must use the same grid.
+        values: array-like
+            Specifies the variable to add, with the shape of the granule's
+            pixels, optionally followed by extra dimensions.
+        """
+        if regridder.grid.shape != self.grid.shape:
+            raise ValueError("The Regridder does not use the grid of the composite.")
+        _, extra = regridder._flatten(values)
+        sums, counts = regridder.accumulate(values)
+        if self.sums is None:
+            self.sums, self.counts, self._extra = sums, counts, extra
+        else:
+            self.sums += sums
+            self.counts += counts
+
+    def result(self):
+        """Returns the average per cell over every granule that was added.
+
+        Returns
+        -------
+        np.ma.MaskedArray
+            Contains the average per cell. Cells without valid pixels are
+            masked.
+        """
+        if self.sums is None:
+            return np.ma.masked_all(self.grid.shape)
+        return _masked_mean(self.sums, self.counts, self.grid.shape + self._extra)
+
+
+def _masked_mean(sums, counts, shape):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / counts
+    return np.ma.masked_array(mean.reshape(shape), mask=(counts == 0).reshape(shape))
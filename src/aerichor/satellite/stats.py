@@ -0,0 +1,376 @@
+"""
+This module summarizes satellite variables in one streaming pass.
+
+Each variable is summarized by two accumulators that can be updated with one
+block of values at a time and merged with the accumulators of other blocks or
+granules. The summary of a directory of granules is the merge of the
+summaries of its granules, so granules can be summarized in parallel. Lazily
+opened granules are read one block of lines of one variable at a time, and
+nothing is cached, so no more than one block is in memory at once.
+
+Variables with more dimensions than the line/pixel grid, like the spectral
+`aot`, are summarized once per position along the extra dimension, for example
+`aot_440` and `aot_550` (labeled by the coordinate if there is one, and by the
+position otherwise).
+
+Classes
+-------
+Moments:
+    Accumulates the count, mean, variance, minimum, and maximum of values.
+QuantileSketch:
+    Approximates the quantiles of values with a bounded relative error.
+Statistics:
+    Summarizes many variables, like pandas.DataFrame.describe().
+
+Functions
+---------
+describe_granules:
+    Summarizes the variables of many granules.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import itertools
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from aerichor.satellite.lazy import LazyTree
+from aerichor.satellite.pace import SpexOne
+from aerichor.satellite.reader import _granules
+
+
+class Moments:
+    """Accumulates the count, mean, variance, minimum, and maximum of values.
+
+    Blocks are combined with the parallel form of Welford's algorithm, which
+    stays accurate when the mean is large compared to the spread.
+
+    Attributes
+    ----------
+    count: int
+        Stores the number of values.
+    mean: float
+        Stores the mean of the values.
+    m2: float
+        Stores the sum of squared differences from the mean.
+    min: float
+        Stores the smallest value.
+    max: float
+        Stores the largest value.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Adds a block of finite values."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        block = Moments()
+        block.count = values.size
+        block.mean = values.mean()
+        block.m2 = ((values - block.mean) ** 2).sum()
+        block.min = values.min()
+        block.max = values.max()
+        self.merge(block)
+
+    def merge(self, other):
+        """Adds the values of another Moments."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        """Returns the sample standard deviation (ddof=1), like pandas."""
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+
+
+class QuantileSketch:
+    """Approximates the quantiles of values with a bounded relative error.
+
+    Values are counted in buckets whose edges grow geometrically, as in
+    DDSketch. A quantile is within `relative_accuracy` of a value of the
+    right rank, and two sketches merge by adding their bucket counts.
+
+    Parameters
+    ----------
+    relative_accuracy: float, optional
+        Specifies the relative error of the quantiles.
+
+    Attributes
+    ----------
+    count: int
+        Stores the number of values.
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        self._positive = {}
+        self._negative = {}
+        self._zeros = 0
+        self.count = 0
+
+    def _add(self, buckets, values):
+        keys = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def update(self, values):
+        """Adds a block of finite values."""
+        values = np.asarray(values, dtype=np.float64)
+        self._add(self._positive, values[values >= self.MIN_VALUE])
+        self._add(self._negative, -values[values <= -self.MIN_VALUE])
+        self._zeros += int((abs(values) < self.MIN_VALUE).sum())
+        self.count += values.size
+
+    def merge(self, other):
+        """Adds the values of another QuantileSketch."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches with different accuracies cannot be merged.")
+        for mine, theirs in (
+            (self._positive, other._positive),
+            (self._negative, other._negative),
+        ):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self._zeros += other._zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """Returns the approximate q-quantile(s), with q between 0 and 1."""
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        negative = sorted(self._negative, reverse=True)
+        positive = sorted(self._positive)
+        keys = np.array(negative + positive, dtype=np.float64)
+        middle = 2 * self._gamma**keys / (self._gamma + 1)
+        middle[: len(negative)] *= -1
+        values = np.insert(middle, len(negative), 0.0)
+        counts = np.array(
+            [self._negative[k] for k in negative]
+            + [self._zeros]
+            + [self._positive[k] for k in positive]
+        )
+        ranks = q * (self.count - 1)
+        return values[np.searchsorted(np.cumsum(counts), ranks, side="right")]
+
+
+class Statistics:
+    """Summarizes many variables, like pandas.DataFrame.describe().
+
+    Only finite values are counted. Statistics are picklable, so they can be
+    computed in worker processes and merged in the caller.
+
+    Parameters
+    ----------
+    relative_accuracy: float, optional
+        Specifies the relative error of the quantiles.
+
+    Attributes
+    ----------
+    variables: dict
+        Stores the Moments and QuantileSketch of each variable, by name.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.variables = {}
+
+    def update(self, name, values):
+        """Adds a block of values of a variable. Non-finite values are skipped."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if name not in self.variables:
+            self.variables[name] = (Moments(), QuantileSketch(self.relative_accuracy))
+        for accumulator in self.variables[name]:
+            accumulator.update(values)
+
+    def merge(self, other):
+        """Adds the values of another Statistics and returns self."""
+        for name, (moments, sketch) in other.variables.items():
+            if name not in self.variables:
+                empty = QuantileSketch(self.relative_accuracy)
+                self.variables[name] = (Moments(), empty)
+            self.variables[name][0].merge(moments)
+            self.variables[name][1].merge(sketch)
+        return self
+
+    @classmethod
+    def from_satellite(cls, satellite, variables, lines=None, relative_accuracy=0.01):
+        """Summarizes variables of a Satellite, one block of lines at a time.
+
+        If the Satellite was opened lazily, each block is read from the file
+        and dropped after it is summarized, so the variables are never read
+        whole or cached.
+
+        Parameters
+        ----------
+        satellite: Satellite
+            Specifies the data to summarize.
+        variables: list of str
+            Specifies the variables, for example "geophysical_data/aot550".
+            Variables that are not numeric are skipped. Variables with extra
+            dimensions are summarized once per position along them.
+        lines: int, optional
+            Specifies the number of lines per block. By default, each variable
+            is read in one block.
+        relative_accuracy: float, optional
+            Specifies the relative error of the quantiles.
+
+        Returns
+        -------
+        Statistics
+        """
+        statistics = cls(relative_accuracy)
+        for name in variables:
+            if isinstance(satellite.data, LazyTree):
+                opened = satellite.data.open(name)
+            else:
+                opened = nullcontext(satellite[name])
+            with opened as variable:
+                if not np.issubdtype(variable.dtype, np.number):
+                    continue
+                columns = _columns(name.rsplit("/", 1)[-1], variable)
+                step = lines or max(len(variable), 1)
+                for begin in range(0, len(variable), step):
+                    block = np.asarray(variable[begin : begin + step])
+                    block = block.reshape(block.shape[:2] + (-1,))
+                    for position, column in enumerate(columns):
+                        statistics.update(column, block[..., position])
+        return statistics
+
+    def to_frame(self, percentiles=(0.25, 0.5, 0.75)):
+        """Returns the summary with one column per variable.
+
+        Parameters
+        ----------
+        percentiles: sequence of float, optional
+            Specifies the quantiles to include, between 0 and 1.
+
+        Returns
+        -------
+        pd.DataFrame
+            Contains the count, mean, std, min, percentiles, and max of each
+            variable, in the layout of pandas.DataFrame.describe().
+        """
+        labels = [f"{100 * p:g}%" for p in percentiles]
+        index = ["count", "mean", "std", "min", *labels, "max"]
+        summary = {}
+        for name, (moments, sketch) in self.variables.items():
+            empty = moments.count == 0
+            quantiles = sketch.quantile(percentiles)
+            # The sketch is only approximate, so keep it within the exact range.
+            if not empty:
+                quantiles = np.clip(quantiles, moments.min, moments.max)
+            summary[name] = [
+                moments.count,
+                np.nan if empty else moments.mean,
+                moments.std,
+                np.nan if empty else moments.min,
+                *quantiles,
+                np.nan if empty else moments.max,
+            ]
+        return pd.DataFrame(summary, index=index, dtype=np.float64)
+
+
+def _columns(column, variable):
+    """Names the columns of a variable, one per position along its extra dims."""
+    labels = []
+    for axis, size in enumerate(variable.shape[2:], start=2):
+        dim = variable.dims[axis] if hasattr(variable, "dims") else None
+        if dim in getattr(variable, "coords", {}):
+            labels.append([_label(value) for value in variable[dim].values])
+        else:
+            labels.append([str(position) for position in range(size)])
+    return ["_".join([column, *parts]) for parts in itertools.product(*labels)]
+
+
+def _label(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:g}"
+    return str(value)
+
+
+def describe_granules(
+    sources,
+    variables=None,
+    reader=SpexOne,
+    pattern="*.nc",
+    max_workers=1,
+    lines=None,
+    relative_accuracy=0.01,
+    percentiles=(0.25, 0.5, 0.75),
+):
+    """Summarizes the variables of many granules.
+
+    Each granule is summarized on its own, in a pool of processes if
+    `max_workers` is more than one, and the summaries are merged.
+
+    Parameters
+    ----------
+    sources: str, Path, or iterable of str or Path
+        Specifies a directory of granules, one granule, or a list of granules.
+    variables: list of str, optional
+        Specifies the variables to summarize. Defaults to every variable in
+        the geophysical group of each granule.
+    reader: type, optional
+        Specifies the Satellite subclass that reads the granules.
+    pattern: str, optional
+        Specifies the glob pattern of the granule file names when `sources` is
+        a directory.
+    max_workers: int, optional
+        Specifies the number of processes.
+    lines: int, optional
+        Specifies the number of lines that are read at once.
+    relative_accuracy: float, optional
+        Specifies the relative error of the quantiles.
+    percentiles: sequence of float, optional
+        Specifies the quantiles to include, between 0 and 1.
+
+    Returns
+    -------
+    pd.DataFrame
+        Contains the summary, like Statistics.to_frame().
+    """
+    files = [file for file, _ in _granules(sources, pattern, reader)]
+    args = (variables, reader, lines, relative_accuracy)
+    statistics = Statistics(relative_accuracy)
+    if max_workers == 1:
+        for file in files:
+            statistics.merge(_granule_statistics(file, *args))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = [pool.submit(_granule_statistics, file, *args) for file in files]
+            for future in futures:
+                statistics.merge(future.result())
+    return statistics.to_frame(percentiles)
+
+
+def _granule_statistics(file, variables, reader, lines, relative_accuracy):
+    """Summarizes the variables of one granule."""
+    with reader.from_netcdf(file, lazy=True) as satellite:
+        if variables is None:
+            variables = satellite.geophysical_variables()
+        return Statistics.from_satellite(satellite, variables, lines, relative_accuracy)
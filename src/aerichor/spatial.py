@@ -0,0 +1,665 @@
+"""
+This module contains spatial indexes that answer many neighborhood queries at
+once.
+
+The indexes are built once over a set of reference points (for example, the
+flattened pixels of a satellite pass) and then queried in a batch with the
+points of interest (for example, the locations of ground sensors). Each query
+returns flat arrays of (query, neighbor) pairs so that aggregation can be done
+with vectorized NumPy operations instead of a Python loop over rows.
+
+SciPy is imported when the first index is built, so that importing aerichor
+does not pay for it.
+
+Classes
+-------
+BoxIndex
+    Finds all reference points within a lat/lon box around each query point.
+SpaceTimeIndex
+    Finds all reference points within a distance and a time window of each
+    query point.
+SpatialOperator
+    Combines the values of the reference points near each query point with one
+    sparse matrix product, for any number of variables.
+PixelIndex
+    Finds the pixels of a 2-D latitude/longitude grid nearest to points.
+
+Functions
+---------
+aggregate
+    Reduces the values of neighboring points to one value per query point.
+haversine
+    Returns the great-circle distance between points, in kilometers.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class BoxIndex:
+    """Finds reference points within a latitude/longitude box of query points.
+
+    A point is "near" a query point if both its latitude and its longitude are
+    within plus or minus one buffer width of the query point. That definition
+    is the Chebyshev (L-infinity) distance, so a KD-tree that uses that metric
+    answers the box query exactly.
+
+    Parameters
+    ----------
+    lats: array-like
+        Specifies the latitudes of the reference points.
+    lons: array-like
+        Specifies the longitudes of the reference points.
+
+    Attributes
+    ----------
+    lats: np.ndarray
+        Stores the latitudes of the reference points.
+    lons: np.ndarray
+        Stores the longitudes of the reference points.
+    """
+
+    def __init__(self, lats, lons):
+        from scipy.spatial import cKDTree
+
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        if self.lats.shape != self.lons.shape:
+            msg = "Latitude and longitude must have the same shape."
+            raise ValueError(msg)
+        # The tree only holds points with valid coordinates. Keep the mapping
+        # back to the caller's positions.
+        self._valid = np.flatnonzero(np.isfinite(self.lats) & np.isfinite(self.lons))
+        coords = np.column_stack([self.lats[self._valid], self.lons[self._valid]])
+        self._tree = cKDTree(coords)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def query(self, lats, lons, buffer):
+        """Finds the reference points within a box around each query point.
+
+        Parameters
+        ----------
+        lats: array-like
+            Specifies the latitudes of the query points.
+        lons: array-like
+            Specifies the longitudes of the query points.
+        buffer: float
+            Specifies the half-width of the box in degrees.
+
+        Returns
+        -------
+        tuple of np.ndarray: (rows, neighbors)
+            Contains one entry per (query point, reference point) pair. The
+            `rows` array holds positions into the query points and the
+            `neighbors` array holds positions into the reference points.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        rows = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        if len(rows) == 0 or len(self._valid) == 0:
+            empty = np.array([], dtype=np.intp)
+            return empty, empty
+
+        coords = np.column_stack([lats[rows], lons[rows]])
+        hits = self._tree.query_ball_point(
+            coords, r=buffer, p=np.inf, return_sorted=False
+        )
+        counts = np.fromiter((len(hit) for hit in hits), dtype=np.intp, count=len(hits))
+        if counts.sum() == 0:
+            empty = np.array([], dtype=np.intp)
+            return empty, empty
+        neighbors = np.concatenate([hit for hit in hits if len(hit)]).astype(np.intp)
+        return np.repeat(rows, counts), self._valid[neighbors]
+
+
+class SpaceTimeIndex:
+    """Finds reference points within a distance and a time window of queries.
+
+    Time is added to the tree as a third (or fourth) coordinate, scaled so
+    that the time window has the same length as the spatial radius. One tree
+    then answers the space and the time condition together.
+
+    Metrics
+    -------
+    box:
+        A point is near a query point if its latitude and its longitude are
+        both within plus or minus `radius` degrees, as in BoxIndex.
+    haversine:
+        A point is near a query point if the great-circle distance between
+        them is at most `radius` kilometers. The tree holds Earth-centered
+        coordinates, and its candidates are checked against the exact
+        distance.
+
+    Parameters
+    ----------
+    lats: array-like
+        Specifies the latitudes of the reference points.
+    lons: array-like
+        Specifies the longitudes of the reference points.
+    times: array-like of datetime64
+        Specifies the times of the reference points.
+    radius: float
+        Specifies the spatial tolerance, in degrees for "box" and in
+        kilometers for "haversine".
+    time_window: timedelta
+        Specifies how far apart in time a point and a query point can be.
+    metric: str, optional
+        Specifies one of "box" and "haversine".
+
+    Attributes
+    ----------
+    lats: np.ndarray
+        Stores the latitudes of the reference points.
+    lons: np.ndarray
+        Stores the longitudes of the reference points.
+    times: np.ndarray
+        Stores the times of the reference points.
+    """
+
+    METRICS = ("box", "haversine")
+
+    def __init__(self, lats, lons, times, radius, time_window, metric="box"):
+        from scipy.spatial import cKDTree
+
+        if metric not in self.METRICS:
+            msg = f"Unknown metric {metric!r}. Use one of {list(self.METRICS)}."
+            raise ValueError(msg)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.times = np.asarray(times, dtype="datetime64[ns]")
+        self.radius = radius
+        self.metric = metric
+        self._window = np.timedelta64(pd.Timedelta(time_window)).astype(
+            "timedelta64[ns]"
+        )
+        if self._window <= np.timedelta64(0, "ns"):
+            raise ValueError("The time window must be positive.")
+        valid = np.isfinite(self.lats) & np.isfinite(self.lons) & ~np.isnat(self.times)
+        self._valid = np.flatnonzero(valid)
+        self._origin = self.times[self._valid].min() if len(self._valid) else None
+        if metric == "box":
+            self._reach = radius
+        else:
+            # The straight-line length of an arc of `radius` kilometers.
+            self._reach = 2 * EARTH_RADIUS_KM * np.sin(radius / (2 * EARTH_RADIUS_KM))
+        self._tree = cKDTree(
+            self._coordinates(self.lats, self.lons, self.times, self._valid)
+        )
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _coordinates(self, lats, lons, times, rows):
+        """Places points in the tree's space: position, then scaled time."""
+        if self._origin is None:
+            return np.empty((0, 3 if self.metric == "box" else 4))
+        elapsed = (times[rows] - self._origin).astype(np.float64)
+        scaled = elapsed * (self._reach / self._window.astype(np.float64))
+        if self.metric == "box":
+            position = np.column_stack([lats[rows], lons[rows]])
+        else:
+            position = _to_cartesian(lats[rows], lons[rows])
+        return np.column_stack([position, scaled])
+
+    def query(self, lats, lons, times):
+        """Finds the reference points near each query point in space and time.
+
+        Parameters
+        ----------
+        lats: array-like
+            Specifies the latitudes of the query points.
+        lons: array-like
+            Specifies the longitudes of the query points.
+        times: array-like of datetime64
+            Specifies the times of the query points.
+
+        Returns
+        -------
+        tuple of np.ndarray: (rows, neighbors, distances)
+            Contains one entry per (query point, reference point) pair, like
+            BoxIndex.query(), and the distance between the two points. The
+            distance is in degrees (the straight-line distance in latitude and
+            longitude) for "box" and in kilometers for "haversine".
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        times = np.asarray(times, dtype="datetime64[ns]")
+        rows = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons) & ~np.isnat(times))
+        empty = np.array([], dtype=np.intp)
+        if len(rows) == 0 or len(self._valid) == 0:
+            return empty, empty, np.array([], dtype=float)
+
+        coords = self._coordinates(lats, lons, times, rows)
+        if self.metric == "box":
+            hits = self._tree.query_ball_point(
+                coords, r=self._reach, p=np.inf, return_sorted=False
+            )
+        else:
+            # Every point within both tolerances is within this ball. The
+            # candidates are then checked against each tolerance.
+            hits = self._tree.query_ball_point(
+                coords, r=self._reach * np.sqrt(2), return_sorted=False
+            )
+        counts = np.fromiter((len(hit) for hit in hits), dtype=np.intp, count=len(hits))
+        if counts.sum() == 0:
+            return empty, empty, np.array([], dtype=float)
+        neighbors = np.concatenate([hit for hit in hits if len(hit)]).astype(np.intp)
+        rows = np.repeat(rows, counts)
+        neighbors = self._valid[neighbors]
+
+        if self.metric == "box":
+            # Rounding in the scaled time can admit a pair at the edge.
+            keep = abs(self.times[neighbors] - times[rows]) <= self._window
+            rows, neighbors = rows[keep], neighbors[keep]
+            distances = np.hypot(
+                self.lats[neighbors] - lats[rows], self.lons[neighbors] - lons[rows]
+            )
+            return rows, neighbors, distances
+
+        distances = haversine(
+            lats[rows], lons[rows], self.lats[neighbors], self.lons[neighbors]
+        )
+        keep = (distances <= self.radius) & (
+            abs(self.times[neighbors] - times[rows]) <= self._window
+        )
+        return rows[keep], neighbors[keep], distances[keep]
+
+
+class SpatialOperator:
+    """Combines the values of the reference points near each query point.
+
+    The neighbors of every query point are found once and stored as a sparse
+    matrix of weights, with one row per query point and one column per
+    reference point. Combining a variable is then a sparse matrix-vector
+    product, so many variables share the cost of the neighbor search.
+
+    Missing values (NaN) are excluded per variable: each row's weights are
+    normalized over the reference points where that variable is valid.
+
+    Weightings
+    ----------
+    mean:
+        Every neighbor has the same weight.
+    inverse_distance:
+        Each neighbor is weighted by 1 / distance ** power, with the distance
+        in degrees. Neighbors at the query point itself get the weight of a
+        neighbor at 1e-6 degrees.
+    weighted:
+        Each neighbor is weighted by its value in `weights`, for example a
+        quality score.
+
+    Parameters
+    ----------
+    rows: np.ndarray
+        Specifies, for each (query point, reference point) pair, the position
+        of the query point.
+    neighbors: np.ndarray
+        Specifies, for each pair, the position of the reference point.
+    shape: tuple of int
+        Specifies the number of query points and of reference points.
+    weights: np.ndarray, optional
+        Specifies the weight of each pair. Defaults to 1.
+
+    Attributes
+    ----------
+    matrix: scipy.sparse.csr_array
+        Stores the weight of each (query point, reference point) pair.
+    """
+
+    WEIGHTINGS = ("mean", "inverse_distance", "weighted")
+
+    def __init__(self, rows, neighbors, shape, weights=None):
+        from scipy import sparse
+
+        if weights is None:
+            weights = np.ones(len(rows))
+        self.matrix = sparse.csr_array((weights, (rows, neighbors)), shape=shape)
+
+    @classmethod
+    def from_points(
+        cls,
+        lats,
+        lons,
+        index,
+        buffer,
+        weighting="mean",
+        weights=None,
+        power=2,
+    ):
+        """Creates an operator from the reference points in a box around points.
+
+        Parameters
+        ----------
+        lats: array-like
+            Specifies the latitudes of the query points.
+        lons: array-like
+            Specifies the longitudes of the query points.
+        index: BoxIndex
+            Specifies the index of the reference points.
+        buffer: float
+            Specifies the half-width of the box in degrees.
+        weighting: str, optional
+            Specifies one of "mean", "inverse_distance", and "weighted".
+        weights: array-like, optional
+            Specifies the weight of each reference point for "weighted".
+            Reference points with a NaN weight are ignored.
+        power: float, optional
+            Specifies the power of the distance for "inverse_distance".
+
+        Returns
+        -------
+        SpatialOperator
+        """
+        if weighting not in cls.WEIGHTINGS:
+            msg = f"Unknown weighting {weighting!r}. Use one of {list(cls.WEIGHTINGS)}."
+            raise ValueError(msg)
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        rows, neighbors = index.query(lats, lons, buffer)
+        pair_weights = None
+        if weighting == "inverse_distance":
+            distances = np.hypot(
+                index.lats[neighbors] - lats[rows], index.lons[neighbors] - lons[rows]
+            )
+            pair_weights = np.maximum(distances, 1e-6) ** -power
+        elif weighting == "weighted":
+            if weights is None:
+                raise ValueError("The 'weighted' weighting requires weights.")
+            pair_weights = np.asarray(weights, dtype=float)[neighbors]
+            valid = np.isfinite(pair_weights)
+            rows, neighbors = rows[valid], neighbors[valid]
+            pair_weights = pair_weights[valid]
+        return cls(rows, neighbors, (len(lats), len(index)), pair_weights)
+
+    @property
+    def shape(self):
+        """Returns the number of query points and of reference points."""
+        return self.matrix.shape
+
+    def apply(self, values):
+        """Combines the values of the neighbors of each query point.
+
+        Parameters
+        ----------
+        values: array-like
+            Specifies one value per reference point, with shape (reference
+            points,) or (reference points, variables).
+
+        Returns
+        -------
+        np.ndarray
+            Contains the weighted average per query point, with shape (query
+            points,) or (query points, variables). Query points without valid
+            neighbors have a NaN value.
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape[0] != self.shape[1]:
+            msg = (
+                f"Values have {values.shape[0]} rows, but the operator has "
+                f"{self.shape[1]} reference points."
+            )
+            raise ValueError(msg)
+        valid = np.isfinite(values)
+        sums = self.matrix @ np.where(valid, values, 0.0)
+        norms = self.matrix @ valid.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(norms > 0, sums / norms, np.nan)
+
+
+class PixelIndex:
+    """Finds the pixels of a 2-D latitude/longitude grid nearest to points.
+
+    The pixels are indexed by their Earth-centered x, y, z coordinates, so
+    distances are straight lines through the Earth. Those are converted to
+    great-circle distances, which are accurate at any latitude and across the
+    antimeridian.
+
+    Parameters
+    ----------
+    lats: array-like
+        Specifies the latitude of each pixel, with shape (lines, pixels).
+    lons: array-like
+        Specifies the longitude of each pixel, in the same shape.
+    mask: array-like of bool, optional
+        Specifies the pixels to index, in the same shape. By default, every
+        pixel with a latitude and longitude is indexed.
+
+    Attributes
+    ----------
+    shape: tuple of int
+        Stores the shape of the grid.
+    checksum: str
+        Stores a hash of the latitudes, longitudes, and mask, to tell whether a
+        saved index belongs to a grid.
+    """
+
+    def __init__(self, lats, lons, mask=None):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        self.shape = lats.shape
+        self.checksum = self.hash(lats, lons, mask)
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        if mask is not None:
+            valid &= np.asarray(mask, dtype=bool)
+        valid = np.flatnonzero(valid)
+        self._build(valid, _to_cartesian(lats.ravel()[valid], lons.ravel()[valid]))
+
+    def _build(self, valid, points):
+        from scipy.spatial import cKDTree
+
+        self._valid = valid
+        self._tree = cKDTree(points)
+
+    @staticmethod
+    def hash(lats, lons, mask=None):
+        """Returns a hash of the latitudes, longitudes, and mask of a grid."""
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (lats, lons):
+            digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+        if mask is not None:
+            digest.update(np.ascontiguousarray(mask, dtype=bool).tobytes())
+        return digest.hexdigest()
+
+    def query(self, lats, lons, k=1, max_distance=None):
+        """Finds the k nearest pixels of each point.
+
+        Parameters
+        ----------
+        lats: array-like
+            Specifies the latitudes of the points.
+        lons: array-like
+            Specifies the longitudes of the points.
+        k: int, optional
+            Specifies the number of pixels per point.
+        max_distance: float, optional
+            Specifies, in kilometers, how far a pixel can be from a point.
+
+        Returns
+        -------
+        tuple of np.ndarray: (rows, lines, pixels, distances)
+            Contains one entry per (point, pixel) pair: the position of the
+            point, the line and pixel of the pixel, and the great-circle
+            distance between them in kilometers. Pairs are ordered by point
+            and then by distance.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        rows = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        bound = np.inf
+        if max_distance is not None:
+            bound = 2 * EARTH_RADIUS_KM * np.sin(max_distance / (2 * EARTH_RADIUS_KM))
+            # Keep pixels at exactly max_distance despite rounding.
+            bound = np.nextafter(bound, np.inf)
+        chords, found = self._tree.query(
+            _to_cartesian(lats[rows], lons[rows]), k=k, distance_upper_bound=bound
+        )
+        chords = chords.reshape(len(rows), k)
+        found = found.reshape(len(rows), k)
+        hit = np.isfinite(chords)
+        rows = np.repeat(rows, k).reshape(len(rows), k)[hit]
+        lines, pixels = np.unravel_index(self._valid[found[hit]], self.shape)
+        ratio = np.clip(chords[hit] / (2 * EARTH_RADIUS_KM), 0, 1)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(ratio)
+        return rows, lines, pixels, distances
+
+    def save(self, path):
+        """Writes the indexed pixels and their coordinates to an .npz file.
+
+        Only plain arrays are written, so loading a file never runs code.
+        """
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                checksum=np.array(self.checksum),
+                shape=np.array(self.shape),
+                valid=self._valid,
+                points=self._tree.data,
+            )
+
+    @classmethod
+    def load(cls, path, lats=None, lons=None, mask=None):
+        """Reads an index from a file written by save().
+
+        The tree is rebuilt from the stored coordinates, which skips the
+        conversion of the pixels to Earth-centered coordinates.
+
+        Parameters
+        ----------
+        path: str or Path
+            Specifies the file to read.
+        lats: array-like, optional
+            Specifies the latitudes of the grid that the index must belong to.
+        lons: array-like, optional
+            Specifies the longitudes of the grid that the index must belong to.
+        mask: array-like of bool, optional
+            Specifies the mask that the index must have been built with.
+
+        Returns
+        -------
+        PixelIndex or None
+            The index, or None if it belongs to a different grid or mask.
+        """
+        with np.load(path, allow_pickle=False) as stored:
+            checksum = str(stored["checksum"])
+            if lats is not None and checksum != cls.hash(lats, lons, mask):
+                return None
+            index = cls.__new__(cls)
+            index.shape = tuple(int(n) for n in stored["shape"])
+            index.checksum = checksum
+            index._build(stored["valid"], stored["points"])
+        return index
+
+
+def _to_cartesian(lats, lons, radius=EARTH_RADIUS_KM):
+    """Converts latitude and longitude to Earth-centered x, y, z coordinates."""
+    lats = np.radians(lats)
+    lons = np.radians(lons)
+    cos_lat = np.cos(lats)
+    return radius * np.column_stack(
+        [cos_lat * np.cos(lons), cos_lat * np.sin(lons), np.sin(lats)]
+    )
+
+
+def haversine(lats0, lons0, lats1, lons1):
+    """Returns the great-circle distance between points, in kilometers."""
+    lats0, lons0, lats1, lons1 = map(np.radians, (lats0, lons0, lats1, lons1))
+    a = (
+        np.sin((lats1 - lats0) / 2) ** 2
+        + np.cos(lats0) * np.cos(lats1) * np.sin((lons1 - lons0) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _mean(rows, values, n, **_):
+    sums = np.bincount(rows, weights=values, minlength=n)
+    counts = np.bincount(rows, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _count(rows, values, n, **_):
+    return np.bincount(rows, minlength=n)
+
+
+def _std(rows, values, n, **_):
+    # Match pandas, which uses the sample standard deviation (ddof=1).
+    counts = np.bincount(rows, minlength=n)
+    means = _mean(rows, values, n)
+    squares = np.bincount(rows, weights=(values - means[rows]) ** 2, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 1, np.sqrt(squares / (counts - 1)), np.nan)
+
+
+def _median(rows, values, n, **_):
+    result = np.full(n, np.nan)
+    medians = pd.Series(values).groupby(rows).median()
+    result[medians.index.to_numpy()] = medians.to_numpy()
+    return result
+
+
+def _nearest(rows, values, n, *, distances, **_):
+    result = np.full(n, np.nan)
+    if len(rows) == 0:
+        return result
+    order = np.lexsort((distances, rows))
+    rows, values = rows[order], values[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    result[rows[first]] = values[first]
+    return result
+
+
+AGGREGATIONS = {
+    "mean": _mean,
+    "median": _median,
+    "count": _count,
+    "std": _std,
+    "nearest": _nearest,
+}
+
+
+def aggregate(rows, values, n, strategy="mean", distances=None):
+    """Reduces the values of neighboring points to one value per query point.
+
+    Parameters
+    ----------
+    rows: np.ndarray
+        Specifies, for each neighbor, the position of its query point.
+    values: np.ndarray
+        Specifies, for each neighbor, the value to aggregate. Values must not
+        contain NaN.
+    n: int
+        Specifies the number of query points.
+    strategy: str or callable, optional
+        Specifies how to reduce the values of a query point's neighbors. Use
+        one of "mean", "median", "count", "std", and "nearest", or pass a
+        function. A function is called with a pd.Series of neighbor values
+        for each query point that has at least one neighbor.
+    distances: np.ndarray, optional
+        Specifies, for each neighbor, its distance to the query point. The
+        "nearest" strategy requires this value.
+
+    Returns
+    -------
+    np.ndarray
+        Contains one value per query point. Query points without neighbors
+        have a NaN value (or 0 for "count").
+    """
+    if callable(strategy):
+        result = np.full(n, np.nan)
+        reduced = pd.Series(values).groupby(rows).agg(strategy)
+        result[reduced.index.to_numpy()] = reduced.to_numpy()
+        return result
+    if strategy not in AGGREGATIONS:
+        msg = f"Unknown strategy {strategy!r}. Use one of {list(AGGREGATIONS)}."
+        raise ValueError(msg)
+    if strategy == "nearest" and distances is None:
+        msg = "The 'nearest' strategy requires the distance to each neighbor."
+        raise ValueError(msg)
+    return AGGREGATIONS[strategy](rows, values, n, distances=distances)
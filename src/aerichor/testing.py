@@ -0,0 +1,264 @@
+"""
+This module generates synthetic data in the layouts that aerichor reads. The
+data is meant for tests and benchmarks, so it is fast to generate at any size
+and reproducible from a seed.
+
+Functions
+---------
+make_spexone_tree:
+    Creates a DataTree with the layout of a SPEXone L2 granule.
+write_spexone_granule:
+    Writes a synthetic SPEXone L2 granule to a NetCDF file.
+spexone_granule_name:
+    Returns a SPEXone file name for a start time.
+make_aqs_samples:
+    Creates the "Data" of an AQS sampleData response.
+make_aqs_payload:
+    Creates a complete AQS sampleData response body.
+write_aqs_bulk_file:
+    Writes AQS samples as an EPA hourly bulk file.
+"""
+from datetime import datetime, timedelta
+import zipfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+# The start time of the synthetic granules, 2024-03-24 17:44:14.
+GRANULE_START = datetime(2024, 3, 24, 17, 44, 14)
+
+
+def make_spexone_tree(
+    n_lines=40,
+    n_pixels=10,
+    n_wavelengths=3,
+    origin=(-80.0, 34.0),
+    length=2.0,
+    seed=0,
+):
+    """Creates a DataTree with the layout of a SPEXone L2 granule.
+
+    The swath runs north-north-east from `origin` for `length` degrees of
+    latitude, however many lines it has. Each pixel is 0.05 degrees of
+    longitude east of the one before it. The geophysical data is random, and
+    the first pixel of `aot550` is NaN. The diagnostic data has a random
+    `quality_level` from 0 to 3 and a `cloud_mask` that flags about one pixel
+    in five.
+
+    Parameters
+    ----------
+    n_lines: int, optional
+        Specifies the number of lines (along track).
+    n_pixels: int, optional
+        Specifies the number of pixels per line (across track).
+    n_wavelengths: int, optional
+        Specifies the number of wavelengths of the spectral variables.
+    origin: tuple of form: (lon, lat), optional
+        Specifies the location of the first pixel.
+    length: float, optional
+        Specifies the length of the swath in degrees of latitude.
+    seed: int, optional
+        Specifies the seed of the random values.
+
+    Returns
+    -------
+    xarray.DataTree
+    """
+    rng = np.random.default_rng(seed)
+    lines, pixels = np.meshgrid(np.arange(n_lines), np.arange(n_pixels), indexing="ij")
+    dims = ("number_of_lines", "pixels_per_line")
+    shape = (n_lines, n_pixels)
+    step = length / n_lines
+    lats = origin[1] + step * lines + 0.02 * pixels
+    lons = origin[0] + 0.2 * step * lines + 0.05 * pixels
+    geolocation = xr.Dataset(
+        {
+            "latitude": (dims, lats.astype(np.float32)),
+            "longitude": (dims, lons.astype(np.float32)),
+        }
+    )
+    aot550 = rng.uniform(0, 1, shape).astype(np.float32)
+    aot550[0, 0] = np.nan
+    geophysical = xr.Dataset(
+        {
+            "aot550": (dims, aot550),
+            "angstrom_440_670": (dims, rng.uniform(0, 2, shape)),
+            "aot": (
+                dims + ("wavelengths",),
+                rng.uniform(0, 1, shape + (n_wavelengths,)).astype(np.float32),
+            ),
+        }
+    )
+    diagnostic = xr.Dataset(
+        {
+            "quality_level": (dims, rng.integers(0, 4, shape).astype(np.int8)),
+            "cloud_mask": (dims, (rng.uniform(0, 1, shape) < 0.2).astype(np.uint8)),
+        }
+    )
+    return xr.DataTree.from_dict(
+        {
+            "/geolocation_data": geolocation,
+            "/geophysical_data": geophysical,
+            "/diagnostic_data": diagnostic,
+        }
+    )
+
+
+def spexone_granule_name(start):
+    """Returns a SPEXone L2 file name for a start time."""
+    return f"PACE_SPEXONE.{start:%Y%m%dT%H%M%S}.L2.RTAP_LD.V3_0.nc"
+
+
+def write_spexone_granule(path, **kwargs):
+    """Writes a synthetic SPEXone L2 granule to a NetCDF file.
+
+    If `path` is a directory, the file is named like a SPEXone granule that
+    starts at GRANULE_START. Keep the SPEXone naming scheme, because
+    SpexOne reads the start time from the file name.
+
+    Parameters
+    ----------
+    path: Path
+        Specifies the file or directory to write to.
+    **kwargs: key-value pairs
+        Specifies the parameters of make_spexone_tree().
+
+    Returns
+    -------
+    Path
+        The location of the file.
+    """
+    if path.is_dir():
+        path = path / spexone_granule_name(GRANULE_START)
+    make_spexone_tree(**kwargs).to_netcdf(path)
+    return path
+
+
+def make_aqs_samples(
+    n_sites=100,
+    n_hours=24,
+    date=datetime(2024, 3, 24),
+    extent=(-80.0, -78.0, 34.0, 36.0),
+    seed=0,
+):
+    """Creates the "Data" of an AQS sampleData response.
+
+    Parameters
+    ----------
+    n_sites: int, optional
+        Specifies the number of sensor sites.
+    n_hours: int, optional
+        Specifies the number of hourly samples per site.
+    date: datetime, optional
+        Specifies the date of the first sample.
+    extent: tuple of form: (x0, x1, y0, y1), optional
+        Specifies the box that the sites are placed in.
+    seed: int, optional
+        Specifies the seed of the random values.
+
+    Returns
+    -------
+    list of dict
+    """
+    rng = np.random.default_rng(seed)
+    x0, x1, y0, y1 = extent
+    lons = rng.uniform(x0, x1, n_sites).round(6)
+    lats = rng.uniform(y0, y1, n_sites).round(6)
+    measurements = rng.gamma(2.0, 4.0, (n_sites, n_hours)).round(1)
+    times = [date + timedelta(hours=hour) for hour in range(n_hours)]
+    samples = []
+    for site in range(n_sites):
+        for hour, time in enumerate(times):
+            samples.append(
+                {
+                    "state_code": "37",
+                    "county_code": "183",
+                    "site_number": f"{site:04d}",
+                    "parameter_code": "88101",
+                    "poc": 1 + site % 3,
+                    "latitude": float(lats[site]),
+                    "longitude": float(lons[site]),
+                    "parameter": "PM2.5 - Local Conditions",
+                    "date_gmt": f"{time:%Y-%m-%d}",
+                    "time_gmt": f"{time:%H:%M}",
+                    "sample_measurement": float(measurements[site, hour]),
+                    "units_of_measure": "Micrograms/cubic meter (LC)",
+                    "qualifier": None,
+                    "method_code": "209",
+                }
+            )
+    return samples
+
+
+def make_aqs_payload(**kwargs):
+    """Creates a complete AQS sampleData response body.
+
+    Parameters
+    ----------
+    **kwargs: key-value pairs
+        Specifies the parameters of make_aqs_samples().
+
+    Returns
+    -------
+    dict
+    """
+    samples = make_aqs_samples(**kwargs)
+    header = {"status": "Success", "request_time": "", "url": "", "rows": len(samples)}
+    return {"Header": [header], "Data": samples}
+
+
+def write_aqs_bulk_file(directory, **kwargs):
+    """Writes AQS samples as an EPA hourly bulk file.
+
+    The file is a zipped CSV with the columns of the EPA's pre-generated
+    hourly files, named like hourly_88101_2024.zip after the parameter and
+    year of the samples.
+
+    Parameters
+    ----------
+    directory: Path
+        Specifies the directory to write to.
+    **kwargs: key-value pairs
+        Specifies the parameters of make_aqs_samples().
+
+    Returns
+    -------
+    Path
+        The location of the file.
+    """
+    samples = pd.DataFrame(make_aqs_samples(**kwargs))
+    bulk = pd.DataFrame(
+        {
+            "State Code": samples["state_code"],
+            "County Code": samples["county_code"],
+            "Site Num": samples["site_number"],
+            "Parameter Code": samples["parameter_code"],
+            "POC": samples["poc"],
+            "Latitude": samples["latitude"],
+            "Longitude": samples["longitude"],
+            "Datum": "WGS84",
+            "Parameter Name": samples["parameter"],
+            "Date Local": samples["date_gmt"],
+            "Time Local": samples["time_gmt"],
+            "Date GMT": samples["date_gmt"],
+            "Time GMT": samples["time_gmt"],
+            "Sample Measurement": samples["sample_measurement"],
+            "Units of Measure": samples["units_of_measure"],
+            "MDL": 2.0,
+            "Uncertainty": None,
+            "Qualifier": samples["qualifier"],
+            "Method Type": "FEM",
+            "Method Code": samples["method_code"],
+            "Method Name": "Synthetic",
+            "State Name": "North Carolina",
+            "County Name": "Wake",
+            "Date of Last Change": "2025-01-01",
+        }
+    )
+    name = f"hourly_{bulk['Parameter Code'][0]}_{bulk['Date GMT'][0][:4]}"
+    path = directory / f"{name}.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{name}.csv", bulk.to_csv(index=False))
+    return path
@@ -5,8 +5,15 @@ structure.
 Classes
 -------
 BoundingBox
+
+Functions
+---------
+parse_gmt_times:
+    Combines AQS-style date and time strings into datetime64 values.
 """
 
+import numpy as np
+import pandas as pd
 import shapely
 
 
@@ -30,6 +37,8 @@ class BoundingBox:
         Contains a LinearRing representation of the box.
     points: dict
         A dictionary of shapely.Point representations of the corners.
+    polygon: shapely.Polygon
+        Contains a prepared Polygon representation of the box.
     """
 
     def __init__(
@@ -52,13 +61,31 @@ class BoundingBox:
                 self.points["top_left"],
             ]
         )
+        self.polygon = shapely.Polygon(self.box)
+        shapely.prepare(self.polygon)
 
     # NOTE: By casting to a Point, we can use point-like objects, like [0,10]
     def __contains__(self, point):
         if not isinstance(point, shapely.Geometry):
             point = shapely.Point(point)
-        polygon = shapely.Polygon(self.box)
-        return polygon.contains(point)
+        return self.polygon.contains(point)
+
+    def contains_points(self, lons, lats):
+        """Tests many points at once for whether they are inside the box.
+
+        Parameters
+        ----------
+        lons: array-like
+            Specifies the longitude (x) of each point.
+        lats: array-like
+            Specifies the latitude (y) of each point.
+
+        Returns
+        -------
+        np.ndarray of bool
+            Contains True for each point that is inside the box.
+        """
+        return shapely.contains_xy(self.polygon, lons, lats)
 
     @classmethod
     def from_shape(cls, shape):
@@ -103,3 +130,30 @@ class BoundingBox:
         y0 = min(p["bottom_left"].y, p["bottom_right"].y) - buffer
         y1 = max(p["top_left"].y, p["top_right"].y) + buffer
         return (x0, x1, y0, y1)
+
+
+def parse_gmt_times(dates, times):
+    """Combines AQS-style date and time strings into datetime64 values.
+
+    AQS responses and EPA bulk files both give times as a date like
+    "2024-03-24" and an hour like "17:00". Each distinct string is parsed
+    once, since a year of hourly samples repeats the same few values.
+
+    Parameters
+    ----------
+    dates: array-like of str
+        Specifies the dates, formatted as "%Y-%m-%d".
+    times: array-like of str
+        Specifies the times of day, formatted as "%H:%M".
+
+    Returns
+    -------
+    np.ndarray of datetime64[ns]
+    """
+    date_codes, date_values = pd.factorize(np.array(dates, dtype=object))
+    time_codes, time_values = pd.factorize(np.array(times, dtype=object))
+    days = pd.to_datetime(date_values, format="%Y-%m-%d").to_numpy("datetime64[ns]")
+    offsets = pd.to_timedelta(
+        [value + ":00" for value in time_values]
+    ).to_numpy("timedelta64[ns]")
+    return days[date_codes] + offsets[time_codes]
@@ -0,0 +1,11 @@
+import pytest
+
+from aerichor.testing import write_spexone_granule
+
+
+GRANULE_NAME = "PACE_SPEXONE.20240324T174414.L2.RTAP_LD.V3_0.nc"
+
+
+@pytest.fixture(scope="session")
+def granule(tmp_path_factory):
+    return write_spexone_granule(tmp_path_factory.mktemp("spexone") / GRANULE_NAME)
@@ -0,0 +1,202 @@
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+
+from aerichor.ground.aqs import AqiPollutant, AqsClient, unpack_samples
+from aerichor.ground.ratelimit import TokenBucket
+from aerichor.instrument import profile
+from aerichor.satellite.base import Satellite
+
+
+def make_sample(site, lon, lat, measurement=1.0, time="17:00"):
+    return {
+        "site_number": site,
+        "longitude": lon,
+        "latitude": lat,
+        "date_gmt": "2024-03-24",
+        "time_gmt": time,
+        "sample_measurement": measurement,
+        "units_of_measure": "Micrograms/cubic meter (LC)",
+        "parameter": "PM2.5 - Local Conditions",
+    }
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def json(self):
+        return {"Header": [{"status": "Success"}], "Data": self.samples}
+
+
+@pytest.fixture
+def swath():
+    lines, pixels = np.meshgrid(np.arange(10.0), np.arange(3.0), indexing="ij")
+    return Satellite(
+        lats=lines + pixels,
+        lons=lines - pixels,
+        start=datetime(2024, 3, 24, 17, 44),
+        end=datetime(2024, 3, 24, 17, 49),
+    )
+
+
+def test_get_pollutant_in_swath_drops_sensors_outside_footprint(monkeypatch, swath):
+    samples = [
+        make_sample("0001", 4.0, 5.0),
+        make_sample("0002", 0.0, 9.0),  # inside the bbox, outside the swath
+        make_sample("0003", 1.0, 2.0),
+    ]
+    client = AqsClient(login="me@example.com", key="secret")
+    monkeypatch.setattr(client, "get", lambda endpoint, **kw: FakeResponse(samples))
+    df = client.get_pollutant_in_swath(AqiPollutant.PM25, swath)
+    assert list(df["site_id"]) == ["0001", "0003"]
+    assert df.units == "Micrograms/cubic meter (LC)"
+    assert df.label == "PM2.5 - Local Conditions"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves AQS-like responses and records when each request arrived."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.arrivals.append(time.monotonic())
+            failure = server.failures.pop(0) if server.failures else None
+        if failure:
+            self.send_response(failure)
+            self.end_headers()
+            return
+        query = parse_qs(urlparse(self.path).query)
+        site = query["bdate"][0]
+        body = json.dumps({"Data": [make_sample(site, 4.0, 5.0)]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.arrivals = []
+    server.failures = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def stub_client(stub, rate=20.0):
+    host, port = stub.server_address
+    return AqsClient(
+        login="me@example.com",
+        key="secret",
+        rate_limiter=TokenBucket(rate=rate),
+        backoff=0.01,
+        base_url=f"http://{host}:{port}/",
+    )
+
+
+def test_token_bucket_spaces_requests():
+    bucket = TokenBucket(rate=100.0)
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits[0] == 0
+    assert time.monotonic() - start >= 0.049
+    assert bucket.waited == pytest.approx(sum(waits))
+
+
+def test_batch_respects_rate_limit(stub, swath):
+    client = stub_client(stub, rate=20.0)
+    days = [swath] * 8
+    results = client.batch_get_pollutant_in_swath(
+        [(AqiPollutant.PM25, day) for day in days], max_workers=4
+    )
+    assert len(results) == 8
+    assert all(list(df["site_id"]) == ["20240324"] for df in results)
+    gaps = np.diff(sorted(stub.arrivals))
+    # Allow for timer jitter around the 50 ms spacing.
+    assert gaps.min() >= 0.04
+    assert sorted(stub.arrivals)[-1] - sorted(stub.arrivals)[0] >= 0.34
+
+
+def test_get_retries_on_throttling(stub):
+    stub.failures = [429, 503]
+    client = stub_client(stub, rate=1000.0)
+    response = client.get("sampleData/byBox", bdate="20240324")
+    assert response.ok
+    assert len(stub.arrivals) == 3
+
+
+def test_get_gives_up_after_max_retries(stub):
+    stub.failures = [500] * 10
+    client = stub_client(stub, rate=1000.0)
+    client.max_retries = 2
+    response = client.get("sampleData/byBox", bdate="20240324")
+    assert response.status_code == 500
+    assert len(stub.arrivals) == 3
+
+
+def test_get_pollutant_in_swaths_coalesces_requests(monkeypatch, swath):
+    samples = [
+        make_sample("0001", 4.0, 5.0),
+        make_sample("0002", 0.0, 9.0),
+        make_sample("0003", 1.0, 2.0),
+    ]
+    requests = []
+
+    def fake_get(endpoint, **params):
+        requests.append(params)
+        return FakeResponse(samples)
+
+    client = AqsClient(login="me@example.com", key="secret")
+    monkeypatch.setattr(client, "get", fake_get)
+    results = client.get_pollutant_in_swaths(AqiPollutant.PM25, [swath, swath])
+    assert len(requests) == 1
+    assert [list(df["site_id"]) for df in results] == [["0001", "0003"]] * 2
+
+
+def test_unpack_samples():
+    samples = [
+        make_sample("0001", 4.0, 5.0, 1.5, "17:00") | {"poc": 1, "qualifier": None},
+        make_sample("0002", 1.0, 2.0, None, "18:00") | {"poc": 3, "qualifier": "V"},
+    ]
+    df = unpack_samples(samples, fields=("poc", "qualifier", "method_code"))
+    assert df["site_id"].dtype == "category"
+    assert list(df["time"]) == [datetime(2024, 3, 24, 17), datetime(2024, 3, 24, 18)]
+    assert df["measurement"].dtype == np.float32
+    assert df["measurement"].isnull().tolist() == [False, True]
+    assert list(df["poc"]) == [1, 3]
+    assert df["qualifier"].tolist()[1] == "V"
+    assert df["method_code"].isnull().all()
+    assert df.units == "Micrograms/cubic meter (LC)"
+
+
+def test_unpack_samples_empty():
+    df = unpack_samples([])
+    assert len(df) == 0
+    assert list(df.columns) == ["site_id", "longitude", "latitude", "time", "measurement"]
+
+
+def test_get_pollutant_in_swath_is_instrumented(stub, swath):
+    client = stub_client(stub, rate=1000.0)
+    with profile() as run:
+        client.get_pollutant_in_swath(AqiPollutant.PM25, swath)
+    stages = [e.stage for e in run.events]
+    assert stages == ["aqs.rate_limit", "aqs.request", "aqs.decode", "aqs.unpack"]
+    assert run.events[1].fields["bytes"] > 0
+    assert run.events[3].fields["rows"] == 1
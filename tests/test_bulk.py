@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from aerichor.ground.aqs import AqiPollutant, AqsClient, unpack_samples
+from aerichor.ground import bulk
+from aerichor.ground.bulk import BulkSource
+from aerichor.io import write_dataset
+from aerichor.satellite.base import Satellite
+from aerichor.testing import make_aqs_samples, write_aqs_bulk_file
+
+
+KWARGS = dict(n_sites=30, n_hours=72, date=datetime(2024, 3, 23))
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("bulk")
+    file = write_aqs_bulk_file(directory, **KWARGS)
+    source = BulkSource(directory / "store")
+    assert source.ingest([file], chunksize=500) == 30 * 72
+    return source
+
+
+@pytest.fixture
+def swath():
+    lines, pixels = np.meshgrid(
+        np.linspace(0, 2, 20), np.linspace(0, 1, 5), indexing="ij"
+    )
+    return Satellite(
+        lats=34 + lines,
+        lons=-80 + pixels + 0.5 * lines,
+        start=datetime(2024, 3, 24, 17, 44),
+        end=datetime(2024, 3, 24, 17, 49),
+    )
+
+
+def test_bulk_source_matches_client(source, swath):
+    fields = ("poc", "method_code")
+    computed = source.get_pollutant_in_swath(AqiPollutant.PM25, swath, fields)
+    samples = [s for s in make_aqs_samples(**KWARGS) if s["date_gmt"] == "2024-03-24"]
+    target = AqsClient._in_swath(unpack_samples(samples, fields), swath)
+    target = target.sort_values(["site_id", "time"], ignore_index=True)
+    assert 0 < len(computed) < 30 * 24
+    assert computed.units == target.units
+    assert computed.label == target.label
+    assert list(computed.columns) == list(target.columns)
+    assert list(computed.dtypes.astype(str)) == list(target.dtypes.astype(str))
+    for column in computed.columns:
+        assert list(computed[column]) == list(target[column])
+
+
+def test_bulk_source_skips_ingested_files(source, tmp_path):
+    assert source.files == ["hourly_88101_2024.zip"]
+    file = write_aqs_bulk_file(tmp_path, **KWARGS)
+    assert BulkSource(source.path).ingest([file]) == 0
+
+
+def test_bulk_source_bbox_and_empty(source):
+    df = source.get_pollutant_in_bbox(
+        AqiPollutant.PM25, (-80, -78, 34, 36), "2024-03-23", "2024-03-25"
+    )
+    assert len(df) == 30 * 72
+    empty = source.get_pollutant_in_bbox(
+        AqiPollutant.PM25, (0, 1, 0, 1), "2024-03-23", "2024-03-25"
+    )
+    assert len(empty) == 0
+    assert list(empty.columns) == list(df.columns)
+    with pytest.raises(ValueError):
+        source.get_pollutant_in_bbox(
+            AqiPollutant.PM25, (-80, -78, 34, 36), "2024-03-23", "2024-03-23", ["x"]
+        )
+    ozone = source.get_pollutant_in_bbox(
+        AqiPollutant.O3, (-80, -78, 34, 36), "2024-03-23", "2024-03-25"
+    )
+    assert len(ozone) == 0
+
+
+def test_bulk_source_replaces_interrupted_ingest(monkeypatch, tmp_path):
+    file = write_aqs_bulk_file(tmp_path, **KWARGS)
+    store = tmp_path / "store"
+    calls = []
+
+    def fail_on_third_chunk(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return write_dataset(*args)
+
+    monkeypatch.setattr(bulk, "write_dataset", fail_on_third_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        BulkSource(store).ingest([file], chunksize=500)
+    monkeypatch.undo()
+    assert BulkSource(store).files == []
+    assert BulkSource(store).ingest([file], chunksize=500) == 30 * 72
+
+    # An ingest that stopped after moving its files but before updating the
+    # manifest is also replaced.
+    (store / bulk.MANIFEST_NAME).unlink()
+    source = BulkSource(store)
+    assert source.ingest([file], chunksize=500) == 30 * 72
+    df = source.get_pollutant_in_bbox(
+        AqiPollutant.PM25, (-80, -78, 34, 36), "2024-03-23", "2024-03-25"
+    )
+    assert len(df) == 30 * 72
+    assert not any((store / bulk.STAGING).iterdir())
@@ -0,0 +1,105 @@
+from datetime import timedelta
+import json
+import time
+
+import pytest
+
+from aerichor.ground.aqs import AqsClient
+from aerichor.ground.cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(tmp_path / "cache.sqlite")
+
+
+def test_cache_roundtrip(cache):
+    params = {"param": 88101, "bdate": "20240324"}
+    assert cache.get("sampleData/byBox", params) is None
+    cache.put("sampleData/byBox", params, b'{"Data": []}')
+    assert cache.get("sampleData/byBox", dict(reversed(params.items()))) == b'{"Data": []}'
+    assert cache.stats == {"hits": 1, "misses": 1, "entries": 1, "bytes": 12}
+    assert cache.entries()[0]["params"] == params
+
+
+def test_cache_clear(cache):
+    cache.put("a", {}, b"1")
+    cache.clear()
+    assert cache.stats["entries"] == 0
+    assert cache.get("a", {}) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_bytes=10)
+    cache.put("a", {}, b"12345")
+    cache.put("b", {}, b"12345")
+    cache.get("a", {})
+    cache.put("c", {}, b"12345")
+    assert cache.get("a", {}) == b"12345"
+    assert cache.get("b", {}) is None
+    assert cache.stats["bytes"] == 10
+
+
+def test_cache_evicts_expired(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_age=timedelta(seconds=0.01))
+    cache.put("a", {}, b"1")
+    time.sleep(0.05)
+    assert cache.get("a", {}) is None
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+
+    def __init__(self, status="Success"):
+        self.body = {"Header": [{"status": status}], "Data": [1, 2]}
+        self.content = json.dumps(self.body).encode()
+
+    def json(self):
+        return self.body
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+        return 0.0
+
+
+def test_client_uses_cache(monkeypatch, cache):
+    calls = []
+    limiter = CountingLimiter()
+    client = AqsClient(
+        login="me@example.com", key="secret", cache=cache, rate_limiter=limiter
+    )
+
+    def fake_get(url, params):
+        calls.append(params)
+        return FakeResponse()
+
+    monkeypatch.setattr(client.session, "get", fake_get)
+    client.get("sampleData/byBox", param=88101)
+    response = client.get("sampleData/byBox", param=88101)
+    assert response.json()["Data"] == [1, 2]
+    assert calls == [{"email": "me@example.com", "key": "secret", "param": 88101}]
+    assert limiter.calls == 1
+    assert "secret" not in str(cache.entries())
+
+
+def test_client_does_not_cache_failed_replies(monkeypatch, cache):
+    replies = [FakeResponse("Failed"), FakeResponse()]
+    limiter = CountingLimiter()
+    client = AqsClient(
+        login="me@example.com", key="secret", cache=cache, rate_limiter=limiter
+    )
+    monkeypatch.setattr(client.session, "get", lambda url, params: replies.pop(0))
+    failed = client.get("sampleData/byBox", param=88101)
+    assert failed.json()["Header"][0]["status"] == "Failed"
+    assert cache.entries() == []
+    response = client.get("sampleData/byBox", param=88101)
+    assert response.json()["Header"][0]["status"] == "Success"
+    assert len(cache.entries()) == 1
+    assert client.get("sampleData/byBox", param=88101).json() == response.json()
+    assert replies == []
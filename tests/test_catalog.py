@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from aerichor.satellite.catalog import GranuleCatalog
+from aerichor.utils import BoundingBox
+from aerichor.testing import write_spexone_granule
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write_spexone_granule(tmp_path / "PACE_SPEXONE.20240324T174414.L2.RTAP_LD.V3_0.nc")
+    write_spexone_granule(
+        tmp_path / "PACE_SPEXONE.20240325T180000.L2.RTAP_LD.V3_0.nc",
+        origin=(-100.0, 40.0),
+    )
+    return tmp_path
+
+
+def test_catalog_queries(directory):
+    catalog = GranuleCatalog(directory)
+    assert catalog.update() == 2
+    first, second = catalog.files
+    assert catalog.at_point(-79.7, 35.0) == [first]
+    assert catalog.at_point(0, 0) == []
+    bbox = BoundingBox.from_shape([(-101, 39), (-99, 39), (-99, 41)])
+    assert catalog.in_bbox(bbox) == [second]
+    assert catalog.between(datetime(2024, 3, 25), datetime(2024, 3, 26)) == [second]
+    assert catalog.query(start=datetime(2024, 3, 24, 17, 46)) == [first, second]
+    assert catalog.query(end=datetime(2024, 3, 24, 17, 40)) == []
+
+
+def test_catalog_persists_and_updates_incrementally(directory):
+    GranuleCatalog(directory).update()
+    catalog = GranuleCatalog(directory)
+    assert len(catalog) == 2
+    assert catalog.update() == 0
+
+    write_spexone_granule(directory / "PACE_SPEXONE.20240326T170000.L2.RTAP_LD.V3_0.nc")
+    (directory / "PACE_SPEXONE.20240325T180000.L2.RTAP_LD.V3_0.nc").unlink()
+    assert catalog.update() == 1
+    assert [f.name[13:21] for f in GranuleCatalog(directory)] == ["20240324", "20240326"]
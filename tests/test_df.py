@@ -45,4 +45,214 @@ def test_get_spatial_value(df):
 
 def test_normal_pandas_stuff(df):
     assert isinstance(df['id'], pd.Series)
-    assert isinstance(df.iloc[0:2], pd.DataFrame)
\ No newline at end of file
+    assert isinstance(df.iloc[0:2], pd.DataFrame)
+
+@pytest.fixture
+def pixels():
+    rng = np.random.default_rng(0)
+    n = 2000
+    data = {
+        'latitude': rng.uniform(-1, 9, n),
+        'longitude': rng.uniform(-9, 1, n),
+        'value': rng.normal(size=n),
+    }
+    data['value'][::17] = np.nan
+    return pd.DataFrame(data)
+
+
+def _brute_force(df, other, buffer, reducer):
+    def _compute_by_row(row):
+        is_in_lat = abs(row["latitude"] - other["latitude"]) <= buffer
+        is_in_lon = abs(row["longitude"] - other["longitude"]) <= buffer
+        return reducer(other[is_in_lat & is_in_lon]['value'])
+    return df.apply(_compute_by_row, axis=1)
+
+
+@pytest.mark.parametrize('strategy', ['mean', 'median', 'count', 'std'])
+def test_get_spatial_value_matches_brute_force(df, pixels, strategy):
+    computed = df.get_spatial_value(pixels, 'value', buffer=0.5, strategy=strategy)
+    target = _brute_force(df, pixels, 0.5, lambda s: getattr(s, strategy)())
+    assert np.allclose(computed, target, equal_nan=True)
+
+
+def test_get_spatial_value_nearest(df):
+    other = pd.DataFrame({
+        'latitude': [0.1, -0.2, 2.0, 2.3],
+        'longitude': [0.1, 0.0, -2.3, -2.0],
+        'value': [1.0, 2.0, 3.0, np.nan],
+    })
+    computed = df.get_spatial_value(other, 'value', buffer=0.5, strategy='nearest')
+    assert computed[0] == 1.0
+    assert computed[1] == 3.0
+    assert computed[2:].isnull().all()
+
+
+def test_get_spatial_value_callable(df, pixels):
+    computed = df.get_spatial_value(pixels, 'value', buffer=0.5, strategy=np.max)
+    target = _brute_force(df, pixels, 0.5, lambda s: s.max())
+    assert np.allclose(computed, target, equal_nan=True)
+
+
+def test_align_temporally_does_not_mutate(df):
+    columns = list(df.columns)
+    df.align_temporally(datetime(2025, 1, 1, 14), groupby="id")
+    assert list(df.columns) == columns
+
+
+def test_align_temporally_many_times(df):
+    times = [datetime(2025, 1, 1, 16), datetime(2025, 1, 1, 12)]
+    computed = df.align_temporally(times, groupby="id")
+    assert list(computed['id']) == [1, 2, 3, 1, 2, 3]
+    assert list(computed['measurement']) == [0, 0.4, 0.8, 0.2, 0.6, 0.8]
+    assert (computed['target_time'].iloc[:3] == datetime(2025, 1, 1, 12)).all()
+
+
+def test_align_temporally_nearest_within_window(df):
+    dt = datetime(2025, 1, 1, 14)
+    computed = df.align_temporally(dt, groupby="id", window=timedelta(minutes=30))
+    assert list(computed['id']) == [2]
+    assert computed['delta_t'].iloc[0] == timedelta(minutes=20)
+
+
+def test_align_temporally_window(df):
+    dt = datetime(2025, 1, 1, 14)
+    computed = df.align_temporally(dt, strategy="window", window=timedelta(hours=1))
+    assert list(computed['measurement']) == [0.2, 0.4]
+
+
+def test_align_temporally_mean(df):
+    dt = datetime(2025, 1, 1, 15)
+    computed = df.align_temporally(
+        dt, groupby="id", strategy="mean", window=timedelta(hours=2))
+    assert list(computed['id']) == [1, 2, 3]
+    assert np.allclose(computed['measurement'], [0.2, 0.5, 0.8])
+    assert (computed['time'] == dt).all()
+
+
+def test_align_temporally_interpolate(df):
+    dt = datetime(2025, 1, 1, 14, 50)
+    computed = df.align_temporally(dt, groupby="id", strategy="interpolate")
+    assert list(computed['id']) == [2]
+    assert np.isclose(computed['measurement'].iloc[0], 0.5)
+    assert computed['time'].iloc[0] == dt
+
+
+def test_compact(df):
+    df['site_id'] = ['a', 'a', 'b', 'b', 'c']
+    df.units = 'ug/m3'
+    df.label = 'PM2.5'
+    compact = df.compact()
+    assert compact['latitude'].dtype == np.int8
+    assert compact['measurement'].dtype == np.float32
+    assert compact['site_id'].dtype == 'category'
+    assert compact['time'].dtype == 'datetime64[s]'
+    assert compact.units == 'ug/m3'
+    assert compact.label == 'PM2.5'
+    report = compact.memory_report()
+    assert report.loc['Total', 'bytes'] < df.memory_report().loc['Total', 'bytes']
+
+
+def test_compact_methods_still_work(df, pixels):
+    df['site_id'] = ['a', 'a', 'b', 'b', 'c']
+    compact = df.compact()
+    dt = datetime(2025, 1, 1, 14)
+    for strategy in ['nearest', 'interpolate']:
+        target = df.align_temporally(dt, groupby='site_id', strategy=strategy)
+        computed = compact.align_temporally(dt, groupby='site_id', strategy=strategy)
+        assert list(computed['site_id']) == list(target['site_id'])
+        assert np.allclose(computed['measurement'], target['measurement'])
+    computed = compact.align_temporally(
+        dt, groupby='site_id', strategy='mean', window=timedelta(hours=2))
+    assert list(computed['site_id']) == ['a', 'b']
+    target = df.get_spatial_value(pixels, 'value', buffer=0.5)
+    computed = compact.get_spatial_value(pixels.astype(np.float32), 'value', buffer=0.5)
+    assert np.allclose(computed, target, equal_nan=True, rtol=1e-5)
+
+
+@pytest.fixture
+def timed_pixels(pixels):
+    rng = np.random.default_rng(1)
+    minutes = rng.uniform(0, 300, len(pixels))
+    pixels = pixels.copy()
+    pixels['time'] = pd.Timestamp(2025, 1, 1, 12) + pd.to_timedelta(minutes, unit='min')
+    return pixels
+
+
+def _brute_force_pairs(df, other, within):
+    pairs = set()
+    for i, row in df.iterrows():
+        near = within(row, other)
+        near &= abs(other['time'] - row['time']) <= timedelta(minutes=30)
+        pairs.update((i, j) for j in other.index[near])
+    return pairs
+
+
+@pytest.mark.parametrize('metric', ['box', 'haversine'])
+def test_sjoin_spacetime_matches_brute_force(df, timed_pixels, metric):
+    df.index = df.index + 10
+    if metric == 'box':
+        radius = 0.5
+        def within(row, other):
+            return ((abs(other['latitude'] - row['latitude']) <= radius)
+                    & (abs(other['longitude'] - row['longitude']) <= radius))
+    else:
+        radius = 60.0
+        def within(row, other):
+            lat0, lon0 = np.radians(row['latitude']), np.radians(row['longitude'])
+            lat1, lon1 = np.radians(other['latitude']), np.radians(other['longitude'])
+            a = (np.sin((lat1 - lat0) / 2) ** 2
+                 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2)
+            return 2 * 6371.0088 * np.arcsin(np.sqrt(a)) <= radius
+    timed_pixels['row'] = timed_pixels.index
+    computed = df.sjoin_spacetime(
+        timed_pixels, radius, timedelta(minutes=30), metric=metric)
+    assert isinstance(computed, SampleDataFrame)
+    assert {'distance', 'delta_t', 'time_other', 'value'} <= set(computed.columns)
+    by_id = dict(zip(df['measurement'], df.index))
+    pairs = set(zip(computed['measurement'].map(by_id), computed['row']))
+    assert len(pairs) == len(computed)
+    target = _brute_force_pairs(df, timed_pixels, within)
+    assert len(target) > 0
+    assert pairs == target
+    assert (computed['delta_t'] <= timedelta(minutes=30)).all()
+
+
+def test_sjoin_spacetime_left(df, timed_pixels):
+    computed = df.sjoin_spacetime(
+        timed_pixels, 0.5, timedelta(minutes=30), how='left')
+    inner = df.sjoin_spacetime(timed_pixels, 0.5, timedelta(minutes=30))
+    unmatched = computed['value'].isnull() & computed['distance'].isnull()
+    assert len(computed) - unmatched.sum() == len(inner)
+    assert set(computed['measurement']) == set(df['measurement'])
+    assert computed.loc[unmatched, 'delta_t'].isnull().all()
+    # Rows keep the order of the left frame, nearest match first.
+    assert computed['measurement'].is_monotonic_increasing
+
+
+def test_get_spatial_values_matches_get_spatial_value(df, pixels):
+    pixels = pixels.assign(other=pixels['value'] * 2)
+    pixels.loc[::5, 'other'] = np.nan
+    computed = df.get_spatial_values(pixels, {'value': 'v', 'other': 'o'}, buffer=0.5)
+    assert isinstance(computed, SampleDataFrame)
+    assert list(computed.columns) == list(df.columns) + ['v', 'o']
+    for column, name in [('value', 'v'), ('other', 'o')]:
+        target = df.get_spatial_value(pixels, column, buffer=0.5)
+        assert np.allclose(computed[name], target, equal_nan=True)
+
+
+def test_get_spatial_values_weighted(df):
+    other = pd.DataFrame({
+        'latitude': [0.1, -0.2, 0.0, 2.0],
+        'longitude': [0.0, 0.0, 0.3, -2.0],
+        'value': [1.0, 2.0, np.nan, 3.0],
+        'quality': [3.0, 1.0, 1.0, np.nan],
+    })
+    weighted = df.get_spatial_values(
+        other, ['value'], buffer=0.5, strategy='weighted', weights='quality')
+    assert weighted['value'][0] == pytest.approx((3 * 1 + 1 * 2) / 4)
+    assert weighted['value'][1:].isnull().all()
+    idw = df.get_spatial_values(other, ['value'], buffer=0.5, strategy='inverse_distance')
+    assert idw['value'][0] == pytest.approx((1 / 0.01 + 2 / 0.04) / (1 / 0.01 + 1 / 0.04))
+    assert idw['value'][1] == 3.0
+    with pytest.raises(ValueError):
+        df.get_spatial_values(other, ['value'], strategy='weighted')
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# Heavy packages that no module should import until they are used.
+DEFERRED = {"cartopy", "matplotlib", "scipy"}
+
+
+def loaded_packages(module):
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return {name.split(".")[0] for name in output.split()}
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "aerichor",
+        "aerichor.ground.aqs",
+        "aerichor.ground.bulk",
+        "aerichor.satellite.pace",
+        "aerichor.satellite.reader",
+        "aerichor.pipeline",
+    ],
+)
+def test_import_defers_heavy_packages(module):
+    assert not loaded_packages(module) & DEFERRED
+
+
+def test_aqs_does_not_import_xarray():
+    assert "xarray" not in loaded_packages("aerichor.ground.aqs")
@@ -0,0 +1,46 @@
+import logging
+
+from aerichor import instrument
+from aerichor.instrument import add_listener, emit, log_events, profile, remove_listener, timed
+from aerichor.satellite.pace import SpexOne
+
+
+def test_timed_is_a_no_op_without_listeners():
+    assert not instrument._listeners
+    with timed("stage") as timer:
+        timer.record(rows=1)
+    assert timer is instrument._NULL_TIMER
+
+
+def test_profile_collects_events():
+    with profile() as run:
+        with timed("stage", bytes=10) as timer:
+            timer.record(rows=3)
+        emit("wait", 0.5)
+    assert not instrument._listeners
+    assert [e.stage for e in run.events] == ["stage", "wait"]
+    assert run.events[0].fields == {"bytes": 10, "rows": 3}
+    summary = run.summary()
+    assert summary.loc["wait", "total"] == 0.5
+    assert summary.loc["stage", "rows"] == 3
+
+
+def test_log_events(caplog):
+    listener = log_events()
+    add_listener(listener)
+    try:
+        with caplog.at_level(logging.INFO, logger="aerichor"):
+            emit("stage", 1.0, rows=2)
+    finally:
+        remove_listener(listener)
+    assert "Event('stage', 1.000000, rows=2)" in caplog.text
+
+
+def test_data_path_is_instrumented(granule):
+    with profile() as run:
+        with SpexOne.from_netcdf(granule, lazy=True) as spex:
+            flat = spex.flatten("geophysical_data/aot550")
+        flat.get_spatial_value(flat, "aot550", buffer=0.1)
+    stages = [e.stage for e in run.events]
+    assert stages == ["satellite.open", "satellite.read", "dataframe.spatial_join"]
+    assert run.events[1].fields["bytes"] == 40 * 10 * 4
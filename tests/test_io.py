@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from aerichor import SampleDataFrame
+from aerichor.ground.aqs import AqiPollutant, unpack_samples
+from aerichor.io import read_dataset, write_dataset
+from aerichor.testing import make_aqs_samples
+
+
+@pytest.fixture
+def pm25():
+    df = unpack_samples(make_aqs_samples(n_sites=5, n_hours=48))
+    df["aot"] = df["measurement"] / 10
+    return df
+
+
+def test_write_and_read_dataset(tmp_path, pm25):
+    assert write_dataset(pm25, tmp_path, AqiPollutant.PM25) == len(pm25)
+    assert sorted(p.name for p in (tmp_path / "pollutant=PM25").iterdir()) == [
+        "date=2024-03-24",
+        "date=2024-03-25",
+    ]
+    df = read_dataset(tmp_path)
+    assert isinstance(df, SampleDataFrame)
+    assert df.units == pm25.units
+    assert df.label == pm25.label
+    assert list(df.columns) == list(pm25.columns)
+    df = df.sort_values(["time", "site_id"], ignore_index=True)
+    expected = pm25.sort_values(["time", "site_id"], ignore_index=True)
+    assert (df["measurement"] == expected["measurement"]).all()
+    assert (df["time"] == expected["time"]).all()
+    assert list(df["site_id"].astype(str)) == list(expected["site_id"].astype(str))
+
+
+def test_write_dataset_appends(tmp_path, pm25):
+    write_dataset(pm25, tmp_path, AqiPollutant.PM25)
+    write_dataset(pm25, tmp_path, AqiPollutant.PM25)
+    assert len(read_dataset(tmp_path)) == 2 * len(pm25)
+
+
+def test_read_dataset_prunes(tmp_path, pm25):
+    write_dataset(pm25, tmp_path, AqiPollutant.PM25)
+    other = pm25.copy()
+    other.label = "Ozone"
+    write_dataset(other, tmp_path, AqiPollutant.O3)
+
+    df = read_dataset(tmp_path, columns=["site_id", "aot"], pollutant=AqiPollutant.O3)
+    assert list(df.columns) == ["site_id", "aot"]
+    assert len(df) == len(pm25)
+    assert df.label == "Ozone"
+
+    df = read_dataset(
+        tmp_path,
+        columns=["time", "pollutant"],
+        start=datetime(2024, 3, 25),
+        end=datetime(2024, 3, 25, 5),
+    )
+    assert set(df["pollutant"]) == {"PM25", "O3"}
+    assert df["time"].between(pd.Timestamp(2024, 3, 25), pd.Timestamp(2024, 3, 25, 5)).all()
+    assert len(df) == 2 * 5 * 6
+    # The two pollutants have different labels.
+    assert df.label is None
+
+
+def test_write_dataset_requires_pollutant(tmp_path, pm25):
+    pm25.label = None
+    with pytest.raises(ValueError):
+        write_dataset(pm25, tmp_path)
+
+
+def test_write_dataset_partitions_by_label(tmp_path, pm25):
+    write_dataset(pm25, tmp_path)
+    assert [p.name for p in tmp_path.iterdir()] == ["pollutant=PM25"]
+    pm25.label = "Wind speed"
+    with pytest.raises(ValueError, match="does not name an AqiPollutant"):
+        write_dataset(pm25, tmp_path)
+
+
+def test_write_dataset_rejects_missing_times(tmp_path, pm25):
+    pm25.loc[3, "time"] = pd.NaT
+    with pytest.raises(ValueError, match="1 rows have no time"):
+        write_dataset(pm25, tmp_path)
+    assert not any(tmp_path.iterdir())
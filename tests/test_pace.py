@@ -1,7 +1,13 @@
+import numpy as np
+import pandas as pd
 import pytest
 import shapely
+import xarray as xr
 
+from aerichor.satellite.base import Satellite, _polygonal
+from aerichor.satellite.lazy import LazyTree
 from aerichor.satellite.pace import SpexOne
+from aerichor.spatial import PixelIndex, haversine
 
 
 @pytest.fixture(scope="module")
@@ -12,18 +18,27 @@ def spex():
     return spex
 
 
+@pytest.fixture
+def diagonal():
+    # A thin swath running from south-west to north-east.
+    lines, pixels = np.meshgrid(np.arange(10.0), np.arange(3.0), indexing="ij")
+    return Satellite(lats=lines + pixels, lons=lines - pixels)
+
+
 def test_base_repr_html_exists(spex):
     assert spex._repr_html_()
 
-# TODO: This test needs to be rewritten.
-#def test_base_item_methods(spex):
-#    key = "new"
-#    value = "test"
-#    spex[key] = value
-#    assert spex[key] == value
-#    del spex[key]
-#    with pytest.raises(KeyError):
-#        spex[key]
+
+def test_base_item_methods(granule):
+    key = "geophysical_data/doubled"
+    for lazy in (False, True):
+        with SpexOne.from_netcdf(granule, lazy=lazy) as spex:
+            value = spex["geophysical_data/aot550"] * 2
+            spex[key] = value
+            xr.testing.assert_equal(spex[key], value)
+            del spex[key]
+            with pytest.raises(KeyError):
+                spex[key]
 
 
 def test_base_swath_contains(spex):
@@ -32,4 +47,205 @@ def test_base_swath_contains(spex):
     assert spex.contains(point)
 
 def test_base_swath_lat_no_min():
-    pass
\ No newline at end of file
+    pass
+
+def test_base_swath_contains_points(diagonal):
+    # (0, 9) and (9, 0) are inside the bounding box but outside the swath.
+    lons = np.array([0.0, 4.0, 0.0, 9.0])
+    lats = np.array([1.0, 5.0, 9.0, 0.0])
+    computed = diagonal.contains_points(lons, lats)
+    assert (computed == [True, True, False, False]).all()
+
+
+def test_base_swath_shape_is_cached(diagonal):
+    shape = diagonal.shape
+    assert diagonal.shape is shape
+    assert diagonal.bbox is diagonal.bbox
+    diagonal.lats = diagonal.lats + 1
+    assert diagonal.shape is not shape
+    assert diagonal.shape.bounds[1] == 1
+
+
+def test_base_swath_shape_follows_curve():
+    # A swath that bends east, so its middle is outside the 4-corner polygon.
+    lines, pixels = np.meshgrid(np.arange(21.0), np.arange(3.0), indexing="ij")
+    lons = pixels + 5 * np.sin(np.pi * lines / 20)
+    swath = Satellite(lats=lines, lons=lons)
+    assert swath.contains_points(np.array([6.0]), np.array([10.0]))[0]
+    assert not swath.contains_points(np.array([1.0]), np.array([10.0]))[0]
+
+
+def test_base_swath_footprint_drops_stray_lines():
+    # A ring with a spike, which make_valid() turns into a polygon and a line.
+    ring = [(0, 0), (2, 0), (2, 2), (0, 2), (0, 3), (0, 2)]
+    valid = shapely.make_valid(shapely.Polygon(ring))
+    assert valid.geom_type == "GeometryCollection"
+    shape = _polygonal(valid)
+    assert shape.geom_type == "Polygon"
+    assert shape.area == 4
+    squares = shapely.GeometryCollection(
+        [shapely.box(0, 0, 1, 1), shapely.MultiPolygon([shapely.box(2, 0, 3, 1)])]
+    )
+    assert _polygonal(squares).geom_type == "MultiPolygon"
+    assert len(_polygonal(squares).geoms) == 2
+
+
+def test_base_swath_footprint_wkb(diagonal):
+    swath = Satellite(lats=np.zeros((1, 1)), lons=np.zeros((1, 1)))
+    swath.footprint_wkb = diagonal.footprint_wkb
+    assert swath.shape.equals(diagonal.shape)
+    assert swath.bbox.to_extent() == diagonal.bbox.to_extent()
+
+
+def test_from_netcdf_lazy(granule):
+    with SpexOne.from_netcdf(granule, lazy=True) as spex:
+        assert spex.lats.shape == (40, 10)
+        assert spex.data.loaded == []
+        aot = spex.data["geophysical_data/aot550"]
+        assert aot.dtype == np.float32
+        assert spex.data.loaded == ["geophysical_data/aot550"]
+        assert spex.data["geophysical_data/aot550"] is aot
+        eager = SpexOne.from_netcdf(granule)
+        assert (eager.data["geophysical_data/aot550"].fillna(-1) == aot.fillna(-1)).all()
+        eager.close()
+    assert spex.data.loaded == []
+
+
+def test_lazy_tree_nested_groups(tmp_path):
+    file = tmp_path / "nested.nc"
+    inner = xr.Dataset({"x": ("n", np.arange(3.0))})
+    xr.DataTree.from_dict({"/outer": xr.Dataset(), "/outer/inner": inner}).to_netcdf(file)
+    tree = LazyTree(file)
+    assert list(tree["outer/inner/x"].values) == [0, 1, 2]
+    assert list(tree["outer/inner"].data_vars) == ["x"]
+    with pytest.raises(KeyError):
+        tree["outer/inner/y"]
+    selected = LazyTree(file, variables=["outer/inner/x"])
+    assert list(selected["outer/inner"].data_vars) == ["x"]
+    with selected.open("outer/inner/x") as x:
+        assert x.shape == (3,)
+
+
+def test_flatten(granule):
+    with SpexOne.from_netcdf(granule, lazy=True) as spex:
+        flat = spex.flatten(["geophysical_data/aot550", "geophysical_data/angstrom_440_670"])
+        assert list(flat.columns) == ["latitude", "longitude", "aot550", "angstrom_440_670"]
+        # The first pixel has a NaN aot550
+        assert len(flat) == 399
+        assert flat["aot550"].dtype == np.float32
+        assert flat["latitude"].iloc[0] == spex.lats[0, 1]
+        assert spex["geophysical_data/aot550"].shape == (40, 10)
+
+
+def test_flatten_rename_and_fill_value(granule):
+    with SpexOne.from_netcdf(granule) as spex:
+        value = float(spex.data["geophysical_data/aot550"][0, 1])
+        flat = spex.flatten({"geophysical_data/aot550": "aot"}, fill_value=value)
+        assert list(flat.columns) == ["latitude", "longitude", "aot"]
+        assert len(flat) == 398
+        with pytest.raises(ValueError):
+            spex.flatten("geophysical_data/aot")
+
+
+def test_from_netcdf_filters(granule):
+    aot = "geophysical_data/aot550"
+    with SpexOne.from_netcdf(granule) as spex:
+        quality = np.asarray(spex[SpexOne.QUALITY])
+        cloud = np.asarray(spex[SpexOne.CLOUD_MASK])
+        values = np.asarray(spex[aot])
+    expected = (quality >= 2) & (cloud == 0) & (values <= 0.5)
+    for lazy in (False, True):
+        with SpexOne.from_netcdf(
+            granule,
+            lazy=lazy,
+            variables=[aot],
+            valid_range={aot: (0, 0.5)},
+            min_quality=2,
+            cloud_free=True,
+        ) as spex:
+            assert (spex.mask == expected).all()
+            flat = spex.flatten(aot)
+            assert len(flat) == expected.sum()
+            assert flat["aot550"].max() <= 0.5
+            with pytest.raises(KeyError):
+                spex["geophysical_data/angstrom_440_670"]
+            if lazy:
+                assert spex.data.loaded == [aot]
+
+
+def test_flatten_filters_match_read_granules(granule):
+    from aerichor.satellite.reader import read_granules
+
+    valid_range = {"geophysical_data/aot550": (0.1, 0.9)}
+    kwargs = dict(valid_range=valid_range, min_quality=1, cloud_free=True)
+    with SpexOne.from_netcdf(granule, lazy=True) as spex:
+        flat = spex.flatten("geophysical_data/aot550", **kwargs)
+    (chunk,) = read_granules(granule, "geophysical_data/aot550", **kwargs)
+    assert 0 < len(flat) < 300
+    assert (chunk.drop(columns="time") == flat).all().all()
+
+
+def test_sample_at_nearest_pixel(granule):
+    with SpexOne.from_netcdf(granule) as spex:
+        lats = np.asarray(spex.lats)
+        lons = np.asarray(spex.lons)
+        points = pd.DataFrame(
+            {"latitude": lats[[5, 20], [3, 7]], "longitude": lons[[5, 20], [3, 7]]},
+            index=["a", "b"],
+        )
+        sampled = spex.sample_at(points, "geophysical_data/aot550")
+        assert list(sampled.index) == ["a", "b"]
+        assert list(sampled["line"]) == [5, 20]
+        assert list(sampled["pixel"]) == [3, 7]
+        assert (sampled["distance"] < 0.1).all()
+        aot = np.asarray(spex["geophysical_data/aot550"])
+        np.testing.assert_array_equal(sampled["aot550"], aot[[5, 20], [3, 7]])
+        assert spex.pixel_index() is spex.pixel_index()
+
+
+def test_sample_at_matches_brute_force(granule):
+    with SpexOne.from_netcdf(granule, lazy=True) as spex:
+        lats = np.asarray(spex.lats, dtype=float)
+        lons = np.asarray(spex.lons, dtype=float)
+        rng = np.random.default_rng(0)
+        points = pd.DataFrame(
+            {
+                "latitude": rng.uniform(np.nanmin(lats), np.nanmax(lats), 20),
+                "longitude": rng.uniform(np.nanmin(lons), np.nanmax(lons), 20),
+            }
+        )
+        aot = "geophysical_data/aot550"
+        sampled = spex.sample_at(points, aot, k=3, max_distance=50)
+        for row, point in points.iterrows():
+            distances = haversine(point["latitude"], point["longitude"], lats, lons)
+            order = np.argsort(distances, axis=None)[:3]
+            expected = distances.ravel()[order]
+            expected = expected[expected <= 50]
+            found = sampled.loc[[row]] if row in sampled.index else sampled.iloc[:0]
+            np.testing.assert_allclose(found["distance"], expected, rtol=1e-6)
+
+
+def test_sample_at_mask_and_persisted_index(granule, tmp_path):
+    copy = tmp_path / granule.name
+    copy.write_bytes(granule.read_bytes())
+    with SpexOne.from_netcdf(copy, lazy=True, min_quality=2) as spex:
+        points = pd.DataFrame(
+            {"latitude": np.ravel(spex.lats), "longitude": np.ravel(spex.lons)}
+        ).dropna()
+        aot = "geophysical_data/aot550"
+        sampled = spex.sample_at(points, aot, persist_index=True)
+        # Points on filtered pixels get the nearest kept pixel instead.
+        assert len(sampled) == len(points)
+        assert spex.mask[sampled["line"], sampled["pixel"]].all()
+        assert (sampled["distance"] > 0).sum() == (~spex.mask).sum()
+        assert spex.data.loaded == []
+        checksum = spex.pixel_index().checksum
+    index = tmp_path / (granule.name + Satellite.INDEX_SUFFIX)
+    with np.load(index, allow_pickle=False) as stored:
+        assert str(stored["checksum"]) == checksum
+    with SpexOne.from_netcdf(copy, min_quality=2) as spex:
+        assert spex.pixel_index(persist=True).checksum == checksum
+        # Another mask, or other coordinates, do not match the saved index.
+        assert PixelIndex.load(index, spex.lats, spex.lons) is None
+        spex.mask = None
+        assert spex.pixel_index().checksum != checksum
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from aerichor.dataframe import SampleDataFrame
+from aerichor.ground.aqs import AqiPollutant
+from aerichor.pipeline import collocate
+from aerichor.satellite.pace import SpexOne
+from aerichor.testing import write_spexone_granule
+
+
+class FakeClient:
+    """Returns two sensors, one of them outside every swath."""
+
+    def get_pollutant_in_swath(self, pollutant, swath):
+        lat = float(swath.lats[10, 5])
+        lon = float(swath.lons[10, 5])
+        times = [swath.start - timedelta(minutes=30), swath.start + timedelta(minutes=10)]
+        df = SampleDataFrame(
+            {
+                "site_id": ["a", "a", "b", "b"],
+                "latitude": [lat, lat, 0.0, 0.0],
+                "longitude": [lon, lon, 0.0, 0.0],
+                "time": times * 2,
+                "measurement": [1.0, 2.0, 3.0, -1.0],
+                # Optional fields can be missing without dropping the row.
+                "qualifier": [None] * 4,
+            }
+        )
+        df.units = "ug/m3"
+        df.label = "PM2.5"
+        return df
+
+
+@pytest.fixture
+def passes(tmp_path):
+    return [
+        write_spexone_granule(tmp_path / f"PACE_SPEXONE.202403{day}T174414.L2.RTAP_LD.V3_0.nc",
+                     seed=day, origin=(-80.0 + day, 34.0))
+        for day in (24, 25, 26)
+    ]
+
+
+def test_collocate(passes):
+    results = list(
+        collocate(passes, FakeClient(), AqiPollutant.PM25, max_workers=2, max_pending=2)
+    )
+    assert len(results) == 3
+    for file, df in zip(passes, results):
+        assert list(df["site_id"]) == ["a"]
+        assert list(df["measurement"]) == [2.0]
+        assert df["time"].iloc[0].day == int(file.name[19:21])
+        assert np.isfinite(df["aot"]).all()
+        assert df.units == "ug/m3"
+
+
+class CountingReader(SpexOne):
+    opened = []
+
+    @classmethod
+    def from_netcdf(cls, file, **kwargs):
+        cls.opened.append(file)
+        return super().from_netcdf(file, **kwargs)
+
+
+def test_collocate_opens_each_granule_once(passes):
+    results = list(
+        collocate(passes, FakeClient(), AqiPollutant.PM25, reader=CountingReader)
+    )
+    assert [len(df) for df in results] == [1, 1, 1]
+    assert sorted(CountingReader.opened) == sorted(passes)
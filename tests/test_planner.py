@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from aerichor.ground.planner import plan_requests
+from aerichor.satellite.base import Satellite
+
+
+def make_swath(lon0, lat0, start, width=1.0):
+    lats, lons = np.meshgrid(
+        np.linspace(lat0, lat0 + width, 4), np.linspace(lon0, lon0 + width, 4),
+        indexing="ij",
+    )
+    return Satellite(
+        lats=lats, lons=lons, start=start, end=start + timedelta(minutes=5)
+    )
+
+
+@pytest.fixture
+def swaths():
+    day1 = datetime(2024, 3, 24, 17)
+    day2 = datetime(2024, 3, 25, 17)
+    return [
+        make_swath(0, 0, day1),
+        make_swath(0.5, 0.5, day1),   # overlaps the first
+        make_swath(5, 5, day1),       # far from the others
+        make_swath(0, 0, day2),       # same place, next day
+        make_swath(1.7, 0, day1),     # 0.2 degrees from the first two
+    ]
+
+
+def test_plan_requests_merges_overlapping_boxes(swaths):
+    plans = plan_requests(swaths)
+    assert [(p.bdate, p.members) for p in plans] == [
+        ("20240324", [0, 1]),
+        ("20240324", [2]),
+        ("20240324", [4]),
+        ("20240325", [3]),
+    ]
+    assert plans[0].extent == (0, 1.5, 0, 1.5)
+
+
+def test_plan_requests_merges_nearby_boxes(swaths):
+    plans = plan_requests(swaths, gap=0.25)
+    assert [p.members for p in plans] == [[0, 1, 4], [2], [3]]
+    assert plans[0].extent == (0, 2.7, 0, 1.5)
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aerichor.instrument import profile
+from aerichor.satellite.pace import SpexOne
+from aerichor.satellite.reader import read_granules
+from aerichor.testing import write_spexone_granule
+from aerichor.utils import BoundingBox
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write_spexone_granule(tmp_path / "PACE_SPEXONE.20240325T180000.L2.RTAP_LD.V3_0.nc")
+    write_spexone_granule(
+        tmp_path / "PACE_SPEXONE.20240324T174414.L2.RTAP_LD.V3_0.nc", seed=1
+    )
+    return tmp_path
+
+
+def test_read_granules_matches_flatten(directory):
+    chunks = list(read_granules(directory, "geophysical_data/aot550"))
+    assert len(chunks) == 2
+    files = sorted(directory.glob("*.nc"))
+    for chunk, file in zip(chunks, files):
+        with SpexOne.from_netcdf(file, lazy=True) as spex:
+            flat = spex.flatten("geophysical_data/aot550")
+            assert (chunk["time"] == spex.start).all()
+        assert chunk["aot550"].dtype == np.float32
+        pd.testing.assert_frame_equal(chunk.drop(columns="time"), flat)
+
+
+def test_read_granules_in_blocks(directory):
+    whole = pd.concat(read_granules(directory, "geophysical_data/aot550"), ignore_index=True)
+    with profile() as run:
+        chunks = list(read_granules(directory, "geophysical_data/aot550", lines=7))
+    assert len(chunks) == 2 * 6
+    assert max(len(chunk) for chunk in chunks) <= 7 * 10
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+    assert run.summary().loc["satellite.read_block", "calls"] == 12
+
+
+def test_read_granules_filters(directory):
+    bbox = BoundingBox.from_shape([(-80, 34.5), (-79.6, 34.5), (-79.6, 35)])
+    chunks = list(
+        read_granules(
+            directory,
+            {"geophysical_data/aot550": "aot", "geophysical_data/angstrom_440_670": "ae"},
+            bbox=bbox,
+            start=datetime(2024, 3, 25),
+            valid_range={"geophysical_data/aot550": (0.2, 0.8)},
+            lines=5,
+        )
+    )
+    flat = pd.concat(chunks)
+    assert (flat["time"] == datetime(2024, 3, 25, 18)).all()
+    assert flat["aot"].between(0.2, 0.8).all()
+    assert bbox.contains_points(flat["longitude"], flat["latitude"]).all()
+    # Only the lines that cross the box are read.
+    assert sum(len(chunk) for chunk in chunks) == len(flat)
+    assert len(chunks) <= 6
+    early = read_granules(directory, "geophysical_data/aot550", end=datetime(2024, 3, 1))
+    assert list(early) == []
+
+
+def test_read_granules_rejects_unknown_range(directory):
+    with pytest.raises(ValueError):
+        next(read_granules(directory, "aot550", valid_range={"x": (0, 1)}))
+    aot = "geophysical_data/aot550"
+    # valid_range is keyed by variable, not by column.
+    with pytest.raises(ValueError):
+        next(read_granules(directory, {aot: "aot"}, valid_range={"aot": (0, 1)}))
+    with SpexOne.from_netcdf(next(directory.glob("*.nc"))) as spex:
+        with pytest.raises(ValueError):
+            spex.flatten(aot, valid_range={"aot550": (0, 1)})
+
+
+def test_read_granules_rejects_missing_flags(directory):
+    class Reader(SpexOne):
+        QUALITY = None
+        CLOUD_MASK = None
+
+    aot = "geophysical_data/aot550"
+    with pytest.raises(ValueError, match="CLOUD_MASK"):
+        next(read_granules(directory, aot, cloud_free=True, reader=Reader))
+    with pytest.raises(ValueError, match="QUALITY"):
+        next(read_granules(directory, aot, min_quality=1, reader=Reader))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from aerichor.satellite.regrid import Composite, Grid, Regridder
+
+
+@pytest.fixture
+def grid():
+    return Grid((0, 2, 0, 1), 1.0)
+
+
+@pytest.fixture
+def regridder(grid):
+    lats = np.array([[0.2, 0.4], [0.6, 5.0]])
+    lons = np.array([[0.5, 0.5], [1.5, 0.5]])
+    return Regridder(grid, lats, lons)
+
+
+def test_grid(grid):
+    assert grid.shape == (1, 2)
+    assert list(grid.lons) == [0.5, 1.5]
+    assert list(grid.cell_index([0.5, 1.5, 3.0], [0.5, 0.5, 0.5])) == [0, 1, -1]
+
+
+def test_grid_upper_edge(grid):
+    lons = [0.0, 2.0, 2.0, 2.0 + 1e-9]
+    lats = [1.0, 0.0, 1.0, 1.0]
+    assert list(grid.cell_index(lons, lats)) == [0, 1, 1, -1]
+
+
+def test_regridder_apply(regridder):
+    values = np.array([[1.0, 3.0], [5.0, 7.0]])
+    result = regridder.apply(values)
+    assert result.tolist() == [[2.0, 5.0]]
+    values[0, 0] = np.nan
+    assert regridder.apply(values).tolist() == [[3.0, 5.0]]
+    values[1, 0] = np.nan
+    assert regridder.apply(values).mask.tolist() == [[False, True]]
+
+
+def test_regridder_apply_wavelengths(regridder):
+    values = np.arange(8.0).reshape(2, 2, 2)
+    result = regridder.apply(values)
+    assert result.shape == (1, 2, 2)
+    assert result.tolist() == [[[1.0, 2.0], [4.0, 5.0]]]
+
+
+def test_composite(grid, regridder):
+    composite = Composite(grid)
+    composite.add(regridder, np.array([[1.0, 3.0], [np.nan, 7.0]]))
+    composite.add(regridder, np.array([[5.0, np.nan], [6.0, 7.0]]))
+    result = composite.result()
+    assert result.tolist() == [[3.0, 6.0]]
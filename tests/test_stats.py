@@ -0,0 +1,113 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aerichor.satellite.pace import SpexOne
+from aerichor.satellite.stats import Moments, QuantileSketch, describe_granules
+from aerichor.testing import write_spexone_granule
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(0)
+    blocks = [rng.normal(1000, 1, 5000), rng.normal(-3, 2, 5000), np.zeros(10)]
+    return np.concatenate(blocks)
+
+
+def test_moments_merge(values):
+    merged = Moments()
+    for block in np.array_split(values, 7):
+        part = Moments()
+        part.update(block)
+        merged.merge(part)
+    assert merged.count == len(values)
+    assert np.isclose(merged.mean, values.mean())
+    assert np.isclose(merged.std, values.std(ddof=1))
+    assert merged.min == values.min()
+    assert merged.max == values.max()
+
+
+def test_quantile_sketch(values):
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for block in np.array_split(values, 3):
+        part = QuantileSketch(relative_accuracy=0.01)
+        part.update(block)
+        sketch.merge(pickle.loads(pickle.dumps(part)))
+    q = np.array([0.01, 0.25, 0.4999, 0.5, 0.75, 0.99])
+    computed = sketch.quantile(q)
+    lower = np.quantile(values, q, method="lower")
+    higher = np.quantile(values, q, method="higher")
+    assert (computed >= lower - 0.01 * abs(lower)).all()
+    assert (computed <= higher + 0.01 * abs(higher)).all()
+    small = QuantileSketch()
+    small.update([-2.0, 0.0, 0.0, 0.0, 5.0])
+    assert list(small.quantile([0.0, 0.5])) == [pytest.approx(-2, rel=0.01), 0.0]
+    assert np.isnan(QuantileSketch().quantile([0.5])).all()
+
+
+def test_satellite_describe(granule):
+    with SpexOne.from_netcdf(granule, lazy=True) as spex:
+        computed = spex.describe(lines=7)
+        # Blocks are read from the file, so nothing stays in memory.
+        assert spex.data.loaded == []
+        aot = np.asarray(spex["geophysical_data/aot"])
+        flat = pd.DataFrame(
+            {
+                "aot550": np.asarray(spex["geophysical_data/aot550"]).ravel(),
+                "aot_1": aot[..., 1].ravel(),
+            }
+        )
+    target = flat.describe()
+    assert list(computed.index) == list(target.index)
+    assert list(computed.columns) == [
+        "aot550", "angstrom_440_670", "aot_0", "aot_1", "aot_2"
+    ]
+    assert computed.loc["count", "aot_1"] == 40 * 10
+    exact = ["count", "mean", "std", "min", "max"]
+    for column in ["aot550", "aot_1"]:
+        assert np.allclose(computed.loc[exact, column], target.loc[exact, column])
+    approximate = ["25%", "50%", "75%"]
+    assert np.allclose(
+        computed.loc[approximate, "aot550"],
+        target.loc[approximate, "aot550"],
+        rtol=0.03,
+    )
+
+
+def test_satellite_describe_labels_wavelengths(granule):
+    with SpexOne.from_netcdf(granule) as spex:
+        geophysical = spex.data["geophysical_data"].to_dataset()
+        wavelengths = {"wavelengths": [440.0, 550.0, 670.0]}
+        spex.data["geophysical_data"] = geophysical.assign_coords(wavelengths)
+        computed = spex.describe(["geophysical_data/aot"])
+    assert list(computed.columns) == ["aot_440", "aot_550", "aot_670"]
+
+
+def test_describe_granules(tmp_path):
+    write_spexone_granule(tmp_path / "PACE_SPEXONE.20240324T174414.L2.RTAP_LD.V3_0.nc")
+    write_spexone_granule(
+        tmp_path / "PACE_SPEXONE.20240325T180000.L2.RTAP_LD.V3_0.nc", seed=1
+    )
+    variables = ["geophysical_data/aot550"]
+    serial = describe_granules(tmp_path, variables)
+    parallel = describe_granules(tmp_path, variables, max_workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert serial.loc["count", "aot550"] == 2 * 399
+
+    values = []
+    for file in sorted(tmp_path.glob("*.nc")):
+        with SpexOne.from_netcdf(file) as spex:
+            values.append(np.asarray(spex["geophysical_data/aot550"]).ravel())
+    values = pd.Series(np.concatenate(values)).dropna()
+    target = values.describe()
+    exact = ["count", "mean", "std", "min", "max"]
+    assert np.allclose(serial.loc[exact, "aot550"], target[exact])
+    # Each percentile is within the sketch's 1% of a value of the right rank.
+    q = np.array([0.25, 0.5, 0.75])
+    lower = np.quantile(values, q, method="lower")
+    higher = np.quantile(values, q, method="higher")
+    computed = serial.loc[["25%", "50%", "75%"], "aot550"].to_numpy()
+    assert (computed >= lower * 0.99).all()
+    assert (computed <= higher * 1.01).all()
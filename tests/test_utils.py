@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 import shapely
 
@@ -27,3 +28,9 @@ def test_bbox_not_contains_point(bbox):
 
 def test_bbox_contains_line(bbox):
     assert shapely.LineString([(1, 1), (2, 2)]) in bbox
+
+
+def test_bbox_contains_points(bbox):
+    lons = np.array([1, 0, 5, 11])
+    lats = np.array([5, 5, 9.5, 5])
+    assert (bbox.contains_points(lons, lats) == [True, False, True, False]).all()